@@ -0,0 +1,23 @@
+"""
+Dedicated scheduler process for the background jobs
+
+    python ams_scheduler.py
+
+Start it next to the web servers and set SCHEDULER_MODE=standalone for them.
+Several copies can run (e.g. one per node): the Postgres advisory lock lets
+exactly one run the jobs and a standby takes over if it goes away.
+"""
+
+import logging
+
+from app import create_app, jobs
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    app = create_app()
+    jobs.run_forever(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -26,6 +26,18 @@ def create_app():
     from app.routes import routes
     app.register_blueprint(routes)
 
+    # flask fixtures generate / load (synthetic campus data for benchmarks)
+    from app.fixtures import fixtures_cli
+    app.cli.add_command(fixtures_cli)
+
+    # flask schedules materialize (fill or backfill dated schedules)
+    from app.schedules import schedules_cli
+    app.cli.add_command(schedules_cli)
+
+    # flask attendance to-bitmap (convert attendance rows before switching to bitmap storage)
+    from app.attendance_bitmap import attendance_cli
+    app.cli.add_command(attendance_cli)
+
     # Ensure database sessions are properly closed after each request
     @app.teardown_appcontext
     def shutdown_session(exception=None):
@@ -0,0 +1,69 @@
+"""
+Academic calendar: which weekly timetable (if any) runs on a given date
+Dates without an entry follow their own weekday. Holidays and exam days have
+no classes; a working day may follow another weekday's timetable (day order).
+Entries are cached per process and reloaded after CALENDAR_CACHE_SECONDS, or
+immediately in the process that changes them.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+
+from app import db
+from app.models import AcademicCalendar, WEEKDAYS
+
+KINDS = ('holiday', 'exam', 'working')
+NO_CLASSES = ('holiday', 'exam')
+
+Entry = namedtuple('Entry', 'kind day_order description')
+
+_entries = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def entries():
+    """All calendar entries as {date: Entry}, from the process cache"""
+    global _entries, _loaded_at
+
+    with _lock:
+        expired = time.monotonic() - _loaded_at > current_app.config['CALENDAR_CACHE_SECONDS']
+        if _entries is None or expired:
+            rows = db.session.query(
+                AcademicCalendar.date, AcademicCalendar.kind, AcademicCalendar.day_order, AcademicCalendar.description
+            )
+            _entries = {row.date: Entry(row.kind, row.day_order, row.description) for row in rows}
+            _loaded_at = time.monotonic()
+        return _entries
+
+
+def invalidate():
+    """Drop the cache so the next lookup reloads the calendar"""
+    global _entries
+
+    with _lock:
+        _entries = None
+
+
+def day_order(day):
+    """Weekday timetable ('MON'..'SUN') that runs on day, None on holidays and exam days"""
+    entry = entries().get(day)
+    if entry is None:
+        return WEEKDAYS[day.weekday()]
+    if entry.kind in NO_CLASSES:
+        return None
+    return entry.day_order or WEEKDAYS[day.weekday()]
+
+
+def describe(day):
+    """JSON representation of a date in the calendar"""
+    entry = entries().get(day)
+    return {
+        'date': day.isoformat(),
+        'day_type': entry.kind if entry else 'working',
+        'day_order': day_order(day),
+        'description': entry.description if entry else None
+    }
@@ -0,0 +1,346 @@
+"""
+Bitmap attendance storage (ATTENDANCE_STORAGE=bitmap)
+One attendance_bitmap row per session replaces the attendance_record rows of
+its students: bit roll_number - 1 of present is set when that student of the
+section is present. Bit k is bit k % 8 of byte k // 8, the order of Postgres
+get_bit/set_bit and of NumPy unpackbits(bitorder='little'). A session without
+a row, or a bit past the end of its bitmap, is an absence; bitmaps grow when a
+higher roll number is set. Roll numbers must be distinct within a section:
+to-bitmap refuses to convert while they are not, and student uploads in bitmap
+mode are rolled back when they would repeat one. Needs PostgreSQL 14 or newer
+for bit_count(bytea).
+
+A mark is one UPDATE ... SET present = set_bit(...), atomic against the other
+marks of the session (they queue on its row lock). Present counts are
+bit_count(present), per-student counts over the sessions of an assignment
+unpack the bitmaps into a sessions x roll numbers NumPy matrix and sum it.
+
+    flask attendance to-bitmap --start 2025-07-01 --delete-records
+"""
+
+import click
+import numpy as np
+from flask.cli import AppGroup
+from sqlalchemy import Date, Integer, LargeBinary, String, and_, bindparam, case, exists, func, literal, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+
+from app import attendance_store, db
+from app.models import AttendanceBitmap, AttendanceRecord, FacultyAssignment, Schedule, Student
+
+EMPTY = b''
+MIN_SERVER_VERSION = (14,)  # bit_count(bytea)
+
+
+def position(student=Student):
+    """Bit of a student in the bitmaps of the sessions of their section"""
+    return student.roll_number - 1
+
+
+def _fit(bits, bit):
+    """bits padded with zero bytes up to the byte holding bit"""
+    padding = func.decode(func.repeat('00', bit // 8 + 1 - func.length(bits)), 'hex')
+    return bits.op('||', return_type=LargeBinary)(padding)
+
+
+def is_set(bits, bit):
+    """SQL test of one bit, false past the end of the bitmap"""
+    return case((func.length(bits) > bit // 8, func.get_bit(bits, bit) == 1), else_=False)
+
+
+def on_schedule():
+    """Join condition from schedule to its bitmap"""
+    return and_(AttendanceBitmap.session_id == Schedule.id, AttendanceBitmap.session_date == Schedule.date)
+
+
+def unpack(bitmaps, width=0):
+    """Stack bitmaps into a bool matrix, one row per bitmap and column k for bit k (at least width columns)"""
+    size = max([len(bits) for bits in bitmaps] + [(width + 7) // 8])
+    padded = b''.join(bytes(bits).ljust(size, b'\0') for bits in bitmaps)
+    matrix = np.frombuffer(padded, dtype=np.uint8).reshape(len(bitmaps), size)
+    return np.unpackbits(matrix, axis=1, bitorder='little').astype(bool)
+
+
+def pack(bits):
+    """Bitmap of a bool vector (bit k set for bits[k])"""
+    return np.packbits(bits, bitorder='little').tobytes()
+
+
+def pack_positions(positions):
+    """Bitmap with the given bits set"""
+    positions = np.asarray(positions, dtype=np.int64)
+    bits = np.zeros(positions.max() + 1 if len(positions) else 0, dtype=bool)
+    bits[positions] = True
+    return pack(bits)
+
+
+def present_count():
+    """Correlated count of a schedule's present students"""
+    return func.coalesce(
+        select(func.bit_count(AttendanceBitmap.present)).where(on_schedule()).scalar_subquery(), 0
+    )
+
+
+def attended(student):
+    """Correlated test: the student (a loaded Student) is present at the schedule"""
+    if not student.roll_number or student.roll_number < 1:
+        return literal(False)
+    return exists().where(on_schedule(), is_set(AttendanceBitmap.present, position(student)))
+
+
+def _status():
+    return is_set(AttendanceBitmap.present, position())
+
+
+def session_roster(session_id):
+    """(student id, name, present) for every student of the session's class, in roll number order"""
+    return db.session.query(
+        Student.id, Student.name, func.coalesce(_status(), False)
+    ).select_from(Schedule).join(
+        FacultyAssignment, Schedule.assignment_id == FacultyAssignment.id
+    ).join(Student, attendance_store.in_class()).outerjoin(
+        AttendanceBitmap, on_schedule()
+    ).filter(Schedule.id == session_id).order_by(Student.roll_number).all()
+
+
+def membership(session_id, student_id):
+    """Row with the student's status (None when the session has no bitmap) if the student is in the session's class"""
+    return db.session.execute(
+        select(Student.id, _status().label('status')).select_from(Schedule).join(
+            FacultyAssignment, Schedule.assignment_id == FacultyAssignment.id
+        ).join(
+            Student, and_(attendance_store.in_class(), Student.id == student_id)
+        ).outerjoin(AttendanceBitmap, on_schedule()).where(Schedule.id == session_id)
+    ).first()
+
+
+def student_statuses(student, session_ids):
+    """{session id: present} of one student (a loaded Student) for the sessions that have a bitmap"""
+    if not student.roll_number or student.roll_number < 1:
+        return {}
+    rows = db.session.execute(
+        select(AttendanceBitmap.session_id, is_set(AttendanceBitmap.present, position(student))).where(
+            AttendanceBitmap.session_id.in_(session_ids)
+        )
+    )
+    return dict(rows.all())
+
+
+def _ensure(*conditions):
+    """Create the empty bitmaps of the schedules matching conditions"""
+    rows = select(Schedule.id, Schedule.date, literal(EMPTY, LargeBinary)).where(*conditions)
+    db.session.execute(
+        pg_insert(AttendanceBitmap).from_select(['session_id', 'session_date', 'present'], rows).on_conflict_do_nothing()
+    )
+
+
+def set_bit(session_id, student_id, value, *conditions, only_changed=False):
+    """
+    Set or clear a student's bit in a session's bitmap (conditions restrict the schedule)
+
+    Returns:
+        the session id, or None when nothing was written (not in the class,
+        conditions failed, or the bit already had the value with only_changed)
+    """
+    _ensure(Schedule.id == session_id, *conditions)
+
+    bit = position()
+    where = [
+        on_schedule(), Schedule.id == session_id,
+        FacultyAssignment.id == Schedule.assignment_id,
+        attendance_store.in_class(), Student.id == student_id, Student.roll_number > 0,
+        *conditions
+    ]
+    if only_changed:
+        where.append(is_set(AttendanceBitmap.present, bit) != bool(value))
+
+    # ✅ OPTIMIZED: The bit is set in SQL, concurrent marks of a session serialize on its row
+    return db.session.execute(
+        update(AttendanceBitmap).where(*where).values(
+            present=func.set_bit(_fit(AttendanceBitmap.present, bit), bit, int(bool(value)))
+        ).returning(AttendanceBitmap.session_id)
+    ).scalar()
+
+
+def mark_many(marks):
+    """Set the bits of (session_id, student_id) pairs in one UPDATE, returns the number of bits newly set"""
+    _ensure(Schedule.id.in_({session_id for session_id, _ in marks}))
+
+    marked = func.unnest(
+        bindparam('sessions', [session_id for session_id, _ in marks], type_=ARRAY(Integer)),
+        bindparam('students', [student_id for _, student_id in marks], type_=ARRAY(String))
+    ).table_valued('session_id', 'student_id').render_derived()
+
+    # The bitmaps are locked until commit, a single mark arriving meanwhile waits and applies on top
+    rows = db.session.execute(
+        select(AttendanceBitmap.session_id, AttendanceBitmap.session_date, AttendanceBitmap.present, position())
+        .select_from(marked)
+        .join(Schedule, Schedule.id == marked.c.session_id)
+        .join(AttendanceBitmap, on_schedule())
+        .join(FacultyAssignment, FacultyAssignment.id == Schedule.assignment_id)
+        .join(Student, and_(attendance_store.in_class(), Student.id == marked.c.student_id, Student.roll_number > 0))
+        .with_for_update(of=AttendanceBitmap)
+    ).all()
+
+    bitmaps, positions = {}, {}
+    for session_id, session_date, present, bit in rows:
+        bitmaps[(session_id, session_date)] = present
+        positions.setdefault((session_id, session_date), []).append(bit)
+    if not positions:
+        return 0
+
+    keys, packed, newly_set = list(positions), [], 0
+    for key in keys:
+        bits = unpack([bitmaps[key]], max(positions[key]) + 1)[0]
+        newly_set += int(np.count_nonzero(~bits[positions[key]]))
+        bits[positions[key]] = True
+        packed.append(pack(bits))
+
+    updated = func.unnest(
+        bindparam('bitmap_sessions', [session_id for session_id, _ in keys], type_=ARRAY(Integer)),
+        bindparam('bitmap_dates', [session_date for _, session_date in keys], type_=ARRAY(Date)),
+        bindparam('bitmaps', packed, type_=ARRAY(LargeBinary))
+    ).table_valued('session_id', 'session_date', 'present').render_derived()
+
+    # ✅ OPTIMIZED: One UPDATE ... FROM unnest() for every session of the batch
+    db.session.execute(
+        update(AttendanceBitmap).where(
+            AttendanceBitmap.session_id == updated.c.session_id,
+            AttendanceBitmap.session_date == updated.c.session_date
+        ).values(present=updated.c.present)
+    )
+    return newly_set
+
+
+def replace(session_id, session_date, roll_numbers):
+    """Store a session's whole attendance, the students with roll_numbers present and everyone else absent"""
+    positions = [roll_number - 1 for roll_number in roll_numbers if roll_number and roll_number > 0]
+    statement = pg_insert(AttendanceBitmap).values(
+        session_id=session_id, session_date=session_date, present=pack_positions(positions)
+    )
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['session_id', 'session_date'], set_={'present': statement.excluded.present}
+    ))
+
+
+def present_counts(session_ids):
+    """NumPy vector with the number of session_ids each bit was present at (index roll_number - 1)"""
+    if not session_ids:
+        return np.zeros(0, dtype=np.int64)
+    bitmaps = db.session.execute(
+        select(AttendanceBitmap.present).where(AttendanceBitmap.session_id.in_(session_ids))
+    ).scalars().all()
+    if not bitmaps:
+        return np.zeros(0, dtype=np.int64)
+    # ✅ OPTIMIZED: One bit test per student and session, vectorized over the whole matrix
+    return unpack(bitmaps).sum(axis=0)
+
+
+def counts_of(counts, roll_numbers):
+    """Look up present_counts for roll numbers, 0 for a missing roll number or one past every bitmap"""
+    positions = np.array([roll_number or 0 for roll_number in roll_numbers], dtype=np.int64) - 1
+    known = (positions >= 0) & (positions < len(counts))
+    result = np.zeros(len(positions), dtype=np.int64)
+    result[known] = counts[positions[known]]
+    return result
+
+
+FROM_RECORDS = """
+    WITH bytes AS (
+        SELECT r.session_id, r.session_date, (s.roll_number - 1) / 8 AS byte,
+               sum(DISTINCT 1 << ((s.roll_number - 1) % 8)) AS value
+        FROM attendance_record r
+        JOIN student s ON s.id = r.student_id
+        WHERE r.status AND s.roll_number > 0 AND r.session_date BETWEEN :start AND :end
+        GROUP BY 1, 2, 3
+    ), sessions AS (
+        SELECT session_id, session_date, max(byte) AS last FROM bytes GROUP BY 1, 2
+    )
+    INSERT INTO attendance_bitmap (session_id, session_date, present)
+    SELECT sessions.session_id, sessions.session_date,
+           decode(string_agg(lpad(to_hex(coalesce(bytes.value, 0)), 2, '0'), '' ORDER BY byte), 'hex')
+    FROM sessions
+    CROSS JOIN LATERAL generate_series(0, sessions.last) AS byte
+    LEFT JOIN bytes USING (session_id, session_date, byte)
+    GROUP BY sessions.session_id, sessions.session_date
+    ON CONFLICT (session_id, session_date) DO UPDATE SET present = excluded.present
+"""
+
+
+def duplicate_rolls(*conditions):
+    """Roll numbers held by more than one student of a section (students matching conditions), at most 50"""
+    rows = db.session.query(
+        Student.year, Student.department, Student.section, Student.roll_number,
+        func.array_agg(Student.id).label('students')
+    ).filter(*conditions).group_by(
+        Student.year, Student.department, Student.section, Student.roll_number
+    ).having(func.count() > 1).order_by(
+        Student.year, Student.department, Student.section, Student.roll_number
+    ).limit(50)
+    return [{
+        'year': row.year,
+        'department': row.department,
+        'section': row.section,
+        'roll_number': row.roll_number,
+        'students': sorted(row.students)
+    } for row in rows]
+
+
+def server_supported():
+    return db.session.connection().dialect.server_version_info >= MIN_SERVER_VERSION
+
+
+def from_records(start, end, delete_records=False):
+    """
+    Build the bitmaps of the sessions from start to end out of their attendance_record rows
+    The caller commits.
+
+    Returns:
+        dict with the bitmaps written and the records deleted
+    """
+    bounds = {'start': start, 'end': end}
+    written = db.session.execute(text(FROM_RECORDS), bounds).rowcount
+    deleted = 0
+    if delete_records:
+        deleted = db.session.execute(
+            AttendanceRecord.__table__.delete().where(AttendanceRecord.session_date.between(start, end))
+        ).rowcount
+    return {'bitmaps': written, 'records_deleted': deleted}
+
+
+attendance_cli = AppGroup('attendance', help='Attendance storage maintenance.')
+
+
+@attendance_cli.command('to-bitmap')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First session date (default: the oldest).')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Last session date (default: the newest).')
+@click.option('--delete-records', is_flag=True, help='Delete the converted attendance_record rows.')
+def to_bitmap_command(start, end, delete_records):
+    """Convert attendance_record rows into bitmaps, before switching ATTENDANCE_STORAGE to bitmap."""
+    if not server_supported():
+        raise click.ClickException('Bitmap storage needs PostgreSQL 14 or newer (bit_count on bytea)')
+    duplicates = duplicate_rolls()
+    if duplicates:
+        for duplicate in duplicates:
+            click.echo(
+                f'E{duplicate["year"]} {duplicate["department"]}-{duplicate["section"]} roll number '
+                f'{duplicate["roll_number"]}: {", ".join(duplicate["students"])}'
+            )
+        raise click.ClickException('Roll numbers must be distinct within a section before switching to bitmap storage')
+
+    oldest, newest = db.session.query(func.min(AttendanceRecord.session_date), func.max(AttendanceRecord.session_date)).one()
+    start = start.date() if start else oldest
+    end = end.date() if end else newest
+    if start is None or end is None:
+        click.echo('No attendance records to convert')
+        return
+
+    try:
+        result = from_records(start, end, delete_records)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    click.echo(f'{result["bitmaps"]} session bitmaps written for {start} .. {end}')
+    if delete_records:
+        click.echo(f'{result["records_deleted"]} attendance records deleted')
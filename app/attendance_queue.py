@@ -0,0 +1,205 @@
+"""
+Write-behind queue for student attendance marks (ATTENDANCE_WRITE_BEHIND=true)
+mark_attendance validates the mark and queues it; a flusher thread writes
+everything queued every ATTENDANCE_FLUSH_MS with one UPDATE ... FROM unnest(),
+so a section marking at once costs one transaction instead of one per student.
+Reads of a session's attendance overlay the pending marks (read-your-write).
+
+Loss is bounded: at most ATTENDANCE_QUEUE_LIMIT marks are pending per worker
+(further marks are written synchronously), a failed flush is retried on the
+next tick, and the queue is flushed when the process exits. A worker that is
+killed outright loses what it accepted in its last flush interval. Each batch is
+written and committed under _flush_lock, which discard() and discard_session()
+also take, so a faculty correction made after them always commits after any
+batch that was already being written and is never overwritten by it. When a batch
+fails, its marks are written one by one, so a bad mark cannot hold back the
+rest; a mark that fails ATTENDANCE_FLUSH_RETRIES flushes is logged and dropped.
+"""
+
+import atexit
+import logging
+import threading
+
+from flask import current_app
+from sqlalchemy import Integer, String, bindparam, func, update
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app import attendance_store, db
+from app.models import AttendanceRecord, Schedule
+
+logger = logging.getLogger(__name__)
+
+_pending = {}  # (session_id, student_id) -> failed flushes, in arrival order
+_lock = threading.Lock()
+_flush_lock = threading.Lock()  # Held while a batch is written and committed
+_flusher = None
+
+
+def enabled():
+    return current_app.config['ATTENDANCE_WRITE_BEHIND']
+
+
+def submit(session_id, student_id):
+    """
+    Queue a present mark
+
+    Returns:
+        False when the queue is full and the caller must write it itself
+    """
+    start(current_app._get_current_object())
+    with _lock:
+        if len(_pending) >= current_app.config['ATTENDANCE_QUEUE_LIMIT']:
+            return False
+        _pending.setdefault((int(session_id), student_id), 0)
+        return True
+
+
+def is_pending(session_id, student_id):
+    with _lock:
+        return (int(session_id), student_id) in _pending
+
+
+def pending_students(session_id):
+    """Students of a session whose present mark is still queued"""
+    with _lock:
+        return {student_id for (pending_session, student_id) in _pending if pending_session == int(session_id)}
+
+
+def discard(session_id, student_id):
+    """
+    Drop a queued mark, so a later manual correction is not overwritten by the flusher
+    Waits for a batch being written, call it before the correction writes anything.
+    """
+    with _flush_lock, _lock:
+        _pending.pop((int(session_id), student_id), None)
+
+
+def discard_session(session_id):
+    """Drop every queued mark of a session whose attendance is being replaced as a whole (waits like discard)"""
+    with _flush_lock, _lock:
+        for mark in [mark for mark in _pending if mark[0] == int(session_id)]:
+            del _pending[mark]
+
+
+def write(marks):
+    """Mark students present in one statement, returns the rows updated; the caller commits"""
+    if not marks:
+        return 0
+    if attendance_store.sparse():
+        return attendance_store.mark_present_many(marks)
+
+    marked = func.unnest(
+        bindparam('sessions', [session_id for session_id, _ in marks], type_=ARRAY(Integer)),
+        bindparam('students', [student_id for _, student_id in marks], type_=ARRAY(String))
+    ).table_valued('session_id', 'student_id').render_derived()
+
+    # ✅ OPTIMIZED: One UPDATE ... FROM unnest() JOIN schedule for every mark of the interval,
+    # the schedule's date prunes each mark to its month's partition
+    return db.session.execute(
+        update(AttendanceRecord).where(
+            Schedule.id == marked.c.session_id,
+            AttendanceRecord.session_id == marked.c.session_id,
+            AttendanceRecord.session_date == Schedule.date,
+            AttendanceRecord.student_id == marked.c.student_id,
+            AttendanceRecord.status.is_(False)
+        ).values(status=True)
+    ).rowcount
+
+
+def _write_each(marks):
+    """Write marks one per savepoint, returns (rows updated, marks written, marks failed)"""
+    updated, written, failed = 0, [], []
+    for mark in marks:
+        try:
+            with db.session.begin_nested():
+                updated += write([mark])
+            written.append(mark)
+        except Exception:
+            failed.append(mark)
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return 0, [], marks
+    return updated, written, failed
+
+
+def flush():
+    """Write everything queued (runs in an app context), returns the rows updated"""
+    with _flush_lock:
+        return _flush()
+
+
+def _flush():
+    with _lock:
+        marks = list(_pending)
+
+    if not marks:
+        return 0
+
+    try:
+        updated = write(marks)
+        db.session.commit()
+        written, failed = marks, []
+    except Exception:
+        db.session.rollback()
+        logger.warning('Attendance flush of %d marks failed, writing them one by one', len(marks), exc_info=True)
+        updated, written, failed = _write_each(marks)
+
+    dropped = []
+    with _lock:
+        for mark in written:
+            _pending.pop(mark, None)
+        for mark in failed:
+            # Discarded meanwhile
+            if mark not in _pending:
+                continue
+            _pending[mark] += 1
+            if _pending[mark] >= current_app.config['ATTENDANCE_FLUSH_RETRIES']:
+                del _pending[mark]
+                dropped.append(mark)
+
+    if dropped:
+        logger.error('Dropped %d attendance marks after %d failed flushes: %s',
+                     len(dropped), current_app.config['ATTENDANCE_FLUSH_RETRIES'], dropped)
+    return updated
+
+
+class Flusher(threading.Thread):
+    def __init__(self, app):
+        super().__init__(name='attendance-flusher', daemon=True)
+        self.app = app
+        self.stopped = threading.Event()
+
+    def run(self):
+        interval = self.app.config['ATTENDANCE_FLUSH_MS'] / 1000
+        while not self.stopped.wait(interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self.app.app_context():
+            try:
+                flush()
+            except Exception:
+                logger.exception('Attendance flush failed, %d marks kept for the next try', len(_pending))
+
+    def stop(self):
+        self.stopped.set()
+        self.join(timeout=10)
+
+
+def start(app):
+    """Start this worker's flusher once, it flushes a last time at exit"""
+    global _flusher
+
+    if _flusher is not None:
+        return _flusher
+
+    with _lock:
+        if _flusher is None:
+            _flusher = Flusher(app)
+            _flusher.start()
+            atexit.register(_flusher.stop)
+    return _flusher
@@ -0,0 +1,248 @@
+"""
+How attendance rows are stored (ATTENDANCE_STORAGE)
+dense (default): generate_otp writes an absent row for every student of the
+section and marking flips it to present.
+sparse: only presences and explicit faculty corrections are stored, nothing is
+written when an OTP is generated. A student of the section without a row is absent.
+bitmap: one attendance_bitmap row per session instead of attendance_record
+rows, with a bit per roll number (see attendance_bitmap). Like sparse, nothing
+is written when an OTP is generated.
+
+Reads in dense mode count the stored rows, absent ones included, as they always
+have, so historical percentages do not move when the roster changes. Sparse and
+bitmap modes have no absent rows to count: a held session (schedule.status)
+counts every student of its class (the roster), present are the rows (bits)
+saying so, and absent is the rest. Writes in sparse mode are upserts on
+uq_attendance_session_student.
+"""
+
+from flask import current_app
+from sqlalchemy import Integer, String, and_, bindparam, exists, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+
+from app import attendance_bitmap, db
+from app.models import AttendanceRecord, FacultyAssignment, Schedule, Student
+
+KEY = ['session_id', 'session_date', 'student_id']
+COLUMNS = ['student_id', 'session_id', 'session_date', 'status']
+
+
+def sparse():
+    """Absences are not stored (sparse and bitmap modes)"""
+    return current_app.config['ATTENDANCE_STORAGE'] in ('sparse', 'bitmap')
+
+
+def bitmap():
+    return current_app.config['ATTENDANCE_STORAGE'] == 'bitmap'
+
+
+def in_class(student=Student, assignment=FacultyAssignment):
+    """Join condition: the student belongs to the assignment's class"""
+    return and_(
+        student.year == assignment.year,
+        student.department == assignment.department,
+        student.section == assignment.section
+    )
+
+
+def counted(student=None):
+    """Filter on Schedule: sessions attendance counts, those with a stored row (of the student) in dense mode, held ones otherwise"""
+    if sparse():
+        return Schedule.status.is_(True)
+    condition = and_(AttendanceRecord.session_id == Schedule.id, AttendanceRecord.session_date == Schedule.date)
+    if student is not None:
+        condition = and_(condition, AttendanceRecord.student_id == student.id)
+    return exists().where(condition)
+
+
+def total_count():
+    """Correlated count of the students a schedule counts (use in a query over Schedule): its stored rows in dense mode, the class roster once held otherwise"""
+    if not sparse():
+        return select(func.count(AttendanceRecord.id)).where(
+            AttendanceRecord.session_id == Schedule.id,
+            AttendanceRecord.session_date == Schedule.date
+        ).scalar_subquery()
+    return select(func.count(Student.id)).select_from(FacultyAssignment).join(Student, in_class()).where(
+        FacultyAssignment.id == Schedule.assignment_id,
+        Schedule.status.is_(True)
+    ).scalar_subquery()
+
+
+def present_on(student_id=None):
+    """Outer join condition from schedule to its present rows (of one student)"""
+    condition = and_(
+        AttendanceRecord.session_id == Schedule.id,
+        AttendanceRecord.session_date == Schedule.date,
+        AttendanceRecord.status.is_(True)
+    )
+    if student_id is not None:
+        condition = and_(condition, AttendanceRecord.student_id == student_id)
+    return condition
+
+
+def present_count():
+    """Correlated count of a schedule's present students (use in a query over Schedule)"""
+    if bitmap():
+        return attendance_bitmap.present_count()
+    return select(func.count(AttendanceRecord.id)).where(present_on()).scalar_subquery()
+
+
+def attended(student):
+    """Correlated test: the student (a loaded Student) is present at the schedule"""
+    if bitmap():
+        return attendance_bitmap.attended(student)
+    return exists().where(present_on(student.id))
+
+
+def student_statuses(student, session_ids):
+    """{session id: status} of one student (a loaded Student) for the sessions with a stored mark"""
+    if bitmap():
+        return attendance_bitmap.student_statuses(student, session_ids)
+    rows = db.session.query(AttendanceRecord.session_id, AttendanceRecord.status).filter(
+        AttendanceRecord.student_id == student.id,
+        AttendanceRecord.session_id.in_(session_ids)
+    )
+    return {row.session_id: row.status for row in rows}
+
+
+def present_by_student(assignment, session_ids):
+    """(student id, name, present count over session_ids) for every student of the assignment's class, in roll number order"""
+    if not session_ids:
+        return []
+    if bitmap():
+        students = db.session.query(Student.id, Student.name, Student.roll_number).filter(
+            in_class(Student, assignment)
+        ).order_by(Student.roll_number, Student.id).all()
+        counts = attendance_bitmap.counts_of(
+            attendance_bitmap.present_counts(session_ids), [student.roll_number for student in students]
+        )
+        return [(student.id, student.name, int(count)) for student, count in zip(students, counts)]
+
+    return db.session.query(
+        Student.id,
+        Student.name,
+        func.count(AttendanceRecord.id).label('present_count')
+    ).outerjoin(
+        AttendanceRecord, and_(
+            AttendanceRecord.student_id == Student.id,
+            AttendanceRecord.session_id.in_(session_ids),
+            AttendanceRecord.status.is_(True)
+        )
+    ).filter(in_class(Student, assignment)).group_by(Student.id, Student.name).order_by(Student.roll_number, Student.id).all()
+
+
+def student_totals(assignment, session_ids, held_ids):
+    """
+    (student id, name, present, total) in roll number order
+    Dense mode counts each student's stored rows over session_ids (students without
+    one are left out); sparse and bitmap count every student of the class over held_ids.
+    """
+    if sparse():
+        return [
+            (student_id, name, present, len(held_ids))
+            for student_id, name, present in present_by_student(assignment, held_ids)
+        ]
+    if not session_ids:
+        return []
+    return db.session.query(
+        Student.id,
+        Student.name,
+        func.count(AttendanceRecord.id).filter(AttendanceRecord.status.is_(True)),
+        func.count(AttendanceRecord.id)
+    ).join(AttendanceRecord, and_(
+        AttendanceRecord.student_id == Student.id,
+        AttendanceRecord.session_id.in_(session_ids)
+    )).group_by(Student.id, Student.name).order_by(Student.roll_number, Student.id).all()
+
+
+def session_roster(session_id):
+    """(student id, name, present) in roll number order: the students with a row (dense) or every student of the session's class"""
+    if bitmap():
+        return attendance_bitmap.session_roster(session_id)
+    if not sparse():
+        return db.session.query(
+            Student.id, Student.name, AttendanceRecord.status
+        ).join(
+            AttendanceRecord, Student.id == AttendanceRecord.student_id
+        ).filter(AttendanceRecord.session_id == session_id).order_by(Student.roll_number).all()
+    return db.session.query(
+        Student.id, Student.name, func.coalesce(AttendanceRecord.status, False)
+    ).select_from(Schedule).join(
+        FacultyAssignment, Schedule.assignment_id == FacultyAssignment.id
+    ).join(Student, in_class()).outerjoin(AttendanceRecord, and_(
+        AttendanceRecord.session_id == Schedule.id,
+        AttendanceRecord.session_date == Schedule.date,
+        AttendanceRecord.student_id == Student.id
+    )).filter(Schedule.id == session_id).order_by(Student.roll_number).all()
+
+
+def _upsert(rows, status, only_absent):
+    """INSERT rows (a select of student_id, session_id, session_date) with status, updating existing ones"""
+    statement = pg_insert(AttendanceRecord).from_select(COLUMNS, rows)
+    return statement.on_conflict_do_update(
+        index_elements=KEY,
+        set_={'status': status},
+        where=AttendanceRecord.status.is_(False) if only_absent else None
+    ).returning(AttendanceRecord.id)
+
+
+def class_member(session_id, student_id, *conditions):
+    """Select (student_id, session_id, session_date) when the student belongs to the session's class"""
+    return select(
+        Student.id, Schedule.id, Schedule.date
+    ).select_from(Schedule).join(FacultyAssignment, Schedule.assignment_id == FacultyAssignment.id).join(
+        Student, and_(in_class(), Student.id == student_id)
+    ).where(Schedule.id == session_id, *conditions)
+
+
+def membership(session_id, student_id):
+    """Sparse and bitmap modes: row with the student's status (None when no row) if the student is in the session's class"""
+    if bitmap():
+        return attendance_bitmap.membership(session_id, student_id)
+    return db.session.execute(
+        select(Student.id, AttendanceRecord.status).select_from(Schedule).join(
+            FacultyAssignment, Schedule.assignment_id == FacultyAssignment.id
+        ).join(
+            Student, and_(in_class(), Student.id == student_id)
+        ).outerjoin(AttendanceRecord, and_(
+            AttendanceRecord.session_id == Schedule.id,
+            AttendanceRecord.session_date == Schedule.date,
+            AttendanceRecord.student_id == Student.id
+        )).where(Schedule.id == session_id)
+    ).first()
+
+
+def mark_present(session_id, student_id, *conditions):
+    """
+    Sparse and bitmap modes: store a present mark for a student of the session's class (conditions restrict the schedule)
+
+    Returns:
+        the row (session) id, or None when nothing changed (not in the class, already present or conditions failed)
+    """
+    if bitmap():
+        return attendance_bitmap.set_bit(session_id, student_id, True, *conditions, only_changed=True)
+    rows = class_member(session_id, student_id, *conditions).add_columns(literal(True))
+    return db.session.execute(_upsert(rows, True, only_absent=True)).scalar()
+
+
+def set_status(session_id, student_id, status):
+    """Sparse and bitmap modes: store a faculty correction, returns the row (session) id or None when the student is not in the class"""
+    if bitmap():
+        return attendance_bitmap.set_bit(session_id, student_id, status)
+    rows = class_member(session_id, student_id).add_columns(literal(bool(status)))
+    return db.session.execute(_upsert(rows, bool(status), only_absent=False)).scalar()
+
+
+def mark_present_many(marks):
+    """Sparse and bitmap modes: store present marks for (session_id, student_id) pairs in one statement"""
+    if bitmap():
+        return attendance_bitmap.mark_many(marks)
+    marked = func.unnest(
+        bindparam('sessions', [session_id for session_id, _ in marks], type_=ARRAY(Integer)),
+        bindparam('students', [student_id for _, student_id in marks], type_=ARRAY(String))
+    ).table_valued('session_id', 'student_id').render_derived()
+
+    rows = select(
+        marked.c.student_id, Schedule.id, Schedule.date, literal(True)
+    ).join(Schedule, Schedule.id == marked.c.session_id)
+    return len(db.session.execute(_upsert(rows, True, only_absent=True)).all())
@@ -0,0 +1,63 @@
+"""
+Batched deletes for the cleanup jobs
+Rows go in id-keyset chunks of CLEANUP_BATCH_SIZE, each in its own short
+transaction, with CLEANUP_BATCH_PAUSE_SECONDS between chunks, so a cleanup never
+holds locks on many rows at once. Rows a request has locked are skipped and
+left for the next run. (Partitioned tables have no stable ctid across
+partitions, so the keyset is the id sequence.)
+"""
+
+import time
+
+from flask import current_app
+from sqlalchemy import delete, select, tuple_
+
+from app import db
+
+
+def delete_in_batches(model, *conditions, batch_size=None, pause=None):
+    """
+    DELETE the rows of model matching conditions, one committed chunk at a time
+
+    Returns:
+        dict with rows (deleted), batches, max_batch_ms and paused_ms
+    """
+    config = current_app.config
+    batch_size = batch_size or config['CLEANUP_BATCH_SIZE']
+    pause = config['CLEANUP_BATCH_PAUSE_SECONDS'] if pause is None else pause
+
+    table = model.__table__
+    key = tuple_(*table.primary_key.columns)
+    metrics = {'rows': 0, 'batches': 0, 'max_batch_ms': 0.0, 'paused_ms': 0.0}
+    last_id = 0
+
+    while True:
+        started = time.perf_counter()
+        chunk = select(*table.primary_key.columns).where(
+            *conditions, table.c.id > last_id
+        ).order_by(table.c.id).limit(batch_size).with_for_update(skip_locked=True)
+
+        try:
+            deleted = db.session.execute(
+                delete(table).where(key.in_(chunk)).returning(table.c.id)
+            ).scalars().all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if not deleted:
+            break
+
+        metrics['rows'] += len(deleted)
+        metrics['batches'] += 1
+        metrics['max_batch_ms'] = max(metrics['max_batch_ms'], round((time.perf_counter() - started) * 1000, 2))
+        last_id = max(deleted)
+
+        # A short chunk does not mean the end: SKIP LOCKED may have passed over rows
+        # inside it, so only a chunk that deletes nothing stops the loop
+        if pause:
+            time.sleep(pause)
+            metrics['paused_ms'] += round(pause * 1000, 2)
+
+    return metrics
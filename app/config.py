@@ -1,8 +1,20 @@
 import os
+import tempfile
 from dotenv import load_dotenv
+from sqlalchemy.engine import make_url
 
 load_dotenv()  # Load environment variables from .env
 
+POOLER_PORT = 6543
+
+
+def pooled(url):
+    """True when url goes through the transaction pooler: port 6543, or DATABASE_URL unless it is also the direct URL"""
+    if make_url(url).port == POOLER_PORT:
+        return True
+    return url == os.getenv('DATABASE_URL') and url != os.getenv('SQLALCHEMY_DATABASE_URI')
+
+
 class Config:
     
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
@@ -41,6 +53,54 @@ class Config:
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Background jobs (see app/jobs.py): one process at a time runs them, elected by a Postgres advisory lock
+    # embedded: every web worker is a candidate, standalone: only ams_scheduler.py processes, off: none here
+    SCHEDULER_MODE = os.getenv('SCHEDULER_MODE', 'embedded')
+    SCHEDULER_RETRY_SECONDS = int(os.getenv('SCHEDULER_RETRY_SECONDS', 15))  # Standby lock attempts / leader health checks
+    # The lock is held on its own session, so it must not go through a transaction pooler (port 6543):
+    # with only DATABASE_URL set, no process takes part in the election until this points at port 5432
+    SCHEDULER_LOCK_DATABASE_URI = os.getenv('SCHEDULER_LOCK_DATABASE_URI', _development_url or SQLALCHEMY_DATABASE_URI)
+    OTP_LISTEN_DATABASE_URI = os.getenv('OTP_LISTEN_DATABASE_URI', SCHEDULER_LOCK_DATABASE_URI)  # LISTEN needs a session too
+    JOB_RUN_RETENTION_DAYS = int(os.getenv('JOB_RUN_RETENTION_DAYS', 30))  # History kept in job_run
+    CLEANUP_BATCH_SIZE = int(os.getenv('CLEANUP_BATCH_SIZE', 5000))  # Rows per committed chunk of the cleanup deletes
+    CLEANUP_BATCH_PAUSE_SECONDS = float(os.getenv('CLEANUP_BATCH_PAUSE_SECONDS', 0.05))  # Sleep between chunks
+    
+    # Attendance OTPs expire this long after generate-otp (checked in SQL, swept every minute)
+    OTP_TTL_SECONDS = int(os.getenv('OTP_TTL_SECONDS', 45))
+    # Active OTPs are verified from memory, kept in sync per worker with LISTEN/NOTIFY (see otp_cache)
+    OTP_CACHE_ENABLED = os.getenv('OTP_CACHE_ENABLED', 'true').lower() == 'true'
+
+    # dense: generate-otp stores an absent row per student; sparse: only presences and corrections (see attendance_store);
+    # bitmap: one row per session with a bit per roll number (see attendance_bitmap), needs PostgreSQL 14+
+    # and roll numbers distinct within each section
+    ATTENDANCE_STORAGE = os.getenv('ATTENDANCE_STORAGE', 'dense')
+
+    # Opt-in write-behind for /api/attendance/mark: marks are queued and written in batches (see attendance_queue)
+    ATTENDANCE_WRITE_BEHIND = os.getenv('ATTENDANCE_WRITE_BEHIND', 'false').lower() == 'true'
+    ATTENDANCE_FLUSH_MS = int(os.getenv('ATTENDANCE_FLUSH_MS', 100))  # Flush interval
+    ATTENDANCE_QUEUE_LIMIT = int(os.getenv('ATTENDANCE_QUEUE_LIMIT', 10000))  # Pending marks per worker, beyond this marks are written directly
+    ATTENDANCE_FLUSH_RETRIES = int(os.getenv('ATTENDANCE_FLUSH_RETRIES', 5))  # Failed flushes before a mark is logged and dropped
+    
+    # Background upload jobs (POST with async=true)
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(tempfile.gettempdir(), 'ams_uploads'))
+    UPLOAD_JOB_WORKERS = int(os.getenv('UPLOAD_JOB_WORKERS', 2))   # Uploads ingested concurrently
+    UPLOAD_JOB_QUEUE = int(os.getenv('UPLOAD_JOB_QUEUE', 8))       # Uploads allowed to wait for a worker
+    UPLOAD_CHUNK_ROWS = int(os.getenv('UPLOAD_CHUNK_ROWS', 2000))  # Rows per streamed batch (bounds memory)
+    
+    # Multi-sheet workbooks (one sheet per batch and department, e.g. E1-CSE)
+    UPLOAD_PARSE_PROCESSES = int(os.getenv('UPLOAD_PARSE_PROCESSES', min(4, os.cpu_count() or 1)))  # Sheets parsed in parallel
+    UPLOAD_LOAD_THREADS = int(os.getenv('UPLOAD_LOAD_THREADS', 4))  # Sheets loaded in parallel (keep below pool_size)
+    
+    # Days of schedules kept materialized ahead of today by the nightly job
+    SCHEDULE_HORIZON_DAYS = int(os.getenv('SCHEDULE_HORIZON_DAYS', 7))
+    CALENDAR_CACHE_SECONDS = int(os.getenv('CALENDAR_CACHE_SECONDS', 300))  # Academic calendar reload interval per process
+    BULK_SCHEDULE_MAX_DAYS = int(os.getenv('BULK_SCHEDULE_MAX_DAYS', 180))  # Longest date range of POST /schedule/bulk
+    
+    # schedule and attendance_record are partitioned by month (see app/partitions.py)
+    PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 2))       # Months created ahead by the nightly job
+    SCHEDULE_RETENTION_DAYS = int(os.getenv('SCHEDULE_RETENTION_DAYS', 100))   # Whole months older than this are archived
+    ARCHIVE_FOLDER = os.getenv('ARCHIVE_FOLDER', os.path.join(tempfile.gettempdir(), 'ams_archive'))  # Gzip CSVs of detached months
+    
     # Production-ready connection pool settings
     # These settings work with both direct connections and PgBouncer
     SQLALCHEMY_ENGINE_OPTIONS = {
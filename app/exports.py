@@ -0,0 +1,201 @@
+"""
+Streaming attendance register exports
+A register is one student x session matrix per section. Students are read
+through a server-side cursor in roll-number order, so memory depends on the
+number of sessions in a section, not on the number of students or records.
+With bitmap storage the sessions' bitmaps are unpacked once into a NumPy
+matrix and each student's marks are one column of it.
+"""
+
+import csv
+import io
+import os
+import tempfile
+
+from openpyxl import Workbook
+from sqlalchemy import and_, select
+
+from app import attendance_bitmap, attendance_store, db
+from app.models import Student, Schedule, AttendanceBitmap, AttendanceRecord, FacultyAssignment
+
+FETCH_ROWS = 2000
+STREAM_BYTES = 64 * 1024
+
+
+def _session_filter(year, department, start, end, section=None, subject_code=None):
+    conditions = [
+        FacultyAssignment.year == year,
+        FacultyAssignment.department == department,
+        Schedule.date.between(start, end)
+    ]
+    if section:
+        conditions.append(FacultyAssignment.section == section)
+    if subject_code:
+        conditions.append(FacultyAssignment.subject_code == subject_code)
+    return conditions
+
+
+def register_sessions(year, department, start, end, section=None, subject_code=None):
+    """
+    Sessions of the register in column order, grouped by section
+
+    Returns:
+        dict section -> list of (session id, column label, held)
+    """
+    query = select(
+        FacultyAssignment.section, Schedule.id, Schedule.date, Schedule.start_time, FacultyAssignment.subject_code,
+        Schedule.status
+    ).join(FacultyAssignment, Schedule.assignment_id == FacultyAssignment.id).where(
+        *_session_filter(year, department, start, end, section, subject_code)
+    ).order_by(FacultyAssignment.section, Schedule.date, Schedule.start_time, Schedule.id)
+
+    sessions = {}
+    for row in db.session.execute(query):
+        sessions.setdefault(row.section, []).append(
+            (row.id, f'{row.date.isoformat()} {row.start_time} {row.subject_code}', bool(row.status))
+        )
+    return sessions
+
+
+def _register_session_ids(year, department, start, end, section=None, subject_code=None):
+    return select(Schedule.id).join(
+        FacultyAssignment, Schedule.assignment_id == FacultyAssignment.id
+    ).where(*_session_filter(year, department, start, end, section, subject_code))
+
+
+def _register_bitmaps(year, department, start, end, section=None, subject_code=None):
+    """Bitmap storage: (session ids, sessions x roll numbers matrix) of the register's sessions with a bitmap"""
+    rows = db.session.execute(
+        select(AttendanceBitmap.session_id, AttendanceBitmap.present).where(
+            AttendanceBitmap.session_date.between(start, end),  # Prunes to the months of the register
+            AttendanceBitmap.session_id.in_(_register_session_ids(year, department, start, end, section, subject_code))
+        )
+    ).all()
+    return [session_id for session_id, _ in rows], attendance_bitmap.unpack([present for _, present in rows])
+
+
+def _register_records(year, department, start, end, section=None, subject_code=None, with_records=True):
+    """Yield (section, student id, roll number, name[, session id, status]) in register order"""
+    query = select(Student.section, Student.id, Student.roll_number, Student.name)
+    if with_records:
+        query = query.add_columns(AttendanceRecord.session_id, AttendanceRecord.status).outerjoin(
+            AttendanceRecord,
+            and_(
+                AttendanceRecord.student_id == Student.id,
+                AttendanceRecord.session_date.between(start, end),  # Prunes to the months of the register
+                AttendanceRecord.session_id.in_(_register_session_ids(year, department, start, end, section, subject_code))
+            )
+        )
+
+    query = query.where(
+        Student.year == year,
+        Student.department == department
+    ).order_by(Student.section, Student.roll_number, Student.id)
+
+    if section:
+        query = query.where(Student.section == section)
+
+    # ✅ OPTIMIZED: yield_per streams rows from a server-side cursor instead of fetching everything
+    yield from db.session.execute(query, execution_options={'yield_per': FETCH_ROWS})
+
+
+def _bitmap_marks(bitmaps, roll_number):
+    """{session id: present} of one student from the register's bitmaps"""
+    session_ids, matrix = bitmaps
+    bit = (roll_number or 0) - 1
+    if 0 <= bit < matrix.shape[1]:
+        return dict(zip(session_ids, matrix[:, bit].tolist()))
+    return dict.fromkeys(session_ids, False)
+
+
+def register_rows(year, department, start, end, section=None, subject_code=None):
+    """
+    Yield register blocks as ('header', section, cells) and ('student', section, cells) tuples
+    Each section starts with a header row; cells are P (present), A (absent) or
+    empty (no record), followed by present, total and percentage. Sparse and bitmap
+    storage have no absent rows: there a held session without a mark is an absence.
+    """
+    sessions = register_sessions(year, department, start, end, section, subject_code)
+    bitmaps = _register_bitmaps(year, department, start, end, section, subject_code) if attendance_store.bitmap() else None
+    current, marks, student = None, {}, None
+    absent_unstored = attendance_store.sparse()
+
+    def student_row():
+        columns = sessions.get(student[0], [])
+        cells = [
+            'P' if marks.get(session_id) else 'A' if (held and absent_unstored) or session_id in marks else ''
+            for session_id, _, held in columns
+        ]
+        present = cells.count('P')
+        total = present + cells.count('A')
+        percentage = round(present * 100 / total, 2) if total else 0
+        return list(student[1:]) + cells + [present, total, percentage]
+
+    records = _register_records(year, department, start, end, section, subject_code, with_records=bitmaps is None)
+    for record in records:
+        if student and record.id != student[1]:
+            yield 'student', student[0], student_row()
+            marks = {}
+
+        if record.section != current:
+            current = record.section
+            labels = [label for _, label, _ in sessions.get(current, [])]
+            yield 'header', current, ['Student ID', 'Roll Number', 'Name'] + labels + ['Present', 'Total', 'Percentage']
+
+        student = (record.section, record.id, record.roll_number, record.name)
+        if bitmaps is not None:
+            marks = _bitmap_marks(bitmaps, record.roll_number)
+        elif record.session_id is not None:
+            marks[record.session_id] = record.status
+
+    if student:
+        yield 'student', student[0], student_row()
+
+
+def stream_csv(rows):
+    """Encode register rows as CSV, one section block after another"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    for kind, section, cells in rows:
+        if kind == 'header':
+            if buffer.tell():
+                writer.writerow([])
+            writer.writerow([f'Section {section}'])
+        writer.writerow(cells)
+
+        if buffer.tell() >= STREAM_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def stream_xlsx(rows):
+    """
+    Encode register rows as XLSX with one sheet per section
+    openpyxl write-only mode keeps rows on disk, so the workbook is built in a
+    temp file and then streamed; nothing is sent until it is complete.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = None
+    for kind, section, cells in rows:
+        if kind == 'header':
+            sheet = workbook.create_sheet(title=f'Section {section}'[:31])
+        sheet.append(cells)
+    if sheet is None:
+        workbook.create_sheet(title='Register')
+
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as stream:
+            while True:
+                chunk = stream.read(STREAM_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
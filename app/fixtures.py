@@ -0,0 +1,387 @@
+"""
+Synthetic campus data for benchmarks and load tests
+Generates a reproducible campus (students, subjects, faculty assignments and
+a weekly timetable) at any scale, writes it as upload workbooks and loads it
+into the database together with a semester of schedules and attendance.
+
+    flask fixtures generate --students 20000 --out fixtures/
+    flask fixtures load --students 20000 --weeks 16 --reset
+"""
+
+import math
+import os
+from datetime import date, timedelta
+
+import click
+import numpy as np
+import pandas as pd
+from flask.cli import AppGroup
+from openpyxl import Workbook
+from sqlalchemy import text
+
+from app import attendance_bitmap, attendance_store, db, ingestion, partitions
+from app.models import Student, Subject, Faculty, FacultyAssignment, DefaultSchedule, Schedule, AttendanceRecord, AttendanceBitmap
+
+DEPARTMENTS = ['CSE', 'ECE', 'EEE', 'MECH', 'CIVIL', 'CHEM', 'MME']
+BATCHES = {1: 'E1', 2: 'E2', 3: 'E3', 4: 'E4'}
+SECTION_SIZE = 60
+THEORY_PER_CLASS = 6
+LABS_PER_CLASS = 2
+SECTIONS_PER_FACULTY = 3
+TEACHING_DAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT']
+PRESENT_RATE = 0.85
+HELD_RATE = 0.95
+
+FIRST_NAMES = ['Aarav', 'Ananya', 'Bhavya', 'Chaitanya', 'Divya', 'Harsha', 'Kavya', 'Lakshmi',
+               'Manoj', 'Meghana', 'Naveen', 'Pooja', 'Rahul', 'Sai', 'Sneha', 'Teja', 'Varun', 'Yamini']
+LAST_NAMES = ['Reddy', 'Naidu', 'Rao', 'Sharma', 'Kumar', 'Chowdary', 'Varma', 'Goud', 'Yadav', 'Patel']
+
+
+def _names(rng, count):
+    first = rng.choice(FIRST_NAMES, count)
+    last = rng.choice(LAST_NAMES, count)
+    return pd.Series(first).str.cat(pd.Series(last), sep=' ')
+
+
+def generate_campus(students=4000, seed=0):
+    """
+    Build a campus of about `students` students spread over every batch and department
+
+    Returns:
+        dict of DataFrames in upload-sheet format (students, subjects, faculty,
+        timetable), each with Batch and Department columns for splitting
+    """
+    rng = np.random.default_rng(seed)
+    groups = [(year, department) for year in BATCHES for department in DEPARTMENTS]
+    per_group = max(1, math.ceil(students / len(groups)))
+    sections = [chr(ord('A') + i) for i in range(math.ceil(per_group / SECTION_SIZE))]
+
+    student_frames, subject_rows, faculty_rows, timetable_rows = [], [], [], []
+    faculty_count = 0
+
+    for group, (year, department) in enumerate(groups):
+        batch = BATCHES[year]
+        count = min(per_group, students - group * per_group)
+        if count <= 0:
+            break
+
+        numbers = np.arange(count)
+        student_frames.append(pd.DataFrame({
+            'id': [f'B{year}{group:02d}{n:05d}' for n in numbers],
+            'name': _names(rng, count),
+            'roll_number': numbers % SECTION_SIZE + 1,
+            'section': [sections[n // SECTION_SIZE] for n in numbers],
+            'Batch': batch,
+            'Department': department
+        }))
+        group_sections = sections[:math.ceil(count / SECTION_SIZE)]
+
+        # Subject codes stay within subject.subject_code (10 chars): CSE1T01, CSE1L02
+        codes = [(f'{department[:3]}{year}T{i:02d}', 'Theory') for i in range(1, THEORY_PER_CLASS + 1)]
+        codes += [(f'{department[:3]}{year}L{i:02d}', 'Lab') for i in range(1, LABS_PER_CLASS + 1)]
+
+        teachers = {}
+        for code, kind in codes:
+            subject_rows.append({
+                'code': code,
+                'mnemonic': code.replace(department[:3], department[:1]),
+                'name': f'{department} {kind} {code[-2:]} (Year {year})',
+                'type': kind
+            })
+            for index, section in enumerate(group_sections):
+                if index % SECTIONS_PER_FACULTY == 0:
+                    faculty_count += 1
+                teachers[code, section] = f'F{faculty_count:05d}'
+
+        for index, section in enumerate(group_sections):
+            for code, kind in codes:
+                faculty_rows.append({
+                    'FacultyId': teachers[code, section],
+                    'SubjectCode': code,
+                    'Department': department,
+                    'Year': batch,
+                    'Section': section
+                })
+            timetable_rows.extend(_week(codes, teachers, section, index, batch, department))
+
+    faculty = pd.DataFrame(faculty_rows)
+    ids = faculty['FacultyId'].drop_duplicates()
+    names = dict(zip(ids, _names(rng, len(ids))))
+    faculty.insert(1, 'FacultyName', faculty['FacultyId'].map(names))
+
+    return {
+        'students': pd.concat(student_frames, ignore_index=True),
+        'subjects': pd.DataFrame(subject_rows),
+        'faculty': faculty,
+        'timetable': pd.DataFrame(timetable_rows)
+    }
+
+
+def _week(codes, teachers, section, offset, batch, department):
+    """Timetable rows of one section: each lab once a week in a 3-period block, theory fills the rest"""
+    free = {day: [True] * (ingestion.LAST_PERIOD + 1) for day in TEACHING_DAYS}
+    rows = []
+
+    def add(day, period, code):
+        rows.append({
+            'Day': day, 'Section': section, 'Period': period, 'SubjectCode': code,
+            'FacultyId': teachers[code, section],
+            'Venue': f'LAB-{offset % 9 + 1}' if code[-3] == 'L' else f'AB{offset % 3 + 1}-{100 + offset % 40}',
+            'Batch': batch, 'Department': department
+        })
+
+    labs = [code for code, kind in codes if kind == 'Lab']
+    theory = [code for code, kind in codes if kind == 'Theory']
+
+    for index, code in enumerate(labs):
+        day = TEACHING_DAYS[(2 * index + offset) % len(TEACHING_DAYS)]
+        start = 1 if (index + offset) % 2 == 0 else ingestion.LAST_PERIOD - ingestion.LAB_DURATION + 1
+        for period in range(start, start + ingestion.LAB_DURATION):
+            free[day][period] = False
+        add(day, start, code)
+
+    slot = offset
+    for day in TEACHING_DAYS:
+        for period in range(1, ingestion.LAST_PERIOD + 1):
+            if free[day][period]:
+                add(day, period, theory[slot % len(theory)])
+                slot += 1
+
+    return rows
+
+
+def _write_sheets(path, sheets):
+    """Write {sheet name: DataFrame} with openpyxl write-only mode (fast at any size)"""
+    workbook = Workbook(write_only=True)
+    for name, frame in sheets.items():
+        sheet = workbook.create_sheet(title=name)
+        sheet.append(list(frame.columns))
+        for row in frame.itertuples(index=False):
+            sheet.append([value.item() if isinstance(value, np.generic) else value for value in row])
+    workbook.save(path)
+
+
+def _by_group(frame, columns):
+    return {
+        f'{batch}-{department}': group[columns]
+        for (batch, department), group in frame.groupby(['Batch', 'Department'], sort=False)
+    }
+
+
+def write_workbooks(campus, folder):
+    """
+    Write the campus as upload files
+
+    Returns:
+        dict of file paths: subjects, faculty, students (one sheet per group),
+        students_flat (single sheet) and timetable (one sheet per group)
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = {name: os.path.join(folder, f'{name}.xlsx')
+             for name in ('subjects', 'faculty', 'students', 'students_flat', 'timetable')}
+
+    _write_sheets(paths['subjects'], {'Subjects': campus['subjects']})
+    _write_sheets(paths['faculty'], {'Faculty': campus['faculty'][ingestion.FACULTY_COLUMNS]})
+    _write_sheets(paths['students'], _by_group(campus['students'], ingestion.STUDENT_COLUMNS))
+    _write_sheets(paths['students_flat'], {'Students': campus['students'][ingestion.STUDENT_COLUMNS]})
+    _write_sheets(paths['timetable'], _by_group(campus['timetable'], ingestion.TIMETABLE_COLUMNS))
+    return paths
+
+
+def _reserve_ids(table, count):
+    """Take count ids from the table's serial sequence, so rows can be COPYed with their ids"""
+    if count == 0:
+        return np.array([], dtype='int64')
+    rows = db.session.execute(
+        text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+        {'table': table.name, 'count': count}
+    )
+    return np.fromiter((row[0] for row in rows), dtype='int64', count=count)
+
+
+def load_campus(campus):
+    """
+    COPY the campus into the database (students, subjects, faculty, assignments, default timetable)
+
+    Returns:
+        the default timetable as loaded (assignment_id, day_of_week, times, year, department, section)
+    """
+    years = {batch: year for year, batch in BATCHES.items()}
+
+    students = campus['students']
+    ingestion.copy_frame(Student.__table__, pd.DataFrame({
+        'id': students['id'],
+        'roll_number': students['roll_number'],
+        'name': students['name'],
+        'email': students['id'].str.lower() + ingestion.EMAIL_DOMAIN,
+        'year': students['Batch'].map(years),
+        'department': students['Department'],
+        'section': students['section']
+    }))
+
+    subjects = campus['subjects']
+    ingestion.copy_frame(Subject.__table__, pd.DataFrame({
+        'subject_code': subjects['code'],
+        'subject_mnemonic': subjects['mnemonic'],
+        'subject_name': subjects['name'],
+        'subject_type': subjects['type']
+    }))
+
+    faculty = campus['faculty']
+    ingestion.copy_frame(Faculty.__table__, ingestion.prepare_faculties(faculty['FacultyId'], faculty['FacultyName']))
+
+    assignments = pd.DataFrame({
+        'id': _reserve_ids(FacultyAssignment.__table__, len(faculty)),
+        'faculty_id': faculty['FacultyId'],
+        'subject_code': faculty['SubjectCode'],
+        'year': faculty['Year'].map(years),
+        'department': faculty['Department'],
+        'section': faculty['Section']
+    })
+    ingestion.copy_frame(FacultyAssignment.__table__, assignments)
+
+    timetable = campus['timetable'].assign(year=campus['timetable']['Batch'].map(years)).merge(
+        assignments.rename(columns={'id': 'assignment_id'}),
+        left_on=['FacultyId', 'SubjectCode', 'year', 'Department', 'Section'],
+        right_on=['faculty_id', 'subject_code', 'year', 'department', 'section']
+    )
+    is_lab = timetable['SubjectCode'].str[-3].eq('L').to_numpy()
+    period = timetable['Period'].to_numpy()
+    defaults = pd.DataFrame({
+        'assignment_id': timetable['assignment_id'],
+        'day_of_week': timetable['Day'],
+        'start_time': ingestion.PERIOD_START[period],
+        'end_time': ingestion.PERIOD_END[period + np.where(is_lab, ingestion.LAB_DURATION - 1, 0)],
+        'venue': timetable['Venue']
+    })
+    ingestion.copy_frame(DefaultSchedule.__table__, defaults)
+
+    return defaults.assign(year=timetable['year'], department=timetable['department'], section=timetable['section'])
+
+
+def _bitmaps(session_ids, roll_numbers, day):
+    """attendance_bitmap rows of a day, one per session with the bits of its present roll numbers"""
+    if len(session_ids) == 0:
+        return pd.DataFrame(columns=['session_id', 'session_date', 'present'])
+
+    sessions, rows = np.unique(session_ids, return_inverse=True)
+    bits = np.zeros((len(sessions), roll_numbers.max()), dtype=bool)
+    bits[rows, roll_numbers - 1] = True
+    return pd.DataFrame({
+        'session_id': sessions,
+        'session_date': day.isoformat(),
+        'present': ['\\x' + attendance_bitmap.pack(row).hex() for row in bits]  # bytea hex input for COPY
+    })
+
+
+def load_semester(campus, defaults, weeks=16, until=None, seed=0):
+    """
+    Materialize `weeks` weeks of schedules before `until` (default today) from the
+    default timetable and mark attendance for every class that was held
+
+    Returns:
+        dict with schedules and attendance row counts
+    """
+    rng = np.random.default_rng(seed)
+    until = until or date.today()
+    years = {batch: year for year, batch in BATCHES.items()}
+    roster = pd.DataFrame({
+        'student_id': campus['students']['id'],
+        'roll_number': campus['students']['roll_number'],
+        'year': campus['students']['Batch'].map(years),
+        'department': campus['students']['Department'],
+        'section': campus['students']['section']
+    })
+    by_day = {day: frame for day, frame in defaults.groupby('day_of_week')}
+    totals = {'schedules': 0, 'attendance': 0}
+    partitions.ensure(until - timedelta(days=weeks * 7), until)
+
+    for offset in range(weeks * 7, 0, -1):
+        day = until - timedelta(days=offset)
+        classes = by_day.get(day.strftime('%a').upper())
+        if classes is None:
+            continue
+
+        held = rng.random(len(classes)) < HELD_RATE
+        schedules = pd.DataFrame({
+            'id': _reserve_ids(Schedule.__table__, len(classes)),
+            'assignment_id': classes['assignment_id'].to_numpy(),
+            'date': day.isoformat(),
+            'start_time': classes['start_time'].to_numpy(),
+            'end_time': classes['end_time'].to_numpy(),
+            'status': held,
+            'venue': classes['venue'].to_numpy(),
+            'materialized': True
+        })
+        ingestion.copy_frame(Schedule.__table__, schedules)
+
+        sessions = schedules.loc[held, ['id']].assign(
+            year=classes['year'].to_numpy()[held],
+            department=classes['department'].to_numpy()[held],
+            section=classes['section'].to_numpy()[held]
+        )
+        marks = sessions.merge(roster, on=['year', 'department', 'section'])
+        attendance = pd.DataFrame({
+            'student_id': marks['student_id'],
+            'session_id': marks['id'],
+            'session_date': day.isoformat(),
+            'status': rng.random(len(marks)) < PRESENT_RATE
+        })
+        if attendance_store.bitmap():
+            present = attendance['status'].to_numpy()
+            attendance = _bitmaps(marks['id'].to_numpy()[present], marks['roll_number'].to_numpy()[present], day)
+            ingestion.copy_frame(AttendanceBitmap.__table__, attendance)
+        else:
+            if attendance_store.sparse():
+                attendance = attendance[attendance['status']]
+            ingestion.copy_frame(AttendanceRecord.__table__, attendance)
+
+        totals['schedules'] += len(schedules)
+        totals['attendance'] += len(attendance)
+
+    return totals
+
+
+fixtures_cli = AppGroup('fixtures', help='Synthetic campus data for benchmarks and load tests.')
+
+
+@fixtures_cli.command('generate')
+@click.option('--students', default=4000, show_default=True, help='Number of students (e.g. 4000, 20000, 100000).')
+@click.option('--out', default='fixtures', show_default=True, type=click.Path(file_okay=False))
+@click.option('--seed', default=0, show_default=True)
+def generate_command(students, out, seed):
+    """Write upload workbooks (subjects, faculty, students, timetable) for a synthetic campus."""
+    campus = generate_campus(students, seed)
+    for name, path in write_workbooks(campus, out).items():
+        click.echo(f'{name:<14} {path}')
+    click.echo(f'{len(campus["students"])} students, {len(campus["subjects"])} subjects, '
+               f'{len(campus["faculty"])} assignments, {len(campus["timetable"])} timetable rows')
+
+
+@fixtures_cli.command('load')
+@click.option('--students', default=4000, show_default=True)
+@click.option('--weeks', default=16, show_default=True, help='Weeks of past schedules and attendance.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--reset', is_flag=True, help='Drop and recreate all tables first.')
+@click.option('--yes', is_flag=True, help='Do not ask before --reset.')
+def load_command(students, weeks, seed, reset, yes):
+    """Load a synthetic campus and a semester of schedules and attendance into the database."""
+    if reset:
+        if not yes:
+            click.confirm(f'Drop every table in {db.engine.url.render_as_string()}?', abort=True)
+        db.drop_all()
+        db.create_all()
+
+    timer = ingestion.Timer()
+    campus = generate_campus(students, seed)
+    try:
+        defaults = load_campus(campus)
+        totals = load_semester(campus, defaults, weeks, seed=seed)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    click.echo(f'{len(campus["students"])} students, {len(defaults)} default schedules, '
+               f'{totals["schedules"]} schedules, {totals["attendance"]} attendance records '
+               f'in {timer.elapsed:.1f}s')
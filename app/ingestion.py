@@ -0,0 +1,750 @@
+"""
+Bulk ingestion helpers for the Excel/CSV upload endpoints
+Validation and transformation are vectorized with pandas and rows are
+loaded into PostgreSQL with COPY FROM STDIN from an in-memory buffer
+"""
+
+import io
+import os
+import re
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from sqlalchemy import (
+    Column, Integer, MetaData, String, Table, and_, column, delete, insert, literal_column, select, text,
+    true, tuple_, values
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from werkzeug.datastructures import FileStorage
+
+from app import db
+from app.models import Student, Subject, Faculty, FacultyAssignment, DefaultSchedule, WEEKDAYS
+
+EMAIL_DOMAIN = '@rguktrkv.ac.in'
+
+# SQLSTATE of a unique constraint violation
+UNIQUE_VIOLATION = '23505'
+
+# Rows per batch handed to validation/COPY by ChunkedReader
+CHUNK_ROWS = 2000
+
+STUDENT_COLUMNS = ['id', 'name', 'roll_number', 'section']
+SUBJECT_COLUMNS = ['code', 'mnemonic', 'name', 'type']
+FACULTY_COLUMNS = ['FacultyId', 'FacultyName', 'SubjectCode', 'Department', 'Year', 'Section']
+TIMETABLE_COLUMNS = ['Day', 'Section', 'Period', 'SubjectCode', 'FacultyId', 'Venue']
+
+# Period -> (start, end), index 0 is unused so a period number indexes directly
+PERIOD_TIMES = {
+    1: ("08:30", "09:30"),
+    2: ("09:30", "10:30"),
+    3: ("10:30", "11:30"),
+    4: ("11:30", "12:30"),
+    5: ("13:40", "14:40"),
+    6: ("14:40", "15:40"),
+    7: ("15:40", "16:40"),
+}
+PERIOD_START = np.array([''] + [PERIOD_TIMES[p][0] for p in sorted(PERIOD_TIMES)], dtype=object)
+PERIOD_END = np.array([''] + [PERIOD_TIMES[p][1] for p in sorted(PERIOD_TIMES)], dtype=object)
+LAST_PERIOD = max(PERIOD_TIMES)
+LAB_DURATION = 3
+
+# Sheet (or zip member) names of multi-department uploads: E1-CSE, E2_ECE, E3 MECH
+SHEET_NAME = re.compile(r'^\s*(E\d)\s*[-_ ]\s*([A-Za-z]+)\s*$', re.IGNORECASE)
+
+
+class Timer:
+    """Measure elapsed time and throughput of an ingestion run"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def stats(self, rows):
+        elapsed = self.elapsed
+        return {
+            'rows': rows,
+            'elapsed_ms': round(elapsed * 1000, 2),
+            'rows_per_sec': round(rows / elapsed) if elapsed > 0 else rows
+        }
+
+
+def is_csv(filename):
+    return (filename or '').lower().endswith('.csv')
+
+
+def is_zip(filename):
+    return (filename or '').lower().endswith('.zip')
+
+
+def read_upload(file):
+    """Read an uploaded Excel or CSV file into a DataFrame"""
+    if is_csv(file.filename):
+        return pd.read_csv(file, dtype=str)
+    return pd.read_excel(file)
+
+
+class ChunkedReader:
+    """
+    Stream an uploaded Excel or CSV file as DataFrames of at most chunk_rows rows
+    Excel files are read with openpyxl in read-only mode, so peak memory depends
+    on the chunk size and not on the size of the workbook. Each chunk is indexed
+    by sheet row (index + 2 is the row number shown in Excel).
+    """
+
+    def __init__(self, file, chunk_rows=CHUNK_ROWS, sheet=None):
+        self.chunk_rows = chunk_rows
+        self._csv = is_csv(file.filename)
+
+        if self._csv:
+            self._chunks = pd.read_csv(file, dtype=str, chunksize=chunk_rows)
+            self._first = next(self._chunks, None)
+            self.columns = list(self._first.columns) if self._first is not None else []
+        else:
+            self._workbook = load_workbook(file, read_only=True, data_only=True)
+            worksheet = self._workbook[sheet] if sheet else self._workbook.active
+            self._rows = worksheet.iter_rows(values_only=True)
+            header = next(self._rows, ())
+            self.columns = [str(name).strip() if name is not None else '' for name in header]
+
+    def __iter__(self):
+        if self._csv:
+            if self._first is not None:
+                yield self._first
+            yield from self._chunks
+            return
+
+        try:
+            batch, index = [], []
+            for number, row in enumerate(self._rows):
+                if all(value is None for value in row):
+                    continue
+                batch.append(row[:len(self.columns)])
+                index.append(number)
+                if len(batch) == self.chunk_rows:
+                    yield pd.DataFrame(batch, columns=self.columns, index=index)
+                    batch, index = [], []
+            if batch:
+                yield pd.DataFrame(batch, columns=self.columns, index=index)
+        finally:
+            self._workbook.close()
+
+
+class FrameChunks:
+    """ChunkedReader interface over a sheet that is already in memory"""
+
+    def __init__(self, frame, chunk_rows=CHUNK_ROWS):
+        self.frame = frame
+        self.chunk_rows = chunk_rows
+        self.columns = list(frame.columns)
+
+    def __iter__(self):
+        for start in range(0, len(self.frame), self.chunk_rows):
+            yield self.frame.iloc[start:start + self.chunk_rows]
+
+
+def parse_sheet_name(name):
+    """'E1-CSE' -> ('E1', 'CSE'), None when the name does not follow SHEET_NAME"""
+    match = SHEET_NAME.match(name or '')
+    if not match:
+        return None
+    return match.group(1).upper(), match.group(2).upper()
+
+
+def list_sheets(path, filename):
+    """
+    Sheets of a stored multi-department upload as (name, member, sheet) tuples
+    A workbook gives one entry per worksheet, a zip one per .xlsx/.csv member.
+    """
+    if is_zip(filename):
+        with zipfile.ZipFile(path) as archive:
+            return [
+                (os.path.splitext(os.path.basename(member))[0], member, None)
+                for member in archive.namelist()
+                if not member.endswith('/') and (is_csv(member) or member.lower().endswith('.xlsx'))
+            ]
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return [(name, None, name) for name in workbook.sheetnames]
+    finally:
+        workbook.close()
+
+
+def read_sheet(path, member=None, sheet=None):
+    """
+    Read one sheet of a stored upload into a DataFrame indexed by sheet row
+    Runs in a worker process, so it only touches the file and never the database.
+    """
+    if member is not None:
+        with zipfile.ZipFile(path) as archive:
+            stream, filename = io.BytesIO(archive.read(member)), member
+    else:
+        stream, filename = open(path, 'rb'), path
+
+    with stream:
+        reader = ChunkedReader(FileStorage(stream=stream, filename=filename), sheet=sheet)
+        frames = list(reader)
+
+    if not frames:
+        return pd.DataFrame(columns=reader.columns)
+    return pd.concat(frames)
+
+
+def missing_columns(df, required):
+    return [column for column in required if column not in df.columns]
+
+
+def _reject(rejected, mask, reason, df):
+    """Collect rejected rows (1-based sheet row numbers, header is row 1)"""
+    for index in df.index[mask]:
+        rejected.append({'row': int(index) + 2, 'reason': reason})
+
+
+def _strings(df, columns):
+    return {column: df[column].astype('string').str.strip() for column in columns}
+
+
+def _blank(series):
+    return series.isna() | (series == '')
+
+
+def prepare_students(df, year, department, seen=None):
+    """
+    Validate and transform a student sheet without iterating rows
+    seen holds ids of earlier chunks of the same file (updated in place)
+
+    Returns:
+        (frame ready for loading, list of rejected rows)
+    """
+    rejected = []
+
+    values = _strings(df, ['id', 'name', 'section'])
+    ids, names, sections = values['id'], values['name'], values['section']
+    roll_numbers = pd.to_numeric(df['roll_number'], errors='coerce')
+
+    missing = _blank(ids) | _blank(names) | _blank(sections)
+    _reject(rejected, missing, 'id, name and section are required', df)
+
+    bad_roll = ~missing & df['roll_number'].notna() & roll_numbers.isna()
+    _reject(rejected, bad_roll, 'roll_number must be a number', df)
+
+    seen = set() if seen is None else seen
+    duplicate = ~missing & ~bad_roll & (ids.duplicated(keep='first') | ids.isin(seen))
+    _reject(rejected, duplicate, 'duplicate id in file', df)
+
+    valid = ~(missing | bad_roll | duplicate)
+    seen.update(ids[valid])
+
+    frame = pd.DataFrame({
+        'id': ids[valid],
+        'roll_number': roll_numbers[valid].astype('Int64'),
+        'name': names[valid],
+        'email': ids[valid].str.lower() + EMAIL_DOMAIN,
+        'year': year,
+        'department': department,
+        'section': sections[valid].astype('category')
+    })
+    frame['year'] = frame['year'].astype('int16')
+    frame['department'] = frame['department'].astype('category')
+
+    return frame, rejected
+
+
+def prepare_subjects(df, seen=None):
+    """Validate a subject sheet, returns (frame, rejected)"""
+    rejected = []
+    values = _strings(df, SUBJECT_COLUMNS)
+
+    missing = _blank(values['code']) | _blank(values['mnemonic']) | _blank(values['name']) | _blank(values['type'])
+    _reject(rejected, missing, 'code, mnemonic, name and type are required', df)
+
+    seen = set() if seen is None else seen
+    duplicate = ~missing & (values['code'].duplicated(keep='first') | values['code'].isin(seen))
+    _reject(rejected, duplicate, 'duplicate code in file', df)
+
+    valid = ~(missing | duplicate)
+    seen.update(values['code'][valid])
+
+    frame = pd.DataFrame({
+        'subject_code': values['code'][valid],
+        'subject_mnemonic': values['mnemonic'][valid],
+        'subject_name': values['name'][valid],
+        'subject_type': values['type'][valid].astype('category')
+    })
+
+    return frame, rejected
+
+
+def prepare_faculties(ids, names):
+    """Distinct faculty rows (id, name, email) of a faculty assignment sheet"""
+    frame = pd.DataFrame({'id': ids, 'name': names}, dtype='string').drop_duplicates('id', keep='last')
+    frame['email'] = frame['id'] + EMAIL_DOMAIN
+    return frame
+
+
+def copy_frame(table, frame):
+    """
+    Load a DataFrame into a table inside the current session transaction
+    Uses COPY FROM STDIN on PostgreSQL and a multi-row INSERT elsewhere
+    """
+    if frame.empty:
+        return 0
+
+    if db.session.get_bind().dialect.name != 'postgresql':
+        records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+        db.session.execute(insert(table), records)
+        return len(records)
+
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    columns = ', '.join(frame.columns)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY {table.name} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+    return len(frame)
+
+
+def is_duplicate(error):
+    """True for a unique violation, raised through the ORM (IntegrityError) or by COPY on the raw connection"""
+    return getattr(getattr(error, 'orig', error), 'pgcode', None) == UNIQUE_VIOLATION
+
+
+def _no_progress(phase, rows=None):
+    pass
+
+
+def _load_chunks(chunks, prepare, load, timer, progress):
+    """
+    Feed DataFrame chunks through prepare(chunk) -> (frame, rejected) and
+    load(frame) -> counts, accumulating counts, rejections and progress
+    """
+    timer = timer or Timer()
+    totals = {}
+    rejected = []
+    rows = 0
+
+    for chunk in chunks:
+        frame, chunk_rejected = prepare(chunk)
+        for key, value in load(frame).items():
+            totals[key] = totals.get(key, 0) + value
+        rejected.extend(chunk_rejected)
+        rows += len(frame)
+        progress('loading', rows)
+
+    result = timer.stats(rows)
+    result.update(totals)
+    result['rejected'] = rejected
+    return result
+
+
+def ingest_students(chunks, year, department, timer=None, progress=_no_progress, into=None):
+    """Validate student sheet chunks and COPY the valid rows into the student table (or into)"""
+    seen = set()
+    into = Student.__table__ if into is None else into
+    return _load_chunks(
+        chunks,
+        lambda chunk: prepare_students(chunk, year, department, seen),
+        lambda frame: {'added': copy_frame(into, frame)},
+        timer, progress
+    )
+
+
+def ingest_subjects(chunks, timer=None, progress=_no_progress, into=None):
+    """Validate subject sheet chunks and COPY the valid rows into the subject table (or into)"""
+    seen = set()
+    into = Subject.__table__ if into is None else into
+    return _load_chunks(
+        chunks,
+        lambda chunk: prepare_subjects(chunk, seen),
+        lambda frame: {'added': copy_frame(into, frame)},
+        timer, progress
+    )
+
+
+def staging_table(table):
+    """
+    Create an empty temp table shaped like table on the session connection
+    It lives until the end of the transaction, so nothing else can see it;
+    serial defaults point at the real sequences, so staged ids stay unique.
+    """
+    name = f'staging_{table.name}'
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text(f'CREATE TEMP TABLE {name} (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP'))
+    else:
+        db.session.execute(text(f'CREATE TEMP TABLE {name} AS SELECT * FROM {table.name} WHERE 1 = 0'))
+
+    return Table(name, MetaData(), *[Column(c.name, c.type) for c in table.columns])
+
+
+def conflicting_keys(staging, table, key, scope, limit=20):
+    """Keys loaded into staging that already exist in table outside the rows being replaced"""
+    rows = db.session.execute(
+        select(staging.c[key])
+        .join(table, table.c[key] == staging.c[key])
+        .where(~scope)
+        .limit(limit)
+    )
+    return [row[0] for row in rows]
+
+
+def swap_staging(staging, table, scope):
+    """
+    Replace the rows of table matched by scope with the staged rows
+    Both statements run in the caller's transaction: readers keep seeing
+    the old rows until it commits and the lock is held only for the swap.
+    """
+    deleted = db.session.execute(delete(table).where(scope)).rowcount
+    db.session.execute(
+        insert(table).from_select([c.name for c in table.columns], select(*staging.columns))
+    )
+    db.session.execute(text(f'DROP TABLE {staging.name}'))
+    return deleted
+
+
+def _replace(table, scope, ingest, timer, progress, key=None):
+    """Load a sheet into a staging copy of table, validate it there and swap it in"""
+    timer = timer or Timer()
+    staging = staging_table(table)
+    result = ingest(staging)
+
+    if key is not None:
+        result['conflicts'] = conflicting_keys(staging, table, key, scope)
+        if result['conflicts']:
+            return result
+
+    progress('swapping', result['rows'])
+    result['replaced'] = swap_staging(staging, table, scope)
+    result.update(timer.stats(result['rows']))
+    return result
+
+
+def replace_students(chunks, year, department, timer=None, progress=_no_progress):
+    """
+    Atomically replace the roster of one year and department with a student sheet
+
+    Returns:
+        ingest result plus replaced (old row count) and conflicts (ids that
+        belong to another roster; nothing is swapped when it is not empty)
+    """
+    table = Student.__table__
+    return _replace(
+        table,
+        and_(table.c.year == year, table.c.department == department),
+        lambda staging: ingest_students(chunks, year, department, timer, progress, into=staging),
+        timer, progress, key='id'
+    )
+
+
+def replace_subjects(chunks, timer=None, progress=_no_progress):
+    """Atomically replace the whole subject table with a subject sheet"""
+    return _replace(
+        Subject.__table__,
+        true(),
+        lambda staging: ingest_subjects(chunks, timer, progress, into=staging),
+        timer, progress
+    )
+
+
+def upsert_frame(table, frame, key_columns, update_columns):
+    """
+    Set-based INSERT ... ON CONFLICT DO UPDATE for a prepared frame
+    Rows whose values did not change are not touched at all (no new tuple
+    version, no index churn); RETURNING tells inserts apart from updates.
+
+    Returns:
+        dict with added, updated and unchanged counts
+    """
+    if frame.empty:
+        return {'added': 0, 'updated': 0, 'unchanged': 0}
+
+    records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+    stmt = pg_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: stmt.excluded[column] for column in update_columns},
+        where=tuple_(*[table.c[column] for column in update_columns]).is_distinct_from(
+            tuple_(*[stmt.excluded[column] for column in update_columns])
+        )
+    ).returning(literal_column('xmax = 0').label('inserted'))
+
+    inserted = [row.inserted for row in db.session.execute(stmt, records)]
+    added = sum(1 for flag in inserted if flag)
+    updated = len(inserted) - added
+
+    return {'added': added, 'updated': updated, 'unchanged': len(records) - len(inserted)}
+
+
+def upsert_students(chunks, year, department, timer=None, progress=_no_progress):
+    """Upsert student sheet chunks keyed on id, binding_id is never overwritten"""
+    seen = set()
+    return _load_chunks(
+        chunks,
+        lambda chunk: prepare_students(chunk, year, department, seen),
+        lambda frame: upsert_frame(
+            Student.__table__, frame, ['id'],
+            ['roll_number', 'name', 'email', 'year', 'department', 'section']
+        ),
+        timer, progress
+    )
+
+
+def upsert_subjects(chunks, timer=None, progress=_no_progress):
+    """Upsert subject sheet chunks keyed on subject_code"""
+    seen = set()
+    return _load_chunks(
+        chunks,
+        lambda chunk: prepare_subjects(chunk, seen),
+        lambda frame: upsert_frame(
+            Subject.__table__, frame, ['subject_code'],
+            ['subject_mnemonic', 'subject_name', 'subject_type']
+        ),
+        timer, progress
+    )
+
+
+def upsert_faculties(frame):
+    """Upsert faculty rows (see prepare_faculties) keyed on id"""
+    return upsert_frame(Faculty.__table__, frame, ['id'], ['name'])
+
+
+def timetable_lookups(year, department):
+    """Subject types and the class assignments of a department/year as frames"""
+    subjects = pd.DataFrame(
+        db.session.query(Subject.subject_code, Subject.subject_type).all(),
+        columns=['subject_code', 'subject_type']
+    )
+    assignments = pd.DataFrame(
+        db.session.query(
+            FacultyAssignment.id,
+            FacultyAssignment.faculty_id,
+            FacultyAssignment.subject_code,
+            FacultyAssignment.section
+        ).filter(
+            FacultyAssignment.department == department,
+            FacultyAssignment.year == year
+        ).all(),
+        columns=['assignment_id', 'faculty_id', 'subject_code', 'section']
+    ).drop_duplicates(['faculty_id', 'subject_code', 'section'], keep='last')
+
+    return subjects, assignments
+
+
+def compile_default_schedules(df, year, department, lookups=None):
+    """
+    Resolve a timetable sheet into DefaultSchedule rows in one vectorized pass
+    Subjects and assignments are merged in as frames and period numbers are
+    mapped to times through array indexing.
+
+    Returns:
+        (frame of default_schedule rows, list of rejected rows)
+    """
+    values = _strings(df, ['Day', 'Section', 'SubjectCode', 'FacultyId', 'Venue'])
+    sheet = pd.DataFrame({
+        'row': df.index + 2,
+        'day_of_week': values['Day'].str.upper().str[:3],
+        'section': values['Section'],
+        'subject_code': values['SubjectCode'],
+        'faculty_id': values['FacultyId'],
+        'venue': values['Venue'],
+        'period': pd.to_numeric(df['Period'], errors='coerce')
+    })
+
+    subjects, assignments = lookups or timetable_lookups(year, department)
+
+    sheet = sheet.merge(subjects, on='subject_code', how='left')
+    sheet = sheet.merge(assignments, on=['faculty_id', 'subject_code', 'section'], how='left')
+
+    is_lab = sheet['subject_type'].str.lower().eq('lab').fillna(False).to_numpy(dtype=bool)
+    period = sheet['period'].to_numpy()
+    valid_period = ~np.isnan(period) & (period == np.floor(period)) & (period >= 1) & (period <= LAST_PERIOD)
+    start_period = np.where(valid_period, period, 0).astype(int)
+    end_period = start_period + np.where(is_lab, LAB_DURATION - 1, 0)
+
+    checks = [
+        (_blank(sheet['day_of_week']) | _blank(sheet['section']) | _blank(sheet['subject_code'])
+            | _blank(sheet['faculty_id']) | _blank(sheet['venue']),
+            'Day, Section, SubjectCode, FacultyId and Venue are required'),
+        (~_blank(sheet['day_of_week']) & ~sheet['day_of_week'].isin(WEEKDAYS), 'Invalid day'),
+        (pd.Series(~valid_period), f'Period must be a number between 1 and {LAST_PERIOD}'),
+        (sheet['subject_type'].isna() & ~_blank(sheet['subject_code']), 'Subject code not found'),
+        (pd.Series(valid_period & (end_period > LAST_PERIOD)), 'Lab exceeds available periods'),
+        (sheet['assignment_id'].isna() & sheet['subject_type'].notna(),
+            'No assignment found for faculty, subject and section'),
+    ]
+
+    reasons = pd.Series('', index=sheet.index)
+    for mask, reason in checks:
+        mask = mask.fillna(True).to_numpy(dtype=bool)
+        reasons[mask] = reasons[mask] + '; ' + reason
+    bad = reasons != ''
+
+    rejected = [
+        {'row': int(row), 'reason': reason.lstrip('; ')}
+        for row, reason in zip(sheet['row'][bad], reasons[bad])
+    ]
+
+    good = ~bad.to_numpy()
+    frame = pd.DataFrame({
+        'assignment_id': sheet['assignment_id'][good].astype('int64'),
+        'day_of_week': sheet['day_of_week'][good],
+        'start_time': PERIOD_START[start_period[good]],
+        'end_time': PERIOD_END[end_period[good]],
+        'venue': sheet['venue'][good]
+    })
+
+    return frame, rejected
+
+
+def ingest_default_schedules(chunks, year, department, timer=None, progress=_no_progress, into=None):
+    """Compile timetable sheet chunks and COPY the valid rows into default_schedule (or into)"""
+    lookups = timetable_lookups(year, department)
+    into = DefaultSchedule.__table__ if into is None else into
+    return _load_chunks(
+        chunks,
+        lambda chunk: compile_default_schedules(chunk, year, department, lookups),
+        lambda frame: {'added': copy_frame(into, frame)},
+        timer, progress
+    )
+
+
+def replace_default_schedules(chunks, year, department, timer=None, progress=_no_progress):
+    """Atomically replace the default timetable of one year and department"""
+    table = DefaultSchedule.__table__
+    assignments = select(FacultyAssignment.id).where(
+        FacultyAssignment.year == year,
+        FacultyAssignment.department == department
+    )
+    return _replace(
+        table,
+        table.c.assignment_id.in_(assignments),
+        lambda staging: ingest_default_schedules(chunks, year, department, timer, progress, into=staging),
+        timer, progress
+    )
+
+
+def reconcile_faculty_assignments(df, batch_to_year):
+    """
+    Diff a faculty assignment sheet against the database in one query
+    The sheet is sent as a VALUES list and left-joined (anti-join) against
+    faculty, subject and faculty_assignment.
+
+    Returns:
+        dict with new_faculty, new_assignments, existing_assignments, rejected
+        and faculty_rows (every faculty of the accepted rows, for upserts)
+    """
+    rejected = []
+    values_ = _strings(df, FACULTY_COLUMNS)
+    years = values_['Year'].map(batch_to_year)
+
+    missing = (_blank(values_['FacultyId']) | _blank(values_['FacultyName']) | _blank(values_['SubjectCode'])
+               | _blank(values_['Department']) | _blank(values_['Section']))
+    _reject(rejected, missing, 'FacultyId, FacultyName, SubjectCode, Department and Section are required', df)
+
+    bad_year = ~missing & years.isna()
+    _reject(rejected, bad_year, 'Year must be one of E1, E2, E3, E4', df)
+
+    sheet = pd.DataFrame({
+        'row': df.index + 2,
+        'faculty_id': values_['FacultyId'],
+        'faculty_name': values_['FacultyName'],
+        'subject_code': values_['SubjectCode'],
+        'year': years,
+        'department': values_['Department'],
+        'section': values_['Section']
+    })[~(missing | bad_year)]
+
+    key = ['faculty_id', 'subject_code', 'year', 'department', 'section']
+    duplicate = sheet.duplicated(key, keep='first')
+    for row in sheet['row'][duplicate]:
+        rejected.append({'row': int(row), 'reason': 'duplicate assignment in file'})
+    sheet = sheet[~duplicate]
+
+    result = {
+        'new_faculty': [],
+        'new_assignments': [],
+        'existing_assignments': [],
+        'rejected': rejected,
+        'faculty_rows': prepare_faculties([], [])
+    }
+    if sheet.empty:
+        return result
+
+    sheet['year'] = sheet['year'].astype(int)
+    rows = values(
+        column('row', Integer),
+        column('faculty_id', String),
+        column('subject_code', String),
+        column('year', Integer),
+        column('department', String),
+        column('section', String),
+        name='sheet'
+    ).data(list(sheet[['row'] + key].itertuples(index=False, name=None)))
+
+    diff = db.session.execute(
+        select(
+            rows.c.row,
+            FacultyAssignment.id.label('assignment_id'),
+            Faculty.id.label('known_faculty'),
+            Subject.subject_code.label('known_subject')
+        ).select_from(
+            rows.outerjoin(FacultyAssignment, and_(
+                FacultyAssignment.faculty_id == rows.c.faculty_id,
+                FacultyAssignment.subject_code == rows.c.subject_code,
+                FacultyAssignment.year == rows.c.year,
+                FacultyAssignment.department == rows.c.department,
+                FacultyAssignment.section == rows.c.section
+            ))
+            .outerjoin(Faculty, Faculty.id == rows.c.faculty_id)
+            .outerjoin(Subject, Subject.subject_code == rows.c.subject_code)
+        )
+    ).all()
+
+    diff = pd.DataFrame(diff, columns=['row', 'assignment_id', 'known_faculty', 'known_subject'])
+    # Keep one line per sheet row even if the table already holds duplicate assignments
+    diff = diff.drop_duplicates('row')
+    sheet = sheet.merge(diff, on='row', how='left')
+
+    unknown_subject = sheet['known_subject'].isna()
+    for row in sheet['row'][unknown_subject]:
+        rejected.append({'row': int(row), 'reason': 'Subject code not found'})
+    sheet = sheet[~unknown_subject]
+
+    existing = sheet['assignment_id'].notna()
+    new_faculty = sheet[sheet['known_faculty'].isna()].drop_duplicates('faculty_id')
+    result['faculty_rows'] = prepare_faculties(sheet['faculty_id'], sheet['faculty_name'])
+
+    result['new_faculty'] = [
+        {'id': faculty_id, 'name': name, 'email': faculty_id + EMAIL_DOMAIN}
+        for faculty_id, name in zip(new_faculty['faculty_id'], new_faculty['faculty_name'])
+    ]
+    result['new_assignments'] = sheet[~existing][key].to_dict('records')
+    result['existing_assignments'] = (
+        sheet[existing][key + ['assignment_id']].astype({'assignment_id': int}).to_dict('records')
+    )
+    rejected.sort(key=lambda item: item['row'])
+
+    return result
+
+
+def apply_faculty_reconciliation(result):
+    """Insert only the delta computed by reconcile_faculty_assignments"""
+    if result['new_faculty']:
+        db.session.execute(
+            pg_insert(Faculty.__table__).on_conflict_do_nothing(index_elements=['id']),
+            result['new_faculty']
+        )
+    if result['new_assignments']:
+        db.session.execute(insert(FacultyAssignment.__table__), result['new_assignments'])
@@ -0,0 +1,328 @@
+"""
+Background jobs (nightly materialization, partition maintenance, expired schedule and OTP cleanup)
+Jobs run against one long-lived app: each run only pushes an app context, so
+it reuses the app's engine and pool, and is recorded in job_run (duration,
+rows affected, error).
+
+Exactly one process runs them. Every candidate (each web worker with
+SCHEDULER_MODE=embedded, or each ams_scheduler.py process) tries
+pg_try_advisory_lock on a dedicated connection: the holder runs the
+APScheduler, the others retry every SCHEDULER_RETRY_SECONDS and take over when
+the leader's connection goes away. Jobs live in the apscheduler_jobs table, so
+runs missed while no leader was up are executed (once) on the next start.
+"""
+
+import atexit
+import logging
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytz
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from flask import current_app
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import NullPool
+
+from app import db, otp_expiry, partitions
+from app.config import pooled
+from app.models import JobRun
+
+logger = logging.getLogger(__name__)
+
+IST_TZ = pytz.timezone('Asia/Kolkata')
+LOCK_KEY = 0x616D735F  # 'ams_', shared by every process that can run the jobs
+JOB_TABLE = 'apscheduler_jobs'
+
+_election = None
+
+
+def utcnow():
+    """Naive UTC timestamp, matching the DateTime columns"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def describe_run(run):
+    """JSON representation of a job run"""
+    return {
+        'id': run.id,
+        'job': run.job,
+        'status': run.status,
+        'rows_affected': run.rows_affected,
+        'details': run.details,
+        'duration_ms': run.duration_ms,
+        'error': run.error,
+        'started_at': run.started_at.isoformat() + 'Z',
+        'finished_at': run.finished_at.isoformat() + 'Z'
+    }
+
+
+def run_job(app, name, func, *args):
+    """
+    Run func(*args) in an app context and record it in job_run
+    func returns the number of rows it affected, or a dict of metrics with
+    a rows entry. Failures are logged and recorded, never raised into the scheduler.
+
+    Returns:
+        dict describing the run
+    """
+    started = utcnow()
+    clock = time.perf_counter()
+
+    with app.app_context():
+        try:
+            result, status, error = func(*args), 'completed', None
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Job %s failed', name)
+            result, status, error = None, 'failed', f'{type(e).__name__}: {e}'
+
+        details = result if isinstance(result, dict) else None
+        rows = details['rows'] if details else result
+        run = JobRun(
+            job=name, status=status, rows_affected=rows, details=details, error=error,
+            duration_ms=round((time.perf_counter() - clock) * 1000, 2),
+            started_at=started, finished_at=utcnow()
+        )
+        try:
+            db.session.add(run)
+            db.session.commit()
+            return describe_run(run)
+        except SQLAlchemyError:
+            db.session.rollback()
+            logger.exception('Could not record run of job %s', name)
+            return {'job': name, 'status': status, 'rows_affected': rows, 'error': error}
+
+
+# Job functions are stored by reference ('app.jobs:materialize_schedules'),
+# so the app argument is optional and defaults to the leader's app.
+
+def materialize_schedules(app=None):
+    from app.routes import move_tomorrow_schedules_auto
+    return run_job(app or _election.app, 'materialize_schedules', lambda: move_tomorrow_schedules_auto()['created'])
+
+
+def cleanup_expired_schedules(app=None):
+    from app.routes import cleanup_expired_schedules
+    return run_job(app or _election.app, 'cleanup_expired_schedules', cleanup_expired_schedules)
+
+
+def maintain_partitions(app=None):
+    def maintain():
+        from app.routes import get_ist_today
+        return partitions.maintain(get_ist_today())
+
+    return run_job(app or _election.app, 'maintain_partitions', maintain)
+
+
+def sweep_expired_otps(app=None):
+    def sweep():
+        cleared = otp_expiry.sweep_expired()
+        db.session.commit()
+        return cleared
+
+    return run_job(app or _election.app, 'sweep_expired_otps', sweep)
+
+
+def prune_job_runs(app=None):
+    def prune():
+        cutoff = utcnow() - timedelta(days=current_app.config['JOB_RUN_RETENTION_DAYS'])
+        deleted = JobRun.query.filter(JobRun.started_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    return run_job(app or _election.app, 'prune_job_runs', prune)
+
+
+def recent_runs(job=None, status=None, limit=50):
+    """Latest job runs, newest first"""
+    query = JobRun.query
+    if job:
+        query = query.filter(JobRun.job == job)
+    if status:
+        query = query.filter(JobRun.status == status)
+    return [describe_run(run) for run in query.order_by(JobRun.started_at.desc(), JobRun.id.desc()).limit(limit)]
+
+
+def run_summary(since):
+    """Per job totals of the runs started after since"""
+    rows = db.session.query(
+        JobRun.job,
+        func.count(JobRun.id).label('runs'),
+        func.count(JobRun.id).filter(JobRun.status == 'failed').label('failures'),
+        func.coalesce(func.sum(JobRun.rows_affected), 0).label('rows_affected'),
+        func.avg(JobRun.duration_ms).label('avg_ms'),
+        func.max(JobRun.duration_ms).label('max_ms'),
+        func.max(JobRun.started_at).label('last_run')
+    ).filter(JobRun.started_at >= since).group_by(JobRun.job).order_by(JobRun.job)
+
+    return [{
+        'job': row.job,
+        'runs': row.runs,
+        'failures': row.failures,
+        'rows_affected': int(row.rows_affected),
+        'avg_ms': round(row.avg_ms, 2),
+        'max_ms': row.max_ms,
+        'last_run': row.last_run.isoformat() + 'Z'
+    } for row in rows]
+
+
+RECURRING = (
+    (materialize_schedules, CronTrigger(hour=0, minute=58, timezone=IST_TZ), 'daily_schedule_move',
+     'Materialize the coming days schedules daily at 12:58 AM IST'),
+    (cleanup_expired_schedules, IntervalTrigger(minutes=5, timezone=IST_TZ), 'cleanup_expired_schedules',
+     'Clean up expired schedules every 5 minutes'),
+    (sweep_expired_otps, IntervalTrigger(minutes=1, timezone=IST_TZ), 'sweep_expired_otps',
+     'Clear expired attendance OTPs every minute'),
+    (maintain_partitions, CronTrigger(hour=1, minute=15, timezone=IST_TZ), 'maintain_partitions',
+     'Create upcoming monthly partitions and archive expired months daily at 1:15 AM IST'),
+    (prune_job_runs, CronTrigger(hour=1, minute=30, timezone=IST_TZ), 'prune_job_runs',
+     'Delete job runs older than JOB_RUN_RETENTION_DAYS daily at 1:30 AM IST'),
+)
+
+
+def start_scheduler(app):
+    """Start the APScheduler on the persistent job store with the recurring jobs registered"""
+    with app.app_context():
+        store = SQLAlchemyJobStore(engine=db.engine, tablename=JOB_TABLE)
+
+    scheduler = BackgroundScheduler(
+        jobstores={'default': store},
+        # Missed runs execute once after a restart instead of being dropped or repeated
+        job_defaults={'coalesce': True, 'misfire_grace_time': None, 'max_instances': 1},
+        timezone=IST_TZ
+    )
+    scheduler.start(paused=True)
+
+    for func, trigger, job_id, name in RECURRING:
+        stored = scheduler.get_job(job_id)
+        # A stored job keeps its next run time (so a run missed while down still fires), unless it changed
+        if stored is None or str(stored.trigger) != str(trigger) or stored.name != name:
+            scheduler.add_job(func, trigger=trigger, id=job_id, name=name, replace_existing=True)
+
+    scheduler.resume()
+    return scheduler
+
+
+class Election:
+    """Runs the scheduler in this process for as long as it holds the advisory lock"""
+
+    def __init__(self, app):
+        self.app = app
+        # Session-level locks need a real server session: use a direct connection, not a transaction pooler
+        url = app.config['SCHEDULER_LOCK_DATABASE_URI']
+        if pooled(url):
+            # Every pooled connection could take the lock on its own server session, electing several leaders
+            logger.error('SCHEDULER_LOCK_DATABASE_URI goes through the transaction pooler, '
+                         'set it to the direct connection (port 5432); this process stays a follower')
+            self.engine = None
+        else:
+            self.engine = create_engine(url, poolclass=NullPool)
+        self.connection = None
+        self.scheduler = None
+        self.stopped = threading.Event()
+
+    @property
+    def leader(self):
+        return self.scheduler is not None
+
+    def _acquire(self):
+        connection = self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            acquired = connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': LOCK_KEY}).scalar()
+        except SQLAlchemyError:
+            connection.close()
+            raise
+
+        if not acquired:
+            connection.close()
+            return False
+        self.connection = connection
+        return True
+
+    def _alive(self):
+        try:
+            self.connection.execute(text('SELECT 1'))
+            return True
+        except SQLAlchemyError:
+            return False
+
+    def step(self):
+        """One election round: take the lead when the lock is free, step down when its connection is lost"""
+        if self.engine is None:
+            return
+        try:
+            if self.leader:
+                if not self._alive():
+                    logger.warning('Scheduler lock connection lost, stepping down')
+                    self.step_down(wait=False)
+            elif self._acquire():
+                self.scheduler = start_scheduler(self.app)
+                logger.info('Acquired scheduler lock, running %d jobs', len(self.scheduler.get_jobs()))
+        except SQLAlchemyError as e:
+            logger.warning('Scheduler election failed: %s', e)
+            self.step_down(wait=False)
+
+    def step_down(self, wait=True):
+        if self.scheduler is not None:
+            scheduler, self.scheduler = self.scheduler, None
+            try:
+                scheduler.shutdown(wait=wait)
+            except Exception:
+                pass
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            try:
+                connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': LOCK_KEY})
+            except SQLAlchemyError:
+                pass
+            connection.close()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.step()
+            self.stopped.wait(self.app.config['SCHEDULER_RETRY_SECONDS'])
+        self.step_down()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start(app):
+    """
+    Join the election in a background thread (SCHEDULER_MODE=embedded)
+    Safe to call from every web worker, only the lock holder runs the jobs.
+    """
+    global _election
+
+    if app.config['SCHEDULER_MODE'] != 'embedded' or _election is not None:
+        return _election
+
+    _election = Election(app)
+    thread = threading.Thread(target=_election.run, name='scheduler-election', daemon=True)
+    thread.start()
+
+    def shutdown():
+        _election.stop()
+        thread.join(timeout=10)
+
+    atexit.register(shutdown)
+    return _election
+
+
+def run_forever(app):
+    """Run the election in the calling thread until interrupted (ams_scheduler.py)"""
+    global _election
+
+    _election = Election(app)
+    signal.signal(signal.SIGTERM, lambda signum, frame: _election.stop())
+    try:
+        _election.run()
+    finally:
+        _election.step_down()
+
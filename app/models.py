@@ -59,12 +59,13 @@ class FacultyAssignment(db.Model):
     )
 
 
+# Partitioned by month on date (see app/partitions.py), so the partition key is part of the primary key
 class Schedule(db.Model):
     __tablename__ = 'schedule'
     
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     assignment_id = db.Column(db.Integer, db.ForeignKey('faculty_assignment.id', ondelete='CASCADE'), nullable=False, index=True)
-    date = db.Column(db.Date, nullable=False, index=True)
+    date = db.Column(db.Date, primary_key=True, index=True)
     start_time = db.Column(db.String(5), nullable=False)
     end_time = db.Column(db.String(5), nullable=False)
     status = db.Column(db.Boolean, default=False, index=True)
@@ -72,6 +73,8 @@ class Schedule(db.Model):
     otp=db.Column(db.String(6) ,nullable=True)
     otp_created_at = db.Column(db.DateTime, nullable=True)
     topic_discussed = db.Column(db.String(100))
+    # Created from default_schedule; calendar refreshes and timetable resyncs only touch these
+    materialized = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
     assignment = db.relationship('FacultyAssignment', backref='schedules')
     
@@ -79,26 +82,83 @@ class Schedule(db.Model):
     __table_args__ = (
         db.Index('idx_schedule_date_assignment', 'date', 'assignment_id'),
         db.Index('idx_schedule_date_status', 'date', 'status'),
+        # One class per slot, makes materializing default schedules idempotent
+        db.UniqueConstraint('assignment_id', 'date', 'start_time', name='uq_schedule_slot'),
+        # Only the few schedules with an OTP, keeps the expired OTP sweep off the whole table
+        db.Index('idx_schedule_active_otp', 'otp_created_at', postgresql_where=db.text("otp <> ''")),
+        {'postgresql_partition_by': 'RANGE (date)'},
     )
+    # ids are unique on their own (one sequence), the ORM keeps addressing rows by id
+    __mapper_args__ = {'primary_key': [id]}
+
+
+# Holidays, exam days and day-order overrides; dates without an entry follow their weekday
+class AcademicCalendar(db.Model):
+    __tablename__ = 'academic_calendar'
+    
+    date = db.Column(db.Date, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # 'holiday', 'exam' or 'working'
+    day_order = db.Column(db.String(3))  # Working day following another weekday's timetable, e.g. 'MON'
+    description = db.Column(db.String(200))
+
+
+# Dates whose default schedules were materialized into schedule
+class ScheduleMaterialization(db.Model):
+    __tablename__ = 'schedule_materialization'
+    
+    date = db.Column(db.Date, primary_key=True)
+    rows_created = db.Column(db.Integer, nullable=False, default=0)
+    materialized_at = db.Column(db.DateTime, nullable=False)
 
 
+# Partitioned by month like schedule, session_date is the date of the referenced schedule
 class AttendanceRecord(db.Model):
     __tablename__ = 'attendance_record'
     
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     student_id = db.Column(db.String(20), db.ForeignKey('student.id', ondelete='CASCADE'), nullable=False, index=True)
-    session_id = db.Column(db.Integer, db.ForeignKey('schedule.id', ondelete='CASCADE'), nullable=False, index=True)
+    session_id = db.Column(db.Integer, nullable=False, index=True)
+    session_date = db.Column(db.Date, primary_key=True)
     status = db.Column(db.Boolean, nullable=False)
 
     student = db.relationship('Student', backref='attendance_record')
     schedule = db.relationship('Schedule', backref='attendance_record')
     
-    # ✅ OPTIMIZED: Composite index for session-based queries
+    # ✅ OPTIMIZED: One row per session and student, also the index for session-based queries
+    # (and the conflict target of the sparse storage upserts)
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'session_date', 'student_id', name='uq_attendance_session_student'),
+        db.ForeignKeyConstraint(
+            ['session_id', 'session_date'], ['schedule.id', 'schedule.date'],
+            ondelete='CASCADE', name='fk_attendance_record_schedule'
+        ),
+        {'postgresql_partition_by': 'RANGE (session_date)'},
+    )
+    __mapper_args__ = {'primary_key': [id]}
+
+
+# Bitmap attendance storage (see attendance_bitmap): one row per session instead of one per student,
+# bit roll_number - 1 of present is set for a present student of the section. Partitioned like attendance_record.
+class AttendanceBitmap(db.Model):
+    __tablename__ = 'attendance_bitmap'
+    
+    session_id = db.Column(db.Integer, primary_key=True)
+    session_date = db.Column(db.Date, primary_key=True)
+    present = db.Column(db.LargeBinary, nullable=False)
+    
     __table_args__ = (
-        db.Index('idx_attendance_session_student', 'session_id', 'student_id'),
+        db.ForeignKeyConstraint(
+            ['session_id', 'session_date'], ['schedule.id', 'schedule.date'],
+            ondelete='CASCADE', name='fk_attendance_bitmap_schedule'
+        ),
+        {'postgresql_partition_by': 'RANGE (session_date)'},
     )
 
 
+# Weekday codes of default_schedule.day_of_week and academic_calendar.day_order
+WEEKDAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
+
+
 class DefaultSchedule(db.Model):
     __tablename__ = 'default_schedule'
     
@@ -146,3 +206,42 @@ class NotificationLog(db.Model):
     sent_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     status = db.Column(db.String(50))  # 'success', 'failed', 'partial'
 
+
+
+class UploadJob(db.Model):
+    __tablename__ = 'upload_job'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # 'students', 'faculty', 'subjects', 'default_schedules'
+    filename = db.Column(db.String(255))
+    phase = db.Column(db.String(20), nullable=False, default='queued')  # queued, parsing, loading, completed, failed
+    rows_processed = db.Column(db.Integer, default=0)
+    errors = db.Column(db.JSON)
+    result = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+class JobRun(db.Model):
+    __tablename__ = 'job_run'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(50), nullable=False)  # 'materialize_schedules', 'cleanup_expired_schedules', 'sweep_expired_otps', ...
+    status = db.Column(db.String(20), nullable=False)  # completed, failed
+    rows_affected = db.Column(db.Integer)
+    details = db.Column(db.JSON)  # Job specific metrics, e.g. batches of a batched delete
+    duration_ms = db.Column(db.Float, nullable=False)
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('idx_job_run_job_started', 'job', 'started_at'),
+    )
+
+
+# Rows outside every monthly partition land in the DEFAULT partitions until partitions.ensure() creates their month
+db.event.listen(Schedule.__table__, 'after_create', db.DDL('CREATE TABLE schedule_default PARTITION OF schedule DEFAULT'))
+db.event.listen(AttendanceRecord.__table__, 'after_create', db.DDL('CREATE TABLE attendance_record_default PARTITION OF attendance_record DEFAULT'))
+db.event.listen(AttendanceBitmap.__table__, 'after_create', db.DDL('CREATE TABLE attendance_bitmap_default PARTITION OF attendance_bitmap DEFAULT'))
@@ -0,0 +1,125 @@
+"""
+Push notifications to whole classes through FCM
+Fan-outs run on one background thread after the request has committed, so an
+endpoint touching many classes answers without waiting on FCM. The tokens of
+every class are read in one query, then each class gets a single multicast
+(in batches of 500 tokens, the FCM limit), logged in notification_logs.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import tuple_
+
+from app import db
+from app.models import FCMToken, NotificationLog, Student
+
+logger = logging.getLogger(__name__)
+
+MULTICAST_LIMIT = 500
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fcm-fanout')
+    return _executor
+
+
+def class_tokens(classes):
+    """FCM tokens of the students of classes, as {(year, department, section): [token]}"""
+    tokens = {klass: [] for klass in classes}
+    if not classes:
+        return tokens
+
+    rows = db.session.query(
+        Student.year, Student.department, Student.section, FCMToken.fcm_token
+    ).join(FCMToken, FCMToken.student_email == Student.email).filter(
+        tuple_(Student.year, Student.department, Student.section).in_(list(classes))
+    )
+    for row in rows:
+        tokens[(row.year, row.department, row.section)].append(row.fcm_token)
+    return tokens
+
+
+def _multicast(tokens, title, body, data):
+    """Send one notification to tokens, returns (successful, failed)"""
+    from firebase_admin import messaging
+
+    successful = failed = 0
+    for i in range(0, len(tokens), MULTICAST_LIMIT):
+        message = messaging.MulticastMessage(
+            notification=messaging.Notification(title=title, body=body),
+            data={key: str(value) for key, value in data.items()},
+            tokens=tokens[i:i + MULTICAST_LIMIT],
+            android=messaging.AndroidConfig(
+                priority='high',
+                notification=messaging.AndroidNotification(channel_id='class_updates', sound='default', priority='high')
+            ),
+            apns=messaging.APNSConfig(payload=messaging.APNSPayload(aps=messaging.Aps(sound='default', badge=1)))
+        )
+        response = messaging.send_each_for_multicast(message)
+        successful += response.success_count
+        failed += response.failure_count
+    return successful, failed
+
+
+def fan_out(sender, notices):
+    """
+    Send each notice to its class and log it (runs in an app context)
+    notices: list of dicts with class ((year, department, section)), title, body and data
+
+    Returns:
+        list of {class, recipients, successful, failed, status}
+    """
+    tokens = class_tokens({notice['class'] for notice in notices})
+    results = []
+
+    for notice in notices:
+        recipients = tokens[notice['class']]
+        successful = failed = 0
+        if recipients:
+            try:
+                successful, failed = _multicast(
+                    recipients, notice['title'], notice['body'],
+                    dict(notice.get('data', {}), timestamp=int(time.time()))
+                )
+            except Exception:
+                logger.exception('Notification to %s failed', notice['class'])
+                failed = len(recipients)
+
+        status = 'success' if failed == 0 else ('partial' if successful > 0 else 'failed')
+        db.session.add(NotificationLog(
+            cr_email=sender, title=notice['title'], message=notice['body'],
+            recipient_count=len(recipients), status=status
+        ))
+        results.append({
+            'class': notice['class'], 'recipients': len(recipients),
+            'successful': successful, 'failed': failed, 'status': status
+        })
+
+    db.session.commit()
+    return results
+
+
+def queue_class_notices(sender, notices):
+    """Queue fan_out on the background thread, call after the change being announced has committed"""
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                return fan_out(sender, notices)
+            except Exception:
+                db.session.rollback()
+                logger.exception('Notification fan-out by %s failed', sender)
+
+    return _pool().submit(run)
@@ -0,0 +1,168 @@
+"""
+In-process registry of the active attendance OTPs
+verify_otp reads (otp, created_at) from memory instead of the schedule table.
+Workers stay coherent through Postgres LISTEN/NOTIFY: generate_otp sends the
+new OTP on the otp_changed channel inside its transaction, so every worker
+receives it when that transaction commits. Each worker listens on a dedicated
+connection (OTP_LISTEN_DATABASE_URI, LISTEN needs a real session and not a
+transaction pooler) and loads the OTPs already active whenever it connects.
+While the listener is down the registry is not trusted and lookups go to the
+database; behind a pooler notifications never arrive, so it never connects. Entries are dropped one TTL after they expired.
+"""
+
+import logging
+import select
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import create_engine, func
+from sqlalchemy import select as sql_select
+from sqlalchemy.pool import NullPool
+
+from app import db, otp_expiry
+from app.config import pooled
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'otp_changed'
+POLL_SECONDS = 5
+
+_registry = {}
+_ready = threading.Event()
+_lock = threading.Lock()
+_listener = None
+
+
+def publish(schedule_id, otp, created_at):
+    """Announce a schedule's new OTP to every worker, delivered when the current transaction commits"""
+    payload = f'{schedule_id}:{otp or ""}:{created_at.isoformat() if created_at else ""}'
+    db.session.execute(sql_select(func.pg_notify(CHANNEL, payload)))
+
+
+def remember(schedule_id, otp, created_at):
+    """Record an OTP in this worker's registry (an empty otp forgets the schedule)"""
+    with _lock:
+        if otp and created_at:
+            _registry[int(schedule_id)] = (otp, created_at)
+        else:
+            _registry.pop(int(schedule_id), None)
+
+
+def _apply(payload):
+    schedule_id, otp, created_at = payload.split(':', 2)
+    remember(schedule_id, otp, datetime.fromisoformat(created_at) if created_at else None)
+
+
+def _prune(ttl):
+    """Drop the OTPs that expired more than a TTL ago, the database has them swept by now"""
+    horizon = otp_expiry.utcnow() - 2 * ttl
+    with _lock:
+        for schedule_id in [key for key, (_, created_at) in _registry.items() if created_at <= horizon]:
+            del _registry[schedule_id]
+
+
+def lookup(schedule_id):
+    """
+    (otp, created_at) of a schedule's current OTP from memory, expired or not
+
+    Returns:
+        the entry, or None when the registry cannot answer (listener down,
+        unknown schedule or no OTP); the caller then reads the database
+    """
+    if not current_app.config['OTP_CACHE_ENABLED']:
+        return None
+
+    start(current_app._get_current_object())
+    if not _ready.is_set():
+        return None
+
+    try:
+        key = int(schedule_id)
+    except (TypeError, ValueError):
+        return None
+    with _lock:
+        return _registry.get(key)
+
+
+class Listener(threading.Thread):
+    """Keeps the registry in sync with otp_changed notifications, reconnecting when the connection drops"""
+
+    def __init__(self, app):
+        super().__init__(name='otp-listener', daemon=True)
+        self.app = app
+        url = app.config['OTP_LISTEN_DATABASE_URI']
+        if pooled(url):
+            # LISTEN through a transaction pooler succeeds but never delivers, the registry would go stale
+            logger.error('OTP_LISTEN_DATABASE_URI goes through the transaction pooler, '
+                         'set it to the direct connection (port 5432); OTPs are verified against the database')
+            self.engine = None
+        else:
+            self.engine = create_engine(url, poolclass=NullPool)
+        self.ttl = timedelta(seconds=app.config['OTP_TTL_SECONDS'])
+        self.connection = None
+        self.stopped = threading.Event()
+
+    def _connect(self):
+        self.connection = self.engine.raw_connection()
+        self.connection.dbapi_connection.autocommit = True
+        cursor = self.connection.cursor()
+        # LISTEN before loading, so an OTP generated in between is not missed
+        cursor.execute(f'LISTEN {CHANNEL}')
+        cursor.execute("SELECT id, otp, otp_created_at FROM schedule WHERE otp <> ''")
+        rows = cursor.fetchall()
+        cursor.close()
+
+        with _lock:
+            _registry.clear()
+            _registry.update({row[0]: (row[1], row[2]) for row in rows if row[2] is not None})
+        _ready.set()
+        logger.info('OTP listener connected, %d active OTPs loaded', len(rows))
+
+    def _disconnect(self):
+        _ready.clear()
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            # Discard without the pool's reset, the connection may already be gone
+            connection.invalidate()
+
+    def step(self):
+        """Wait up to POLL_SECONDS for notifications and apply them"""
+        if self.connection is None:
+            self._connect()
+
+        dbapi = self.connection.dbapi_connection
+        if select.select([dbapi], [], [], POLL_SECONDS) != ([], [], []):
+            dbapi.poll()
+            while dbapi.notifies:
+                _apply(dbapi.notifies.pop(0).payload)
+        _prune(self.ttl)
+
+    def run(self):
+        if self.engine is None:
+            return
+        while not self.stopped.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                logger.warning('OTP listener failed, verifying against the database: %s', e)
+                self._disconnect()
+                self.stopped.wait(self.app.config['SCHEDULER_RETRY_SECONDS'])
+        self._disconnect()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start(app):
+    """Start this worker's listener once"""
+    global _listener
+
+    if _listener is not None:
+        return _listener
+
+    with _lock:
+        if _listener is None:
+            _listener = Listener(app)
+            _listener.start()
+    return _listener
@@ -0,0 +1,187 @@
+"""
+Monthly range partitions of schedule (on date), attendance_record and
+attendance_bitmap (on session_date)
+The tables are split the same way, so a month of classes and its attendance
+live in partitions with the same suffix (schedule_2025_07,
+attendance_record_2025_07, attendance_bitmap_2025_07). Rows no monthly partition covers go to the DEFAULT
+partitions; ensure() creates months ahead of time and adopts such rows. Only
+the nightly job and the CLI commands create months: the DDL takes ACCESS
+EXCLUSIVE locks, so request paths write into DEFAULT instead.
+
+Retention works on whole months: once a month is older than the cutoff, its
+partitions are COPYed to gzip CSV files in ARCHIVE_FOLDER, detached and
+dropped, instead of a DELETE cascading into attendance_record row by row.
+"""
+
+import gzip
+import os
+import re
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import cleanup, db
+from app.models import Schedule
+
+# Parent first: attendance_record and attendance_bitmap reference schedule
+TABLES = (('schedule', 'date'), ('attendance_record', 'session_date'), ('attendance_bitmap', 'session_date'))
+BOUND = re.compile(r"FROM \('(\d{4})-(\d{2})-01'\) TO")
+LOCK_KEY = 0x616D7370  # 'amsp', serializes partition creation across processes
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_{month:%Y_%m}'
+
+
+def monthly_partitions(table):
+    """{month start: partition name} of a table's monthly partitions, read from the catalog"""
+    rows = db.session.execute(text("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) AS bound
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table
+    """), {'table': table})
+
+    months = {}
+    for name, bound in rows:
+        match = BOUND.search(bound)
+        if match:
+            months[date(int(match[1]), int(match[2]), 1)] = name
+    return months
+
+
+def _create_month(month):
+    """Create the schedule and attendance partitions of a month, moving its rows out of DEFAULT"""
+    end = add_months(month, 1)
+    bounds = {'start': month, 'end': end}
+
+    # A new partition may not overlap rows kept in DEFAULT: park them, create, put them back
+    for table, column in reversed(TABLES):
+        db.session.execute(text(
+            f'CREATE TEMP TABLE {table}_adopted (LIKE {table}) ON COMMIT DROP'
+        ))
+        db.session.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM {table}_default WHERE {column} >= :start AND {column} < :end RETURNING *
+            )
+            INSERT INTO {table}_adopted SELECT * FROM moved
+        """), bounds)
+
+    for table, _ in TABLES:
+        db.session.execute(text(
+            f"CREATE TABLE {partition_name(table, month)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        db.session.execute(text(f'INSERT INTO {table} SELECT * FROM {table}_adopted'))
+        db.session.execute(text(f'DROP TABLE {table}_adopted'))
+
+
+def ensure(start, end):
+    """
+    Make sure every month from start to end (inclusive) has its partitions
+    Holds a transaction-level advisory lock, so a concurrent caller waits and then
+    sees the months created here instead of failing on an existing relation.
+    The caller commits.
+
+    Returns:
+        list of the month starts that were created
+    """
+    db.session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': LOCK_KEY})
+    # Read after the lock, months created by the previous holder are committed by now
+    existing = set(monthly_partitions('schedule'))
+    created = []
+
+    month = month_start(start)
+    while month <= end:
+        if month not in existing:
+            _create_month(month)
+            created.append(month)
+        month = add_months(month, 1)
+    return created
+
+
+def _archive(partition, folder):
+    """COPY a partition into folder/<partition>.csv.gz, returns the rows written"""
+    path = os.path.join(folder, f'{partition}.csv.gz')
+    partial = path + '.partial'
+
+    cursor = db.session.connection().connection.cursor()
+    try:
+        with gzip.open(partial, 'wt', newline='') as stream:
+            cursor.copy_expert(f'COPY {partition} TO STDOUT WITH (FORMAT csv, HEADER)', stream)
+        rows = cursor.rowcount
+    finally:
+        cursor.close()
+
+    os.replace(partial, path)
+    return rows
+
+
+def archive_before(cutoff, folder=None):
+    """
+    Archive, detach and drop every month that ends on or before cutoff
+    Attendance goes first, so the schedule partition has nothing referencing it
+    when it is detached. Each month commits on its own.
+
+    Returns:
+        dict with the months archived and the rows written per table
+    """
+    folder = folder or current_app.config['ARCHIVE_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+
+    partitions = {table: monthly_partitions(table) for table, _ in TABLES}
+    months = sorted(month for month in partitions['schedule'] if add_months(month, 1) <= cutoff)
+    rows = {table: 0 for table, _ in TABLES}
+
+    for month in months:
+        try:
+            for table, _ in reversed(TABLES):
+                partition = partitions[table].get(month)
+                if partition is None:
+                    continue
+                rows[table] += _archive(partition, folder)
+                db.session.execute(text(f'ALTER TABLE {table} DETACH PARTITION {partition}'))
+                db.session.execute(text(f'DROP TABLE {partition}'))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    return {'months': [month.isoformat() for month in months], 'rows': rows}
+
+
+def maintain(today):
+    """
+    Create the partitions PARTITION_MONTHS_AHEAD months ahead and archive months past SCHEDULE_RETENTION_DAYS
+    Expired rows that sit in the DEFAULT partition (no month to detach) are deleted in batches.
+
+    Returns:
+        dict with rows (archived + deleted), months created and archived, and the delete metrics
+    """
+    config = current_app.config
+    created = ensure(month_start(today), add_months(month_start(today), config['PARTITION_MONTHS_AHEAD']))
+    db.session.commit()
+
+    cutoff = today - timedelta(days=config['SCHEDULE_RETENTION_DAYS'])
+    archived = archive_before(cutoff)
+    leftovers = cleanup.delete_in_batches(
+        Schedule, Schedule.date < cutoff, text("schedule.tableoid = 'schedule_default'::regclass")
+    )
+
+    return {
+        'rows': sum(archived['rows'].values()) + leftovers['rows'],
+        'created': [month.isoformat() for month in created],
+        'archived': archived,
+        'default_deleted': leftovers
+    }
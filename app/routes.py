@@ -1,19 +1,18 @@
 import os
-from flask import Flask, request, jsonify, Blueprint,current_app
+from flask import Flask, request, jsonify, Blueprint, current_app, Response, stream_with_context
 from app import db
-from app.models import CR, Student, Faculty, FacultyAssignment, Subject, DefaultSchedule, Schedule, AttendanceRecord, FCMToken, NotificationLog
+from app.models import CR, Student, Faculty, FacultyAssignment, Subject, DefaultSchedule, Schedule, AttendanceRecord, FCMToken, NotificationLog, UploadJob, AcademicCalendar, WEEKDAYS
+from app import academic_calendar, attendance_bitmap, attendance_queue, attendance_store, cleanup, exports, ingestion, jobs, notifications, otp_cache, otp_expiry, schedules, upload_jobs
 import pandas as pd
 import io
 import json
 
 from datetime import datetime, date, timedelta, timezone
 import pytz
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-import atexit
-from sqlalchemy import or_,not_, func
+from sqlalchemy import or_,not_, func, select, delete, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload, contains_eager
-from threading import Timer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import time
 
 routes = Blueprint('main', __name__)
@@ -50,55 +49,205 @@ def convert_ist_to_utc(ist_dt):
     return ist_dt.astimezone(UTC_TZ)
 # ==================== END TIMEZONE UTILITIES ====================
 
-@routes.route('/students/upload', methods=['POST'])
-def upload_students():
+def run_upload(kind, handler, required):
+    """Run an upload handler inline, or as a background job when async=true"""
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
 
     file = request.files['file']
-    batch = request.form['year']
-    year = batchToYear[batch]
-    isreplace = request.form['replace']
-    department = request.form['department']
-
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    try:
-        if isreplace == 'true':
+    form = request.form.to_dict()
+    missing = [field for field in required if field not in form]
+    if missing:
+        return jsonify({'error': f'Missing form fields: {", ".join(missing)}'}), 400
+
+    if form.get('async') == 'true':
+        job_id = upload_jobs.submit(kind, handler, file, form)
+        if not job_id:
+            return jsonify({'success': False, 'message': 'Too many uploads in progress, try again later.'}), 503
+        return jsonify({'success': True, 'job_id': job_id, 'status_url': f'/jobs/{job_id}'}), 202
+
+    body, status = handler(file, form)
+    return jsonify(body), status
+
+
+@routes.route('/jobs/<string:job_id>', methods=['GET'])
+def get_upload_job(job_id):
+    """Report phase, rows processed, elapsed time and errors of an upload job"""
+    job = UploadJob.query.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+
+    return jsonify({'success': True, 'job': upload_jobs.describe(job)}), 200
+
+
+def workbook_handler(load_sheet):
+    """
+    Upload handler for a workbook (or zip) with one sheet per batch and department
+    Each sheet named like E1-CSE is loaded with load_sheet(chunks, form, progress)
+    as if it had been uploaded on its own with that year and department.
+    """
+    def handler(file, form, progress=upload_jobs.no_progress):
+        timer = ingestion.Timer()
+
+        def load(name, chunks):
+            batch, department = ingestion.parse_sheet_name(name)
+            return load_sheet(chunks, dict(form, year=batch, department=department))
+
+        progress('parsing')
+        with upload_jobs.stored(file) as path:
             try:
-                Student.query.filter_by(year=year, department=department).delete(synchronize_session=False)
-                db.session.commit()
+                sheets = ingestion.list_sheets(path, file.filename)
             except Exception as e:
+                return {'success': False, 'message': f'Could not read workbook: {e}'}, 400
+
+            results = [
+                {'sheet': name, 'status': 400, 'message': 'Sheet name must be <year>-<department>, e.g. E1-CSE'}
+                for name, _, _ in sheets if not ingestion.parse_sheet_name(name)
+            ]
+            valid = [sheet for sheet in sheets if ingestion.parse_sheet_name(sheet[0])]
+            if not valid:
+                return {'success': False, 'message': 'No sheets named like E1-CSE found.', 'sheets': results}, 400
+
+            # ✅ OPTIMIZED: sheets parsed in a process pool, each loaded on its own pooled connection
+            results += upload_jobs.ingest_sheets(path, valid, load, progress)
+
+        results.sort(key=lambda result: result['sheet'])
+        failed = [result for result in results if result['status'] >= 400]
+        return {
+            'success': not failed,
+            'message': f'{len(results) - len(failed)} of {len(results)} sheets loaded.',
+            'sheets': results,
+            'rejected': [
+                dict(row, sheet=result['sheet']) for result in results for row in result.get('rejected', [])
+            ] + [
+                {'sheet': result['sheet'], 'reason': result.get('message')} for result in failed
+            ],
+            'elapsed_ms': timer.stats(0)['elapsed_ms']
+        }, 207 if failed else 200
+
+    return handler
+
+
+@routes.route('/students/upload', methods=['POST'])
+def upload_students():
+    # Without year and department the file holds one sheet per batch and department
+    if 'year' not in request.form and 'department' not in request.form:
+        return run_upload('students', workbook_handler(load_student_sheet), ['replace'])
+    return run_upload('students', process_student_upload, ['year', 'replace', 'department'])
+
+
+def process_student_upload(file, form, progress=upload_jobs.no_progress):
+    """Ingest a student sheet, returns (response body, status code)"""
+    try:
+        # Stream Excel or CSV in bounded chunks (constant memory)
+        progress('parsing')
+        reader = ingestion.ChunkedReader(file, current_app.config['UPLOAD_CHUNK_ROWS'])
+    except Exception as e:
+        return {'success': False, 'message': f'Could not read file: {e}'}, 400
+
+    return load_student_sheet(reader, form, progress)
+
+
+def roll_number_conflicts(year, department):
+    """Bitmap storage: 409 response (after a rollback) when a section now has a roll number twice"""
+    if not attendance_store.bitmap():
+        return None
+    duplicates = attendance_bitmap.duplicate_rolls(Student.year == year, Student.department == department)
+    if not duplicates:
+        return None
+    db.session.rollback()
+    return {
+        'success': False,
+        'message': 'Roll numbers must be distinct within a section with bitmap attendance storage, nothing was loaded.',
+        'duplicates': duplicates
+    }, 409
+
+
+def load_student_sheet(reader, form, progress=upload_jobs.no_progress):
+    """Validate and load one student sheet (ChunkedReader or FrameChunks)"""
+    batch = form['year']
+    if batch not in batchToYear:
+        return {'success': False, 'message': f'Invalid year {batch}'}, 400
+    year = batchToYear[batch]
+    isreplace = form['replace']
+    department = form['department']
+    mode = form.get('mode', 'insert')
+
+    try:
+        timer = ingestion.Timer()
+
+        missing = ingestion.missing_columns(reader, ingestion.STUDENT_COLUMNS)
+        if missing:
+            return {'success': False, 'message': f'Missing columns: {", ".join(missing)}'}, 400
+
+        progress('loading')
+        if mode == 'upsert':
+            # ✅ OPTIMIZED: INSERT ... ON CONFLICT DO UPDATE, only changed rows are written
+            result = ingestion.upsert_students(reader, year, department, timer, progress)
+            conflicts = roll_number_conflicts(year, department)
+            if conflicts:
+                return conflicts
+            db.session.commit()
+            return {
+                'success': True,
+                'message': f'{result["added"]} students added, {result["updated"]} updated.',
+                'added': result['added'],
+                'updated': result['updated'],
+                'unchanged': result['unchanged'],
+                'rejected': result['rejected'],
+                'elapsed_ms': result['elapsed_ms'],
+                'rows_per_sec': result['rows_per_sec']
+            }, 200
+
+        if isreplace == 'true':
+            # ✅ OPTIMIZED: COPY into a staging table, then swap the roster in one transaction
+            # (the old roster stays readable until commit and survives a failed upload)
+            result = ingestion.replace_students(reader, year, department, timer, progress)
+            if result['conflicts']:
                 db.session.rollback()
-                return jsonify({'message': str(e)}), 500
-
-        # Read Excel into a DataFrame
-        df = pd.read_excel(file)
-
-        # Prepare bulk insert list
-        students_to_add = []
-        for _, row in df.iterrows():
-            students_to_add.append(Student(
-                id=row['id'],
-                name=row['name'],
-                email=row['id'].lower() + "@rguktrkv.ac.in",
-                year=year,
-                department=department,
-                roll_number=row['roll_number'],
-                section=row['section']
-            ))
-        
-        # Bulk insert all students
-        if students_to_add:
-            db.session.bulk_save_objects(students_to_add)
-        
+                return {
+                    'success': False,
+                    'message': 'Some students already belong to another year or department, nothing was replaced.',
+                    'conflicts': result['conflicts'],
+                    'rejected': result['rejected']
+                }, 409
+
+            conflicts = roll_number_conflicts(year, department)
+            if conflicts:
+                return conflicts
+            db.session.commit()
+            return {
+                'success': True,
+                'message': f'{result["rows"]} students loaded, {result["replaced"]} replaced.',
+                'replaced': result['replaced'],
+                'rejected': result['rejected'],
+                'elapsed_ms': result['elapsed_ms'],
+                'rows_per_sec': result['rows_per_sec']
+            }, 200
+
+        # ✅ OPTIMIZED: Vectorized validation + COPY FROM STDIN (no per-row ORM objects)
+        result = ingestion.ingest_students(reader, year, department, timer, progress)
+
+        conflicts = roll_number_conflicts(year, department)
+        if conflicts:
+            return conflicts
         db.session.commit()
-        return jsonify({'success':True,'message': f'{len(df)} students added successfully.'})
+        return {
+            'success': True,
+            'message': f'{result["rows"]} students added successfully.',
+            'rejected': result['rejected'],
+            'elapsed_ms': result['elapsed_ms'],
+            'rows_per_sec': result['rows_per_sec']
+        }, 200
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({'message': "Students are already int the table."}), 500
+        if ingestion.is_duplicate(e):
+            return {'message': "Students are already in the table."}, 409
+        return {'message': f'Student upload failed: {str(e)}'}, 500
 
 @routes.route('/crs', methods=['GET', 'POST'])
 def handle_crs():
@@ -220,91 +369,51 @@ def get_faculties():
 
 @routes.route('/faculties/upload_faculty', methods=['POST'])
 def upload_faculty():
+    return run_upload('faculty', process_faculty_upload, [])
 
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
-    file = request.files['file']
+
+def process_faculty_upload(file, form, progress=upload_jobs.no_progress):
+    """Reconcile a faculty assignment sheet, returns (response body, status code)"""
+    mode = form.get('mode', 'insert')
+    dry_run = form.get('dry_run') == 'true'
     
     try:
-        df = pd.read_excel(file)
-        
-        # Batch fetch all existing faculties and assignments in one query
-        faculty_ids = df['FacultyId'].unique().tolist()
-        existing_faculties = {f.id: f for f in Faculty.query.filter(Faculty.id.in_(faculty_ids)).all()}
-        
-        # Build assignment tuples for checking duplicates
-        assignment_keys = []
-        for _, row in df.iterrows():
-            year = batchToYear[row['Year']]
-            assignment_keys.append((
-                row['FacultyId'],
-                row['SubjectCode'],
-                year,
-                row['Department'],
-                row['Section']
-            ))
-        
-        # Fetch existing assignments in bulk
-        existing_assignments_query = db.session.query(
-            FacultyAssignment.faculty_id,
-            FacultyAssignment.subject_code,
-            FacultyAssignment.year,
-            FacultyAssignment.department,
-            FacultyAssignment.section
-        ).filter(
-            FacultyAssignment.faculty_id.in_(faculty_ids)
-        ).all()
-        
-        existing_assignments_set = set(existing_assignments_query)
-        
-        # Prepare bulk insert lists
-        faculties_to_add = []
-        assignments_to_add = []
-        
-        for _, row in df.iterrows():
-            faculty_id = row['FacultyId']
-            faculty_name = row['FacultyName']
-            subject_code = row['SubjectCode']
-            department = row['Department']
-            year = batchToYear[row['Year']]
-            section = row['Section']
-            
-            # Check if faculty needs to be created
-            if faculty_id not in existing_faculties:
-                email = f"{faculty_id}@rguktrkv.ac.in"
-                faculties_to_add.append(Faculty(
-                    id=faculty_id,
-                    name=faculty_name,
-                    email=email
-                ))
-                existing_faculties[faculty_id] = True  # Mark as added
-            
-            # Check for duplicate assignment
-            assignment_tuple = (faculty_id, subject_code, year, department, section)
-            if assignment_tuple in existing_assignments_set:
-                return jsonify({'success': False, 'message': 'The assignment already exists'}), 201
-            
-            # Add to bulk insert list
-            assignments_to_add.append(FacultyAssignment(
-                faculty_id=faculty_id,
-                subject_code=subject_code,
-                year=year,
-                department=department,
-                section=section
-            ))
-            existing_assignments_set.add(assignment_tuple)
-        
-        # Bulk insert all faculties and assignments
-        if faculties_to_add:
-            db.session.bulk_save_objects(faculties_to_add)
-        if assignments_to_add:
-            db.session.bulk_save_objects(assignments_to_add)
+        progress('parsing')
+        df = ingestion.read_upload(file)
 
-        db.session.commit()
-        return jsonify({'success': True, 'message': 'Successfully processed faculty assignments'})
+        missing = ingestion.missing_columns(df, ingestion.FACULTY_COLUMNS)
+        if missing:
+            return {'success': False, 'message': f'Missing columns: {", ".join(missing)}'}, 400
+
+        progress('loading')
+
+        # ✅ OPTIMIZED: One anti-join query splits the sheet into new faculty, new and existing assignments
+        diff = ingestion.reconcile_faculty_assignments(df, batchToYear)
+        faculty_rows = diff.pop('faculty_rows')
+
+        faculty_counts = None
+        if not dry_run:
+            if mode == 'upsert':
+                # Create new faculty and update changed names in one statement
+                faculty_counts = ingestion.upsert_faculties(faculty_rows)
+            ingestion.apply_faculty_reconciliation(diff)
+            db.session.commit()
+        progress('loading', len(diff['new_assignments']))
+
+        return {
+            'success': True,
+            'dry_run': dry_run,
+            'message': f'{len(diff["new_assignments"])} new assignments, '
+                       f'{len(diff["existing_assignments"])} already exist.',
+            'new_faculty': diff['new_faculty'],
+            'new_assignments': diff['new_assignments'],
+            'existing_assignments': diff['existing_assignments'],
+            'rejected': diff['rejected'],
+            'faculty': faculty_counts
+        }, 200
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'message': 'Server error, could not add faculty.'}), 500
+        return {'success': False, 'message': 'Server error, could not add faculty.'}, 500
 
 @routes.route('/faculties/add', methods=['POST'])
 def add_faculty():
@@ -486,177 +595,131 @@ def update_faculty_assignment(assignment_id):
 
 @routes.route('/subjects/upload', methods=['POST'])
 def upload_subjects():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
+    return run_upload('subjects', process_subject_upload, ['replace'])
 
-    file = request.files['file']
-    isreplace = request.form['replace']
 
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+def process_subject_upload(file, form, progress=upload_jobs.no_progress):
+    """Ingest a subject sheet, returns (response body, status code)"""
+    isreplace = form['replace']
+    mode = form.get('mode', 'insert')
 
     try:
+        timer = ingestion.Timer()
+        progress('parsing')
+        reader = ingestion.ChunkedReader(file, current_app.config['UPLOAD_CHUNK_ROWS'])
+
+        missing = ingestion.missing_columns(reader, ingestion.SUBJECT_COLUMNS)
+        if missing:
+            return {'message': f'Missing columns: {", ".join(missing)}'}, 400
+
+        if mode == 'upsert':
+            # ✅ OPTIMIZED: INSERT ... ON CONFLICT DO UPDATE, only changed rows are written
+            progress('loading')
+            result = ingestion.upsert_subjects(reader, timer, progress)
+            db.session.commit()
+            return {
+                'message': f'{result["added"]} subjects added, {result["updated"]} updated.',
+                'added': result['added'],
+                'updated': result['updated'],
+                'unchanged': result['unchanged'],
+                'rejected': result['rejected'],
+                'elapsed_ms': result['elapsed_ms']
+            }, 200
+
+        progress('loading')
         if isreplace == 'true':
-            try:
-                Subject.query.delete(synchronize_session=False)
-                db.session.commit()
-            except Exception as e:
-                db.session.rollback()
-                return jsonify({'message': str(e)}), 500
-
-        # Read Excel into a DataFrame
-        df = pd.read_excel(file)
+            # ✅ OPTIMIZED: COPY into a staging table, then swap the subjects in one transaction
+            result = ingestion.replace_subjects(reader, timer, progress)
+            db.session.commit()
+            return {
+                'message': f'{result["rows"]} subjects loaded, {result["replaced"]} replaced.',
+                'replaced': result['replaced'],
+                'rejected': result['rejected'],
+                'elapsed_ms': result['elapsed_ms']
+            }, 200
 
-        # Prepare bulk insert list
-        subjects_to_add = []
-        for _, row in df.iterrows():
-            subjects_to_add.append(Subject(
-                subject_code=row['code'],
-                subject_mnemonic=row['mnemonic'],
-                subject_name=row['name'],
-                subject_type=row['type']
-            ))
-        
-        # Bulk insert all subjects
-        if subjects_to_add:
-            db.session.bulk_save_objects(subjects_to_add)
+        # ✅ OPTIMIZED: Vectorized validation + COPY FROM STDIN (no per-row ORM objects)
+        result = ingestion.ingest_subjects(reader, timer, progress)
 
         db.session.commit()
-        return jsonify({'message': f'{len(df)} subjects added successfully.'})
+        return {
+            'message': f'{result["rows"]} subjects added successfully.',
+            'rejected': result['rejected'],
+            'elapsed_ms': result['elapsed_ms']
+        }, 200
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({'message': "Subjects are already in the table."}), 500
+        if ingestion.is_duplicate(e):
+            return {'message': "Subjects are already in the table."}, 409
+        return {'message': f'Subject upload failed: {str(e)}'}, 500
 
 
 @routes.route('/defacultschedules/upload', methods=['POST'])
 def upload_default_schedules():
-    
-    PERIOD_TIMES = {
-        1: ("08:30", "09:30"),
-        2: ("09:30", "10:30"),
-        3: ("10:30", "11:30"),
-        4: ("11:30", "12:30"),
-        5: ("13:40", "14:40"),
-        6: ("14:40", "15:40"),
-        7: ("15:40", "16:40"),
-    }
-
-    LAB_DURATION = 3
+    # Without year and department the file holds one sheet per batch and department
+    if 'year' not in request.form and 'department' not in request.form:
+        return run_upload('default_schedules', workbook_handler(load_default_schedule_sheet), ['replace'])
+    return run_upload('default_schedules', process_default_schedule_upload, ['year', 'department', 'replace'])
 
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
-    
-    file = request.files['file']
-    batch = request.form['year']
-    year = batchToYear[batch]
-    department = request.form['department']
-    isreplace = request.form['replace']
 
-    # Handle Replace Flag (Clear existing schedules for this group)
-    if isreplace == 'true':
-        try:
-            # Find all FacultyAssignment IDs matching the year and department
-            assignment_ids_to_clear = db.session.query(FacultyAssignment.id).filter(
-                FacultyAssignment.year == year,
-                FacultyAssignment.department == department
-            ).subquery()
-            
-            # Delete the corresponding DefaultSchedule records using the found IDs
-            db.session.query(DefaultSchedule).filter(
-                DefaultSchedule.assignment_id.in_(assignment_ids_to_clear.select())
-            ).delete(synchronize_session='fetch')
-            
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            return jsonify({'message': f'Failed to clear old schedules: {e}'}), 500
+def process_default_schedule_upload(file, form, progress=upload_jobs.no_progress):
+    """Ingest a default timetable sheet, returns (response body, status code)"""
+    try:
+        progress('parsing')
+        reader = ingestion.ChunkedReader(file, current_app.config['UPLOAD_CHUNK_ROWS'])
+    except Exception as e:
+        return {'message': f'Could not read file: {e}'}, 400
+
+    return load_default_schedule_sheet(reader, form, progress)
+
+
+def load_default_schedule_sheet(reader, form, progress=upload_jobs.no_progress):
+    """Compile and load one default timetable sheet (ChunkedReader or FrameChunks)"""
+    batch = form['year']
+    if batch not in batchToYear:
+        return {'message': f'Invalid year {batch}'}, 400
+    year = batchToYear[batch]
+    department = form['department']
+    isreplace = form['replace']
 
     try:
-        df = pd.read_excel(file)
-
-        # Fetch all subject types in one query
-        subject_codes = df['SubjectCode'].unique().tolist()
-        subject_types_dict = {
-            s.subject_code: s.subject_type 
-            for s in db.session.query(Subject.subject_code, Subject.subject_type)
-                .filter(Subject.subject_code.in_(subject_codes))
-                .all()
-        }
+        timer = ingestion.Timer()
 
-        # Fetch all relevant faculty assignment IDs in one query
-        faculty_ids = df['FacultyId'].unique().tolist()
-        sections = df['Section'].unique().tolist()
-        
-        assignments_query = db.session.query(
-            FacultyAssignment.id,
-            FacultyAssignment.faculty_id,
-            FacultyAssignment.subject_code,
-            FacultyAssignment.section
-        ).filter(
-            FacultyAssignment.department == department,
-            FacultyAssignment.year == year,
-            FacultyAssignment.faculty_id.in_(faculty_ids),
-            FacultyAssignment.section.in_(sections),
-            FacultyAssignment.subject_code.in_(subject_codes)
-        ).all()
-        
-        # Create a lookup dictionary for fast assignment_id retrieval
-        assignment_lookup = {}
-        for assignment in assignments_query:
-            key = (assignment.faculty_id, assignment.subject_code, assignment.section)
-            assignment_lookup[key] = assignment.id
-
-        # Prepare bulk insert list
-        schedules_to_add = []
-        
-        for _, row in df.iterrows():
-            day_of_week = row['Day']
-            section = row['Section']
-            period = row['Period']
-            subject_code = row['SubjectCode']
-            faculty_id = row['FacultyId']
-            venue = row['Venue']
-
-            # Get subject type from preloaded dictionary
-            subject_type = subject_types_dict.get(subject_code)
-            if not subject_type:
-                raise ValueError(f"Subject code {subject_code} not found")
-
-            # Calculate time based on subject type
-            if subject_type.lower() == "lab":
-                start_time = PERIOD_TIMES[period][0]
-                end_period = period + LAB_DURATION - 1
-                if end_period not in PERIOD_TIMES:
-                    raise ValueError(f"Lab starting at period {period} exceeds available periods")
-                end_time = PERIOD_TIMES[end_period][1]
-            else:
-                start_time, end_time = PERIOD_TIMES[period]
-            
-            # Get assignment_id from preloaded lookup
-            assignment_key = (faculty_id, subject_code, section)
-            assignment_id = assignment_lookup.get(assignment_key)
-            
-            if not assignment_id:
-                raise ValueError(f"No assignment found for faculty {faculty_id}, subject {subject_code}, section {section}")
+        missing = ingestion.missing_columns(reader, ingestion.TIMETABLE_COLUMNS)
+        if missing:
+            return {'message': f'Missing columns: {", ".join(missing)}'}, 400
 
-            schedules_to_add.append(DefaultSchedule(
-                day_of_week=day_of_week,
-                start_time=start_time,
-                end_time=end_time,
-                assignment_id=assignment_id,
-                venue=venue
-            ))
+        # The timetable as it was, to carry the upload over to already materialized schedules
+        assignments = select(FacultyAssignment.id).where(
+            FacultyAssignment.year == year, FacultyAssignment.department == department
+        )
+        schedules.snapshot_defaults(assignments)
+
+        # ✅ OPTIMIZED: Vectorized compile (frame merges + array period mapping), one COPY per chunk
+        progress('loading')
+        if isreplace == 'true':
+            # Staged and swapped in one transaction, the old timetable stays visible until commit
+            result = ingestion.replace_default_schedules(reader, year, department, timer, progress)
+        else:
+            result = ingestion.ingest_default_schedules(reader, year, department, timer, progress)
+
+        # Future classes follow the new timetable; held classes and open OTPs are not touched
+        progress('rematerializing')
+        rematerialized = schedules.resync_defaults(assignments, get_ist_today() + timedelta(days=1))
 
-        # Bulk insert all schedules
-        if schedules_to_add:
-            db.session.bulk_save_objects(schedules_to_add)
-        
         db.session.commit()
-        return jsonify({'message': 'Default schedules uploaded successfully'}), 201
+        return {
+            'message': 'Default schedules uploaded successfully',
+            'inserted': result['rows'],
+            'replaced': result.get('replaced', 0),
+            'rejected': result['rejected'],
+            'rematerialized': rematerialized,
+            'elapsed_ms': result['elapsed_ms']
+        }, 201
     except Exception as e:
         db.session.rollback()
-        return jsonify({'message': str(e)}), 500
+        return {'message': str(e)}, 500
 
 
 # Faculty Schedule Endpoint    
@@ -691,7 +754,7 @@ def get_faculty_schedule(faculty_id):
                 'end_time': schedule.end_time,
                 'venue': schedule.venue or '',
                 'status': schedule.status,
-                'otp': schedule.otp or ''
+                'otp': schedule.otp if otp_expiry.is_active(schedule.otp, schedule.otp_created_at) else ''
             }
             schedule_list.append(schedule_data)
         
@@ -736,6 +799,120 @@ def get_faculty_subjects(faculty_id):
     except Exception as e:
         return jsonify({'success': False, 'error': 'Failed to fetch subjects'}), 500
 
+# Academic Calendar Endpoints
+@routes.route('/calendar', methods=['GET'])
+def get_calendar():
+    """Calendar entries between from and to (YYYY-MM-DD, both optional)"""
+    try:
+        query = AcademicCalendar.query
+        if request.args.get('from'):
+            query = query.filter(AcademicCalendar.date >= datetime.strptime(request.args['from'], '%Y-%m-%d').date())
+        if request.args.get('to'):
+            query = query.filter(AcademicCalendar.date <= datetime.strptime(request.args['to'], '%Y-%m-%d').date())
+
+        return jsonify({
+            'success': True,
+            'entries': [{
+                'date': entry.date.isoformat(),
+                'kind': entry.kind,
+                'day_order': entry.day_order,
+                'description': entry.description
+            } for entry in query.order_by(AcademicCalendar.date)]
+        }), 200
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+
+
+@routes.route('/calendar', methods=['POST'])
+def save_calendar():
+    """
+    Add or change calendar entries
+    Body: {"entries": [{"date": "2025-10-02", "kind": "holiday", "description": "Gandhi Jayanti"},
+                       {"date": "2025-10-11", "kind": "working", "day_order": "MON"}]}
+    Already materialized future dates are refilled to match.
+    """
+    data = request.get_json() or {}
+    entries = data.get('entries')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'success': False, 'message': 'entries must be a non-empty list'}), 400
+
+    rows = []
+    for index, entry in enumerate(entries):
+        try:
+            day = datetime.strptime(entry['date'], '%Y-%m-%d').date()
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'success': False, 'message': f'Entry {index}: date must be YYYY-MM-DD'}), 400
+        kind = entry.get('kind')
+        day_order = entry.get('day_order')
+        if kind not in academic_calendar.KINDS:
+            return jsonify({'success': False, 'message': f'Entry {index}: kind must be one of {", ".join(academic_calendar.KINDS)}'}), 400
+        if day_order and (kind != 'working' or day_order not in WEEKDAYS):
+            return jsonify({'success': False, 'message': f'Entry {index}: day_order must be a weekday (MON..SUN) on a working day'}), 400
+        if any(row['date'] == day for row in rows):
+            return jsonify({'success': False, 'message': f'Entry {index}: {day.isoformat()} appears more than once'}), 400
+        rows.append({'date': day, 'kind': kind, 'day_order': day_order, 'description': entry.get('description')})
+
+    try:
+        stmt = pg_insert(AcademicCalendar).values(rows)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['date'],
+            set_={'kind': stmt.excluded.kind, 'day_order': stmt.excluded.day_order, 'description': stmt.excluded.description}
+        ))
+        academic_calendar.invalidate()
+
+        # Future dates may already have schedules, make them follow the new calendar
+        tomorrow = get_ist_now().date() + timedelta(days=1)
+        refreshed = schedules.refresh_dates(sorted({row['date'] for row in rows if row['date'] >= tomorrow}))
+        db.session.commit()
+        academic_calendar.invalidate()
+
+        return jsonify({
+            'success': True,
+            'message': f'{len(rows)} calendar entries saved.',
+            'schedules_removed': refreshed['removed'],
+            'schedules_created': refreshed['created']
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        academic_calendar.invalidate()
+        return jsonify({'success': False, 'message': 'Server error, could not save calendar.'}), 500
+
+
+@routes.route('/calendar/<string:date_str>', methods=['DELETE'])
+def delete_calendar_entry(date_str):
+    """Remove a calendar entry, the date follows its weekday again"""
+    try:
+        day = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Date must be YYYY-MM-DD'}), 400
+
+    entry = AcademicCalendar.query.get(day)
+    if not entry:
+        return jsonify({'success': False, 'message': 'Calendar entry not found'}), 404
+
+    try:
+        db.session.delete(entry)
+        db.session.flush()
+        academic_calendar.invalidate()
+
+        refreshed = {'removed': 0, 'created': 0}
+        if day > get_ist_now().date():
+            refreshed = schedules.refresh_dates([day])
+        db.session.commit()
+        academic_calendar.invalidate()
+
+        return jsonify({
+            'success': True,
+            'message': 'Calendar entry deleted successfully',
+            'schedules_removed': refreshed['removed'],
+            'schedules_created': refreshed['created']
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        academic_calendar.invalidate()
+        return jsonify({'success': False, 'message': 'Server error, could not delete calendar entry.'}), 500
+
+
 # Available Time Slots Endpoint
 @routes.route('/faculty/<faculty_id>/available-slots', methods=['GET'])
 def get_available_slots(faculty_id):
@@ -757,6 +934,15 @@ def get_available_slots(faculty_id):
 
         subject_type = subject_type.lower()
 
+        # No classes on holidays and exam days
+        if academic_calendar.day_order(target_date) is None:
+            return jsonify({
+                'success': True,
+                'available_slots': [],
+                'total_slots': 0,
+                'calendar': academic_calendar.describe(target_date)
+            }), 200
+
         # Define all possible time slots (skip 12:30 to 13:30)
         all_slots = [
             ('08:30', '09:30'), ('09:30', '10:30'), ('10:30', '11:30'),
@@ -910,6 +1096,126 @@ def create_schedule():
         return jsonify({'success': False, 'error': str(e)}), 500
     
 
+# Bulk Schedule Endpoint (lab series, make-up weeks)
+@routes.route('/schedule/bulk', methods=['POST'])
+def create_schedule_series():
+    """
+    Schedule one slot of an assignment on every matching date of a range
+    Body: assignment_id, start_date, end_date, weekdays (['MON', 'WED'], default MON..SAT),
+    start_time, end_time, venue. Holidays and exam days are skipped, dates where the
+    class or the faculty already has an overlapping class are reported as conflicts.
+    """
+    try:
+        data = request.get_json() or {}
+
+        missing = [field for field in ('assignment_id', 'start_date', 'end_date', 'start_time', 'end_time') if not data.get(field)]
+        if missing:
+            return jsonify({'success': False, 'error': f'Missing fields: {", ".join(missing)}'}), 400
+
+        try:
+            start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+            # Zero-padded, so '9:00' is stored and compared like the other schedule times
+            start_time = datetime.strptime(data['start_time'], '%H:%M').strftime('%H:%M')
+            end_time = datetime.strptime(data['end_time'], '%H:%M').strftime('%H:%M')
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD and times HH:MM'}), 400
+
+        weekdays = [day.upper() for day in data.get('weekdays') or WEEKDAYS[:6]]
+        if start_time >= end_time:
+            return jsonify({'success': False, 'error': 'start_time must be before end_time'}), 400
+        if any(day not in WEEKDAYS for day in weekdays):
+            return jsonify({'success': False, 'error': 'weekdays must be MON..SUN'}), 400
+        if start_date < get_ist_today() or end_date < start_date:
+            return jsonify({'success': False, 'error': 'Date range must be in the future and start before it ends'}), 400
+        if (end_date - start_date).days >= current_app.config['BULK_SCHEDULE_MAX_DAYS']:
+            return jsonify({'success': False, 'error': f'Date range is limited to {current_app.config["BULK_SCHEDULE_MAX_DAYS"]} days'}), 400
+
+        assignment = FacultyAssignment.query.get(data['assignment_id'])
+        if not assignment:
+            return jsonify({'success': False, 'error': 'Faculty assignment not found'}), 404
+
+        # Matching weekdays of the range, minus the days the calendar has no classes
+        dates, skipped = [], []
+        day = start_date
+        while day <= end_date:
+            if WEEKDAYS[day.weekday()] in weekdays:
+                if academic_calendar.day_order(day) is None:
+                    skipped.append(academic_calendar.describe(day))
+                else:
+                    dates.append(day)
+            day += timedelta(days=1)
+
+        # ✅ OPTIMIZED: One set-based query finds the class and faculty conflicts of every date
+        conflicts = {}
+        if dates:
+            rows = db.session.query(
+                Schedule.id,
+                Schedule.date,
+                Schedule.start_time,
+                Schedule.end_time,
+                FacultyAssignment.year,
+                FacultyAssignment.department,
+                FacultyAssignment.section,
+                FacultyAssignment.faculty_id,
+                Subject.subject_name
+            ).join(FacultyAssignment, Schedule.assignment_id == FacultyAssignment.id)\
+            .join(Subject, FacultyAssignment.subject_code == Subject.subject_code)\
+            .filter(
+                Schedule.date.between(dates[0], dates[-1]),
+                Schedule.date.in_(dates),
+                Schedule.start_time < end_time,
+                Schedule.end_time > start_time,
+                db.or_(
+                    db.and_(
+                        FacultyAssignment.year == assignment.year,
+                        FacultyAssignment.department == assignment.department,
+                        FacultyAssignment.section == assignment.section
+                    ),
+                    FacultyAssignment.faculty_id == assignment.faculty_id
+                )
+            ).order_by(Schedule.date, Schedule.start_time)
+
+            for row in rows:
+                same_class = (row.year, row.department, row.section) == (assignment.year, assignment.department, assignment.section)
+                conflicts.setdefault(row.date.isoformat(), []).append({
+                    'schedule_id': row.id,
+                    'type': 'class' if same_class else 'faculty',
+                    'subject_name': row.subject_name,
+                    'class': f'{yearToBatch.get(row.year, row.year)} {row.department}-{row.section}',
+                    'time': f'{row.start_time} - {row.end_time}'
+                })
+
+        free = [day for day in dates if day.isoformat() not in conflicts]
+        if free:
+            # ✅ OPTIMIZED: One executemany for the whole series
+            db.session.bulk_insert_mappings(Schedule, [{
+                'assignment_id': assignment.id,
+                'date': day,
+                'start_time': start_time,
+                'end_time': end_time,
+                'venue': data.get('venue', 'TBA'),
+                'status': False
+            } for day in free])
+            db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'message': f'{len(free)} classes scheduled, {len(conflicts)} dates with conflicts',
+            'created': len(free),
+            'created_dates': [day.isoformat() for day in free],
+            'conflicts': conflicts,
+            'skipped': skipped
+        }), 201 if free else 200
+
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'A class was scheduled in one of these slots meanwhile, please retry'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # Delete Schedule Endpoint
 @routes.route('/schedule/<int:schedule_id>', methods=['DELETE'])
 def delete_schedule(schedule_id):
@@ -931,6 +1237,79 @@ def delete_schedule(schedule_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# Bulk Cancel Endpoint (weather, events)
+@routes.route('/schedule/cancel', methods=['POST'])
+def cancel_schedules():
+    """
+    Cancel the classes of a date, optionally only of a year (E1..E4), department and section
+    Held classes and classes taking attendance stay. Every affected class is
+    notified once, in the background, after the cancellation committed.
+    Body: date, year, department, section, reason, cancelled_by
+    """
+    try:
+        data = request.get_json() or {}
+
+        try:
+            target_date = datetime.strptime(data.get('date') or '', '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'success': False, 'error': 'date (YYYY-MM-DD) is required'}), 400
+
+        scope = [
+            Schedule.assignment_id == FacultyAssignment.id,
+            FacultyAssignment.subject_code == Subject.subject_code,
+            Schedule.date == target_date,
+            Schedule.status.isnot(True),
+            otp_expiry.inactive()
+        ]
+        if data.get('year'):
+            if data['year'] not in batchToYear:
+                return jsonify({'success': False, 'error': 'Invalid batch format'}), 400
+            scope.append(FacultyAssignment.year == batchToYear[data['year']])
+        if data.get('department'):
+            scope.append(FacultyAssignment.department == data['department'])
+        if data.get('section'):
+            scope.append(FacultyAssignment.section == data['section'])
+
+        # ✅ OPTIMIZED: One DELETE ... USING ... RETURNING, the affected classes come from its result
+        cancelled = db.session.execute(
+            delete(Schedule).where(*scope).returning(
+                Schedule.id, Schedule.start_time, Schedule.end_time,
+                FacultyAssignment.year, FacultyAssignment.department, FacultyAssignment.section,
+                Subject.subject_name
+            )
+        ).all()
+        db.session.commit()
+
+        classes = {}
+        for row in sorted(cancelled, key=lambda row: row.start_time):
+            classes.setdefault((row.year, row.department, row.section), []).append(row)
+
+        reason = data.get('reason') or 'Classes cancelled'
+        notices = [{
+            'class': klass,
+            'title': f'Classes cancelled on {target_date:%d %b}',
+            'body': f'{reason}: ' + ', '.join(f'{row.subject_name} {row.start_time}-{row.end_time}' for row in rows),
+            'data': {'type': 'classes_cancelled', 'date': target_date.isoformat()}
+        } for klass, rows in classes.items()]
+        if notices:
+            notifications.queue_class_notices(data.get('cancelled_by') or 'admin', notices)
+
+        return jsonify({
+            'success': True,
+            'message': f'{len(cancelled)} sessions cancelled across {len(classes)} classes on {target_date}',
+            'cancelled': len(cancelled),
+            'classes': [{
+                'class': f'{yearToBatch.get(year, year)} {department}-{section}',
+                'schedule_ids': [row.id for row in rows]
+            } for (year, department, section), rows in classes.items()],
+            'notifications_queued': len(notices)
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @routes.route('/faculty/dashboard/<faculty_id>', methods=['GET'])
 def get_faculty_dashboard(faculty_id):
     """
@@ -988,24 +1367,17 @@ def get_faculty_dashboard(faculty_id):
         assignment_ids = [a.id for a in assignments]
         
         # Step 4: Batch query all completed schedules for all assignments
-        # Use subquery to get attendance stats efficiently
+        # Totals are the stored rows (dense) or the class roster (sparse, bitmap), see attendance_store
         attendance_stats = db.session.query(
             Schedule.assignment_id,
             Schedule.id.label('schedule_id'),
             Schedule.date,
             Schedule.topic_discussed,
-            func.count(AttendanceRecord.id).label('total_students'),
-            func.sum(func.cast(AttendanceRecord.status, db.Integer)).label('present_students')
-        ).outerjoin(
-            AttendanceRecord, Schedule.id == AttendanceRecord.session_id
+            attendance_store.total_count().label('total_students'),
+            attendance_store.present_count().label('present_students')
         ).filter(
             Schedule.assignment_id.in_(assignment_ids),
             Schedule.status == True
-        ).group_by(
-            Schedule.assignment_id,
-            Schedule.id,
-            Schedule.date,
-            Schedule.topic_discussed
         ).all()
         
         # Organize stats by assignment_id
@@ -1146,18 +1518,14 @@ def get_class_attendance(assignment_id):
         # Get total count
         total_sessions = Schedule.query.filter_by(assignment_id=assignment_id, status=True).count()
         
-        # Single optimized query with joins
+        # Single optimized query, absent = total - present (totals depend on the storage mode)
         sessions = db.session.query(
             Schedule,
-            db.func.count(AttendanceRecord.id).filter(AttendanceRecord.status == True).label('present_count'),
-            db.func.count(AttendanceRecord.id).label('total_records')
-        ).outerjoin(
-            AttendanceRecord, Schedule.id == AttendanceRecord.session_id
+            attendance_store.present_count().label('present_count'),
+            attendance_store.total_count().label('total_records')
         ).filter(
             Schedule.assignment_id == assignment_id,
             Schedule.status == True  # Only completed sessions
-        ).group_by(
-            Schedule.id
         ).order_by(
             Schedule.date.desc()
         ).offset(offset).limit(limit).all()
@@ -1170,13 +1538,7 @@ def get_class_attendance(assignment_id):
             # Only fetch student details if explicitly requested
             students = []
             if include_students:
-                student_records = db.session.query(
-                    Student.id, Student.name, AttendanceRecord.status
-                ).join(
-                    AttendanceRecord, Student.id == AttendanceRecord.student_id
-                ).filter(
-                    AttendanceRecord.session_id == schedule.id
-                ).all()
+                student_records = attendance_store.session_roster(schedule.id)
                 
                 students = [{
                     'student_id': student_id,
@@ -1223,18 +1585,14 @@ def get_class_attendance(assignment_id):
 @routes.route('/attendance/session/<int:session_id>/students', methods=['GET'])
 def get_session_students(session_id):
     try:
-        students = db.session.query(
-            Student.id, Student.name, AttendanceRecord.status
-        ).join(
-            AttendanceRecord, Student.id == AttendanceRecord.student_id
-        ).filter(
-            AttendanceRecord.session_id == session_id
-        ).all()
+        # Sparse storage: the whole class, students without a row are absent
+        students = attendance_store.session_roster(session_id)
         
+        pending = attendance_queue.pending_students(session_id)
         student_data = [{
             'student_id': student_id,
             'student_name': student_name,
-            'status': status
+            'status': status or student_id in pending
         } for student_id, student_name, status in students]
         
         return jsonify({
@@ -1256,14 +1614,22 @@ def update_attendance():
         student_id = data.get('student_id')
         status = data.get('status')
         
-        # Find the attendance record
-        attendance_record = AttendanceRecord.query.filter_by(
-            session_id=session_id, 
-            student_id=student_id
-        ).first()
+        # The faculty's correction wins over a mark still queued or being written; discard waits
+        # for a batch in flight, so it comes before this request writes (and locks) anything
+        attendance_queue.discard(session_id, student_id)
+        
+        # Find the attendance record (sparse storage: store the correction for a student of the class)
+        if attendance_store.sparse():
+            attendance_record = attendance_store.set_status(session_id, student_id, status)
+        else:
+            attendance_record = AttendanceRecord.query.filter_by(
+                session_id=session_id, 
+                student_id=student_id
+            ).first()
         
         if attendance_record:
-            attendance_record.status = status
+            if not attendance_store.sparse():
+                attendance_record.status = status
             db.session.commit()
             
             return jsonify({
@@ -1311,25 +1677,26 @@ def get_attendance_report(assignment_id):
         session_ids = [session.id for session in sessions]
 
         # Calculate average students present and absent per session
+        # absent = total - present, totals are the stored rows (dense) or the roster of held sessions
         attendance_by_session = db.session.query(
             Schedule.id,
-            db.func.count(db.case((AttendanceRecord.status == True, 1))).label('present_count'),
-            db.func.count(db.case((AttendanceRecord.status == False, 1))).label('absent_count')
-        ).outerjoin(
-            AttendanceRecord, Schedule.id == AttendanceRecord.session_id
+            Schedule.status,
+            attendance_store.present_count().label('present_count'),
+            attendance_store.total_count().label('total_count')
         ).filter(
             Schedule.id.in_(session_ids)
-        ).group_by(
-            Schedule.id
         ).all()
 
         total_present_all_sessions = 0
         total_absent_all_sessions = 0
         valid_sessions_count = 0
+        held_session_ids = []
 
         for session in attendance_by_session:
-            total_present_all_sessions += session.present_count or 0
-            total_absent_all_sessions += session.absent_count or 0
+            total_present_all_sessions += session.present_count
+            total_absent_all_sessions += max(session.total_count - session.present_count, 0)
+            if session.status:
+                held_session_ids.append(session.id)
             valid_sessions_count += 1
 
         # Calculate averages
@@ -1337,41 +1704,19 @@ def get_attendance_report(assignment_id):
         avg_students_absent = round(total_absent_all_sessions / valid_sessions_count, 2) if valid_sessions_count > 0 else 0
 
         # Calculate overall statistics (total counts across all sessions)
-        total_present = db.session.query(db.func.count(AttendanceRecord.id))\
-            .join(Schedule)\
-            .filter(
-                Schedule.assignment_id == assignment_id,
-                AttendanceRecord.status == True
-            ).scalar() or 0
-
-        total_absent = db.session.query(db.func.count(AttendanceRecord.id))\
-            .join(Schedule)\
-            .filter(
-                Schedule.assignment_id == assignment_id,
-                AttendanceRecord.status == False
-            ).scalar() or 0
+        total_present = total_present_all_sessions
+        total_absent = total_absent_all_sessions
 
         overall_percentage = round((total_present / (total_present + total_absent)) * 100, 2) if (total_present + total_absent) > 0 else 0
 
-        # Get student-wise attendance
-        students_attendance = db.session.query(
-            Student.id,
-            Student.name,
-            db.func.sum(db.case((AttendanceRecord.status == True, 1), else_=0)).label('present_count'),
-            db.func.sum(db.case((AttendanceRecord.status == False, 1), else_=0)).label('absent_count')
-        ).join(
-            AttendanceRecord, Student.id == AttendanceRecord.student_id
-        ).join(
-            Schedule, AttendanceRecord.session_id == Schedule.id
-        ).filter(
-            Schedule.assignment_id == assignment_id
-        ).group_by(
-            Student.id, Student.name
-        ).all()
+        # Get student-wise attendance: stored rows (dense) or every student of the class over
+        # the held sessions (bitmap storage counts them with NumPy over the sessions' bitmaps)
+        assignment = FacultyAssignment.query.get(assignment_id)
+        students_attendance = attendance_store.student_totals(assignment, session_ids, held_session_ids)
 
         students = []
-        for student_id, student_name, present_count, absent_count in students_attendance:
-            total_student_sessions = present_count + absent_count
+        for student_id, student_name, present_count, total_student_sessions in students_attendance:
+            absent_count = total_student_sessions - present_count
             attendance_percentage = round((present_count / total_student_sessions) * 100, 2) if total_student_sessions > 0 else 0
             
             students.append({
@@ -1414,89 +1759,88 @@ def get_attendance_report(assignment_id):
             'message': 'Internal server error'
         }), 500
 
-# ==================== UPDATED: AUTOMATED SCHEDULE MOVING WITH IST TIMEZONE ====================
-scheduler = None
-
-def start_daily_scheduler(app):
-    if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
-        return None
-    
-    global scheduler
 
-    # Create scheduler
-    scheduler = BackgroundScheduler(daemon=True)
-    
-    # UPDATED: Use IST timezone for the cron trigger
-    scheduler.add_job(
-        func=move_tomorrow_schedules_auto,
-        args=[app],
-        trigger=CronTrigger(hour=0, minute=58, timezone=IST_TZ),  # CHANGED: Added IST timezone
-        id='daily_schedule_move',
-        name='Move tomorrow schedules daily at 12:58 AM IST'
-    )
+@routes.route('/attendance/export', methods=['GET'])
+def export_attendance():
+    """
+    Stream the attendance register (students x sessions) of a class or department
+    Query: year (E1-E4), department, optional section and subject_code,
+    from and to (YYYY-MM-DD), format csv (default) or xlsx
+    """
+    batch = request.args.get('year')
+    department = request.args.get('department')
+    section = request.args.get('section')
+    subject_code = request.args.get('subject_code')
+    export_format = request.args.get('format', 'csv').lower()
 
-    start_cleanup_scheduler(app)
+    if batch not in batchToYear or not department:
+        return jsonify({'success': False, 'message': 'year (E1-E4) and department are required'}), 400
+    if export_format not in ('csv', 'xlsx'):
+        return jsonify({'success': False, 'message': 'format must be csv or xlsx'}), 400
 
-   
-    # Start the scheduler
-    scheduler.start()
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'message': 'from and to dates are required (YYYY-MM-DD)'}), 400
+
+    # ✅ OPTIMIZED: Generator-backed response, rows come from a server-side cursor
+    rows = exports.register_rows(batchToYear[batch], department, start, end, section, subject_code)
+    name = '_'.join(filter(None, ['attendance', batch, department, section, subject_code, str(start), str(end)]))
+
+    if export_format == 'xlsx':
+        body = exports.stream_xlsx(rows)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        body = exports.stream_csv(rows)
+        mimetype = 'text/csv'
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{name}.{export_format}"'}
+    )
 
-    
-    # Proper shutdown when app stops
-    atexit.register(lambda: scheduler.shutdown())
-    
-    return scheduler
+# ==================== UPDATED: AUTOMATED SCHEDULE MOVING WITH IST TIMEZONE ====================
+def start_daily_scheduler(app):
+    """Join the scheduler leader election (SCHEDULER_MODE=embedded), see app/jobs.py"""
+    return jobs.start(app)
 
-def move_tomorrow_schedules_auto(app):
+def move_tomorrow_schedules_auto():
     """
-    Automated version that moves TOMORROW's schedules
-    This runs automatically every day at 00:58 IST
+    Automated version that materializes the coming days' schedules
+    This runs automatically every day at 00:58 IST and fills SCHEDULE_HORIZON_DAYS
+    days from tomorrow, so a missed run never leaves tomorrow empty.
+    Runs inside the job runner's app context (app/jobs.py).
     """
-    with app.app_context():
-        try:
-            # UPDATED: Use IST for all date calculations
-            now_ist = get_ist_now()  # CHANGED: Using IST timezone
-            target_date = (now_ist + timedelta(days=1)).date()
-            day_name = target_date.strftime('%a').upper()
-
-            # ✅ OPTIMIZED: Get all default schedules for that day
-            default_schedules = DefaultSchedule.query.\
-                filter_by(day_of_week=day_name).all()
-
-            if not default_schedules:
-                return
-
-            # ✅ OPTIMIZED: Get all existing schedule assignment_ids for target date in one query
-            existing_assignment_ids = set(
-                db.session.query(Schedule.assignment_id)
-                .filter(Schedule.date == target_date)
-                .all()
-            )
-            existing_assignment_ids = {aid[0] for aid in existing_assignment_ids}
+    try:
+        # UPDATED: Use IST for all date calculations
+        now_ist = get_ist_now()  # CHANGED: Using IST timezone
 
-            # ✅ OPTIMIZED: Prepare bulk insert (only for non-existing schedules)
-            schedules_to_add = []
-            for default_schedule in default_schedules:
-                # Skip if already exists
-                if default_schedule.assignment_id in existing_assignment_ids:
-                    continue
+        # ✅ OPTIMIZED: One set-based INSERT ... SELECT for the whole horizon
+        result = schedules.materialize_horizon(now_ist.date())
+        db.session.commit()
+        return result
 
-                schedules_to_add.append({
-                    'assignment_id': default_schedule.assignment_id,
-                    'date': target_date,
-                    'start_time': default_schedule.start_time,
-                    'end_time': default_schedule.end_time,
-                    'venue': default_schedule.venue,
-                    'status': False
-                })
+    except Exception as e:
+        db.session.rollback()
+        raise
 
-            # ✅ OPTIMIZED: Bulk insert all schedules at once
-            if schedules_to_add:
-                db.session.bulk_insert_mappings(Schedule, schedules_to_add)
-                db.session.commit()
+@routes.route('/scheduler/runs', methods=['GET'])
+def get_job_runs():
+    """Recent background job runs (newest first) and per-job totals for the last `hours` hours"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        hours = request.args.get('hours', 24, type=int)
+        since = jobs.utcnow() - timedelta(hours=hours)
 
-        except Exception as e:
-            db.session.rollback()
+        return jsonify({
+            'success': True,
+            'summary': jobs.run_summary(since),
+            'runs': jobs.recent_runs(request.args.get('job'), request.args.get('status'), limit)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': 'Failed to fetch job runs'}), 500
 
 # ==================== UPDATED: SERVER TIME ENDPOINT WITH IST ====================
 @routes.route('/time', methods=['GET'])
@@ -1545,7 +1889,8 @@ def generate_otp():
     if not assignment or assignment.faculty_id != faculty_id:
         return jsonify({'success': False, 'message': 'Faculty not authorized for this schedule'}), 403
 
-    # Store OTP (without timestamp yet), topic_discussed, and mark attendance as completed
+    # Store OTP, topic_discussed, and mark attendance as completed
+    # The OTP only becomes visible with the attendance records, in the same commit
     schedule.otp = otp
     schedule.status = True
     schedule.topic_discussed = topic_discussed.strip()
@@ -1562,84 +1907,58 @@ def generate_otp():
         # Extract IDs from tuples
         student_ids = [sid[0] for sid in student_ids]
         
-        # ✅ OPTIMIZED: Check existing records in a single query
-        existing_student_ids = set(
-            db.session.query(AttendanceRecord.student_id)
-            .filter(
-                AttendanceRecord.session_id == schedule_id,
-                AttendanceRecord.student_id.in_(student_ids)
+        new_attendance_records = []
+        # ✅ OPTIMIZED: Sparse storage writes nothing here, absences are derived from the roster
+        if not attendance_store.sparse():
+            # ✅ OPTIMIZED: Check existing records in a single query
+            existing_student_ids = set(
+                db.session.query(AttendanceRecord.student_id)
+                .filter(
+                    AttendanceRecord.session_id == schedule_id,
+                    AttendanceRecord.session_date == schedule.date,  # Prunes to the month's partition
+                    AttendanceRecord.student_id.in_(student_ids)
+                )
+                .all()
             )
-            .all()
-        )
-        existing_student_ids = {sid[0] for sid in existing_student_ids}
-        
-        # ✅ OPTIMIZED: Prepare bulk insert data (only for new records)
-        new_attendance_records = [
-            {
-                'student_id': student_id,
-                'session_id': schedule_id,
-                'status': False  # Default to absent, will be updated when they submit OTP
-            }
-            for student_id in student_ids
-            if student_id not in existing_student_ids
-        ]
-        
-        # ✅ OPTIMIZED: Bulk insert (100x faster than individual inserts)
-        if new_attendance_records:
-            db.session.bulk_insert_mappings(AttendanceRecord, new_attendance_records)
-        
-        db.session.commit()
-        
-        # ⏰ UPDATED: Set OTP timestamp in UTC for consistent countdown
-        schedule.otp_created_at = datetime.now(UTC_TZ)  # CHANGED: Using UTC for consistency
+            existing_student_ids = {sid[0] for sid in existing_student_ids}
+            
+            # ✅ OPTIMIZED: Prepare bulk insert data (only for new records)
+            new_attendance_records = [
+                {
+                    'student_id': student_id,
+                    'session_id': schedule_id,
+                    'session_date': schedule.date,
+                    'status': False  # Default to absent, will be updated when they submit OTP
+                }
+                for student_id in student_ids
+                if student_id not in existing_student_ids
+            ]
+            
+            # ✅ OPTIMIZED: Bulk insert (100x faster than individual inserts)
+            if new_attendance_records:
+                db.session.bulk_insert_mappings(AttendanceRecord, new_attendance_records)
+        
+        # ⏰ UPDATED: Set OTP timestamp in UTC, the OTP expires OTP_TTL_SECONDS later (see otp_expiry)
+        schedule.otp_created_at = otp_expiry.utcnow()
+        # Every worker's OTP registry gets it with the commit
+        otp_cache.publish(schedule_id, otp, schedule.otp_created_at)
         db.session.commit()
+        otp_cache.remember(schedule_id, otp, schedule.otp_created_at)
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error creating attendance records: {str(e)}'}), 500
 
-    # Schedule OTP removal after 45 seconds
-    run_date = datetime.now() + timedelta(seconds=45)
-    scheduler.add_job(
-        func=remove_otp_job,
-        trigger='date',
-        run_date=run_date,
-        args=[schedule_id],
-        id=f'remove_otp_{schedule_id}',
-        name=f'Remove OTP for schedule {schedule_id}'
-    )
-
     return jsonify({
         'success': True, 
         'otp': otp, 
         'schedule_id': schedule_id,
+        'expires_in_seconds': current_app.config['OTP_TTL_SECONDS'],
         'topic_discussed': topic_discussed.strip(),
         'attendance_records_created': len(new_attendance_records) if new_attendance_records else 0,
         'total_students': len(student_ids)
     }), 200
 
-def remove_otp_job(schedule_id):
-    """Background job to remove OTP after 45 seconds"""
-    try:
-        # Import inside function to avoid circular imports
-        from app import create_app,db
-        from app.models import Schedule
-        
-        # Create app instance and context
-        app = create_app()
-
-        print("Removing OTP for schedule:", schedule_id)
-        
-        with app.app_context():
-            schedule = Schedule.query.get(schedule_id)
-            if schedule:
-                schedule.otp = ""
-                schedule.otp_created_at = None  # Clear timestamp when OTP is removed
-                db.session.commit()
-                
-    except Exception as e:
-        pass
-
 @routes.route('/api/student/schedule', methods=['GET'])
 def get_student_schedule():
     """Get today's and tomorrow's schedule for a student (only actual schedules)"""
@@ -1695,23 +2014,16 @@ def get_student_schedule():
         attendance_records = {}
         
         if schedule_ids:
-            records = db.session.query(
-                AttendanceRecord.session_id,
-                AttendanceRecord.status
-            ).filter(
-                AttendanceRecord.student_id == student.id,
-                AttendanceRecord.session_id.in_(schedule_ids)
-            ).all()
-            
-            # Create lookup dictionary for O(1) access
-            attendance_records = {r.session_id: r.status for r in records}
+            # Lookup dictionary for O(1) access (session_id -> status, any storage mode)
+            attendance_records = attendance_store.student_statuses(student, schedule_ids)
 
         # ✅ OPTIMIZED: Build response (no queries in loop!)
         schedule_data = []
         for s in schedules:
-            # Lookup attendance from dictionary (no query!)
-            attendance_marked = s.id in attendance_records
-            attendance_status = attendance_records.get(s.id)
+            # Lookup attendance from dictionary (no query!), sparse storage: a held session without a row is an absence
+            absent_unstored = bool(s.status) and attendance_store.sparse()
+            attendance_marked = s.id in attendance_records or absent_unstored
+            attendance_status = attendance_records.get(s.id, False if absent_unstored else None)
 
             schedule_data.append({
                 'id': str(s.id),
@@ -1724,7 +2036,7 @@ def get_student_schedule():
                 'date': s.date.isoformat(),
                 'faculty_name': s.faculty_name,
                 'status': s.status,
-                'otp': s.otp,
+                'otp': s.otp if otp_expiry.is_active(s.otp, s.otp_created_at) else '',
                 'otp_created_at': s.otp_created_at.isoformat() + 'Z' if s.otp_created_at else None,
                 'attendance_marked': attendance_marked,
                 'attendance_status': attendance_status,
@@ -2060,22 +2372,36 @@ def verify_otp():
                 'message': 'Schedule ID and OTP are required'
             }), 400
 
-        # Find the schedule with the provided ID
-        schedule = Schedule.query.get(schedule_id)
-        
-        if not schedule:
-            return jsonify({
-                'success': False,
-                'message': 'Schedule not found'
-            }), 404
+        # ✅ OPTIMIZED: Active OTPs come from the in-process registry, no database read
+        cached = otp_cache.lookup(schedule_id)
+        if cached:
+            current_otp, otp_active = cached[0], otp_expiry.is_active(*cached)
+        else:
+            # Find the schedule with the provided ID, expiry is decided by the database row
+            schedule = db.session.query(
+                Schedule.otp, otp_expiry.active().label('otp_active')
+            ).filter(Schedule.id == schedule_id).first()
+
+            if not schedule:
+                return jsonify({
+                    'success': False,
+                    'message': 'Schedule not found'
+                }), 404
+            current_otp, otp_active = schedule.otp, schedule.otp_active
 
         # Check if OTP matches
-        if schedule.otp != otp:
+        if current_otp != otp:
             return jsonify({
                 'success': False,
                 'message': 'Invalid OTP'
             }), 400
 
+        if not otp_active:
+            return jsonify({
+                'success': False,
+                'message': 'OTP expired'
+            }), 400
+
         # OTP is valid
         return jsonify({
             'success': True,
@@ -2106,24 +2432,47 @@ def mark_attendance():
         # Extract student ID from email
         student_id = email.split('@')[0].upper()
         
-        # Check if attendance record exists
-        attendance_record = AttendanceRecord.query.filter_by(
-            student_id=student_id, 
-            session_id=session_id
-        ).first()
+        # Check if attendance record exists (sparse storage: the student is in the class)
+        if attendance_store.sparse():
+            attendance_record = attendance_store.membership(session_id, student_id)
+        else:
+            attendance_record = AttendanceRecord.query.join(Schedule, db.and_(
+                Schedule.id == AttendanceRecord.session_id,
+                AttendanceRecord.session_date == Schedule.date  # Prunes to the month's partition
+            )).filter(
+                AttendanceRecord.student_id == student_id,
+                AttendanceRecord.session_id == session_id
+            ).first()
         
         if not attendance_record:
             return jsonify({'error': 'Attendance record not found for this session'}), 404
         
-        # Check if already marked present
-        if attendance_record.status:
+        # Check if already marked present (or queued to be)
+        write_behind = attendance_queue.enabled()
+        if attendance_record.status or (write_behind and attendance_queue.is_pending(session_id, student_id)):
             return jsonify({
                 'error': 'Attendance already marked for this session',
                 'already_marked': True
             }), 409
         
+        # ✅ OPTIMIZED: Write-behind mode answers now, the flusher batches the UPDATEs
+        if write_behind:
+            db.session.rollback()
+            if attendance_queue.submit(session_id, student_id):
+                return jsonify({
+                    'success': True,
+                    'message': 'Attendance accepted',
+                    'accepted': True,
+                    'student_id': student_id,
+                    'session_id': session_id,
+                    'timestamp': datetime.now().isoformat()
+                }), 202
+
         # Update from False to True
-        attendance_record.status = True
+        if attendance_store.sparse():
+            attendance_store.mark_present(session_id, student_id)
+        else:
+            attendance_record.status = True
         db.session.commit()
         
         return jsonify({
@@ -2139,6 +2488,83 @@ def mark_attendance():
         return jsonify({'error': f'Failed to mark attendance: {str(e)}'}), 500
 
 
+@routes.route('/api/attendance/verify-and-mark', methods=['POST'])
+def verify_and_mark_attendance():
+    """Check the OTP and mark the student present in one statement (verify-otp + mark in one call)"""
+    try:
+        data = request.get_json()
+
+        if not data:
+            return jsonify({'success': False, 'message': 'No data provided'}), 400
+
+        email = data.get('email')
+        session_id = data.get('session_id') or data.get('scheduleId')
+        otp = data.get('otp')
+
+        if not email or not session_id or not otp:
+            return jsonify({'success': False, 'message': 'Email, session_id and OTP are required'}), 400
+
+        student_id = email.split('@')[0].upper()
+
+        # ✅ OPTIMIZED: UPDATE ... FROM schedule ... RETURNING, the OTP check and the mark are one statement
+        if attendance_store.sparse():
+            # Sparse storage: INSERT ... SELECT ... ON CONFLICT, with the class membership in the SELECT
+            marked = attendance_store.mark_present(session_id, student_id, Schedule.otp == otp, otp_expiry.active())
+        else:
+            marked = db.session.execute(
+                update(AttendanceRecord).where(
+                    AttendanceRecord.session_id == session_id,
+                    AttendanceRecord.student_id == student_id,
+                    AttendanceRecord.status.is_(False),
+                    Schedule.id == AttendanceRecord.session_id,
+                    Schedule.date == AttendanceRecord.session_date,
+                    Schedule.otp == otp,
+                    otp_expiry.active()
+                ).values(status=True).returning(AttendanceRecord.id)
+            ).first()
+        db.session.commit()
+
+        if marked:
+            return jsonify({
+                'success': True,
+                'message': 'Attendance marked successfully',
+                'student_id': student_id,
+                'session_id': session_id,
+                'timestamp': datetime.now().isoformat()
+            }), 200
+
+        # Nothing updated: one lookup tells why
+        reason = db.session.query(
+            Schedule.otp, otp_expiry.active().label('otp_active'),
+            Student.id.label('member'), AttendanceRecord.status
+        ).join(FacultyAssignment, Schedule.assignment_id == FacultyAssignment.id)\
+        .outerjoin(Student, db.and_(attendance_store.in_class(), Student.id == student_id))\
+        .outerjoin(AttendanceRecord, db.and_(
+            AttendanceRecord.session_id == Schedule.id,
+            AttendanceRecord.session_date == Schedule.date,
+            AttendanceRecord.student_id == student_id
+        )).filter(Schedule.id == session_id).first()
+
+        if not reason:
+            return jsonify({'success': False, 'message': 'Schedule not found'}), 404
+        if reason.otp != otp:
+            return jsonify({'success': False, 'message': 'Invalid OTP'}), 400
+        if not reason.otp_active:
+            return jsonify({'success': False, 'message': 'OTP expired'}), 400
+        # Dense storage has a row for every enrolled student, sparse only for those who marked
+        if (reason.member if attendance_store.sparse() else reason.status) is None:
+            return jsonify({'success': False, 'message': 'Student is not enrolled in this session'}), 404
+        return jsonify({
+            'success': False,
+            'message': 'Attendance already marked for this session',
+            'already_marked': True
+        }), 409
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Failed to mark attendance: {str(e)}'}), 500
+
+
 @routes.route('/student/attendance/<student_id>', methods=['GET'])
 def get_student_attendance(student_id):
     try:
@@ -2148,26 +2574,17 @@ def get_student_attendance(student_id):
             return jsonify({'success': False, 'error': 'Student not found'}), 404
 
         # Single optimized query - no redundant filters needed
+        # Absent = counted sessions - present ones: the student's stored rows (dense) or the
+        # held sessions of the class (sparse, bitmap)
         subject_attendance_data = db.session.query(
             Subject.subject_code,
             Subject.subject_name,
-            # Count distinct sessions from attendance records
-            db.func.count(db.distinct(AttendanceRecord.session_id)).label('total_classes'),
-            # Count present records
-            db.func.sum(
-                db.case(
-                    (AttendanceRecord.status == True, 1),
-                    else_=0
-                )
-            ).label('attended_classes')
+            # Count the sessions that count for the student
+            db.func.count(Schedule.id).label('total_classes'),
+            # Count the ones the student was present at
+            db.func.count(Schedule.id).filter(attendance_store.attended(student)).label('attended_classes')
         ).join(FacultyAssignment, Subject.subject_code == FacultyAssignment.subject_code)\
-        .join(Schedule, FacultyAssignment.id == Schedule.assignment_id)\
-        .join(AttendanceRecord,
-            db.and_(
-                Schedule.id == AttendanceRecord.session_id,
-                AttendanceRecord.student_id == student_id
-            )
-        )\
+        .join(Schedule, db.and_(FacultyAssignment.id == Schedule.assignment_id, attendance_store.counted(student)))\
         .filter(
             FacultyAssignment.year == student.year,
             FacultyAssignment.department == student.department,
@@ -2273,15 +2690,18 @@ def get_student_history(student_id):
         if not student:
             return jsonify({'success': False, 'error': 'Student not found'}), 404
         
-        # First, get all attendance records for this student on the given date
-        # by joining with Schedule to filter by date
+        # First, get the sessions of the student's class on the given date that count for the
+        # student (see attendance_store.counted) with whether the student was present
         attendance_records = db.session.query(
-            AttendanceRecord.session_id,
-            AttendanceRecord.status
-        ).join(Schedule, AttendanceRecord.session_id == Schedule.id)\
+            Schedule.id.label('session_id'),
+            attendance_store.attended(student).label('status')
+        ).join(FacultyAssignment, Schedule.assignment_id == FacultyAssignment.id)\
         .filter(
-            AttendanceRecord.student_id == student_id,
-            Schedule.date == target_date
+            FacultyAssignment.year == student.year,
+            FacultyAssignment.department == student.department,
+            FacultyAssignment.section == student.section,
+            Schedule.date == target_date,
+            attendance_store.counted(student)
         ).all()
         
         # If no attendance records found for this date, return empty history
@@ -2340,78 +2760,50 @@ def get_student_history(student_id):
         return jsonify({'success': False, 'error': 'Failed to fetch student history'}), 500
 
 # ==================== UPDATED: CLEANUP FUNCTIONS WITH IST TIMEZONE ====================
-def cleanup_old_schedules(app):
-    with app.app_context():
-        try:            
-            cutoff_date = date.today() - timedelta(days=100)
-            
-            # Delete schedules older than 100 days
-            deleted_count = Schedule.query.filter(Schedule.date < cutoff_date).delete()
-            db.session.commit()
-            
-        except Exception as e:
-            db.session.rollback()
-
 # UPDATED: Cleanup function using IST timezone
 def cleanup_expired_schedules():
-    """Automatically delete schedules that have expired (end_time + 30 minutes) using IST"""
+    """
+    Automatically delete schedules that have expired (end_time + 30 minutes) using IST
+    Runs inside the job runner's app context (app/jobs.py), returns the delete metrics.
+    """
     try:
-        from app import create_app, db
-        from app.models import Schedule
-        
-        app = create_app()
-        
-        with app.app_context():
-            # UPDATED: Use IST for all time calculations
-            current_ist = get_ist_now()  # CHANGED: Using IST timezone
-
-            # Skipping cleanup between 00:00-00:45 IST to avoid midnight boundary issues
-            if current_ist.hour == 0 and current_ist.minute <= 45:
-                return
-
-            current_date_ist = current_ist.date()
-            current_time_ist = current_ist.time()
-            
-            # Calculate time 30 minutes ago in IST
-            time_threshold_ist = (current_ist - timedelta(minutes=30)).time()
-            
-            # Delete schedules where:
-            # 1. Date is before today in IST (already expired)
-            # 2. OR date is today in IST AND end_time + 30min is before current IST time
-            # 3. AND status is False (not completed)
-            # 4. AND OTP is empty or null (not active)
-            deleted_count = db.session.query(Schedule).filter(
-                Schedule.status == False,
-                db.or_(Schedule.otp == "", Schedule.otp.is_(None)),
-                db.or_(
-                    # Past dates in IST
-                    Schedule.date < current_date_ist,
-                    # Today in IST but time has passed (end_time < current_ist_time - 30min)
-                    db.and_(
-                        Schedule.date == current_date_ist,
-                        Schedule.end_time < time_threshold_ist.strftime('%H:%M')
-                    )
+        # UPDATED: Use IST for all time calculations
+        current_ist = get_ist_now()  # CHANGED: Using IST timezone
+
+        # Skipping cleanup between 00:00-00:45 IST to avoid midnight boundary issues
+        if current_ist.hour == 0 and current_ist.minute <= 45:
+            return 0
+
+        current_date_ist = current_ist.date()
+        current_time_ist = current_ist.time()
+        
+        # Calculate time 30 minutes ago in IST
+        time_threshold_ist = (current_ist - timedelta(minutes=30)).time()
+        
+        # Delete schedules where:
+        # 1. Date is before today in IST (already expired)
+        # 2. OR date is today in IST AND end_time + 30min is before current IST time
+        # 3. AND status is False (not completed)
+        # 4. AND OTP is empty, null or expired (not active)
+        # ✅ OPTIMIZED: Deleted in short committed chunks instead of one SELECT + unbounded DELETE
+        return cleanup.delete_in_batches(
+            Schedule,
+            Schedule.status == False,
+            otp_expiry.inactive(),
+            db.or_(
+                # Past dates in IST
+                Schedule.date < current_date_ist,
+                # Today in IST but time has passed (end_time < current_ist_time - 30min)
+                db.and_(
+                    Schedule.date == current_date_ist,
+                    Schedule.end_time < time_threshold_ist.strftime('%H:%M')
                 )
-            ).delete(synchronize_session='fetch')
-            
-            db.session.commit()
-            
+            )
+        )
+        
     except Exception as e:
-        pass
-
-# Add this to your scheduler
-def start_cleanup_scheduler(app):
-    """Start scheduler for automatic cleanup of expired schedules"""
-    global scheduler
-    
-    # Add cleanup job to run every 5 minutes
-    scheduler.add_job(
-        func=cleanup_expired_schedules,
-        trigger='interval',
-        minutes=5,
-        id='cleanup_expired_schedules',
-        name='Clean up expired schedules every 5 minutes'
-    )
+        db.session.rollback()
+        raise
 
 # Helper function to convert 24hr to 12hr format
 def format_time_12hr(time_str):
@@ -2929,11 +3321,12 @@ def get_attendance(schedule_id):
             section=assignment.section
         ).order_by(Student.roll_number).all()  # ✅ Order by roll_number
         
-        attendance_records = AttendanceRecord.query.filter_by(
-            session_id=schedule_id
-        ).all()
-        
-        attendance_map = {record.student_id: record.status for record in attendance_records}
+        # The class with each student's status (any storage mode)
+        attendance_map = {
+            student_id: status for student_id, _, status in attendance_store.session_roster(schedule_id)
+        }
+        # Marks still queued by the write-behind flusher count as present
+        attendance_map.update(dict.fromkeys(attendance_queue.pending_students(schedule_id), True))
         
         attendance_data = []
         for student in class_students:
@@ -3013,14 +3406,20 @@ def submit_attendance():
         if not class_students:
             return jsonify({'success': False, 'error': 'No students found for this class'}), 400
         
+        # Queued student marks would overwrite the submitted sheet once flushed; this also waits
+        # for a batch being written, so it must come before this request writes anything
+        attendance_queue.discard_session(schedule_id)
+        
         # Update schedule
         schedule.topic_discussed = topic
         schedule.status = True
         
-        # Clear existing attendance
-        AttendanceRecord.query.filter_by(session_id=schedule_id).delete()
+        # Clear existing attendance (bitmap storage replaces the session's bitmap below)
+        if not attendance_store.bitmap():
+            AttendanceRecord.query.filter_by(session_id=schedule_id, session_date=schedule.date).delete()
         
         attendance_records_created = 0
+        present_roll_numbers = []
         for student_info in students_data:
             student_number = student_info.get('student_number')  # This is roll_number
             status = student_info.get('status')
@@ -3031,15 +3430,27 @@ def submit_attendance():
                 continue  # Skip invalid roll numbers
             
             attendance_status = True if status == 'present' else False
+            # Sparse storage keeps only the presences
+            if not attendance_status and attendance_store.sparse():
+                continue
+            
+            attendance_records_created += 1
+            if attendance_store.bitmap():
+                present_roll_numbers.append(student.roll_number)
+                continue
             
             attendance_record = AttendanceRecord(
                 student_id=student.id,  # Use actual DB ID
                 session_id=schedule_id,
+                session_date=schedule.date,
                 status=attendance_status
             )
             
             db.session.add(attendance_record)
-            attendance_records_created += 1
+        
+        # ✅ OPTIMIZED: Bitmap storage writes the whole session as one row
+        if attendance_store.bitmap():
+            attendance_bitmap.replace(schedule.id, schedule.date, present_roll_numbers)
         
         db.session.commit()
         
@@ -0,0 +1,269 @@
+"""
+Materialize default (weekly) schedules into dated schedule rows
+A whole date range is filled by one INSERT ... SELECT FROM default_schedule,
+following the academic calendar (no rows on holidays and exam days).
+The uq_schedule_slot key makes it idempotent and the schedule_materialization
+ledger makes sure a date is filled once, so classes cancelled (deleted) by
+faculty are not recreated by the next run. When a default timetable is
+uploaded again, resync_defaults applies only the changed slots to the dates
+already filled.
+
+    flask schedules materialize --days 7
+    flask schedules materialize --start 2025-07-01 --days 120 --force
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import (
+    Date, String, and_, bindparam, column, delete, exists, func, literal, or_, select, table, text, update
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+
+from app import academic_calendar, db, otp_expiry, partitions
+from app.models import DefaultSchedule, Schedule, ScheduleMaterialization
+
+SNAPSHOT = 'default_schedule_before'
+DEFAULT_COLUMNS = ('assignment_id', 'day_of_week', 'start_time', 'end_time', 'venue')
+
+
+def materialized_dates(start, end):
+    """Dates between start and end (inclusive) that are already in the ledger"""
+    rows = db.session.query(ScheduleMaterialization.date).filter(
+        ScheduleMaterialization.date.between(start, end)
+    )
+    return {row.date for row in rows}
+
+
+def _materialize(days):
+    """INSERT ... SELECT the default schedules of days and record them in the ledger, returns {date: rows}"""
+    created = {day: 0 for day in days}
+    # Holidays and exam days get no rows at all, overrides follow another weekday
+    orders = {day: academic_calendar.day_order(day) for day in days}
+    teaching = [day for day in days if orders[day]]
+
+    if teaching:
+        calendar = func.unnest(
+            bindparam('days', teaching, type_=ARRAY(Date)),
+            bindparam('orders', [orders[day] for day in teaching], type_=ARRAY(String))
+        ).table_valued('day', 'day_order').render_derived()
+
+        # ✅ OPTIMIZED: One INSERT ... SELECT for the whole range, conflicts skipped by the slot key
+        inserted = pg_insert(Schedule).from_select(
+            ['assignment_id', 'date', 'start_time', 'end_time', 'venue', 'status', 'materialized'],
+            select(
+                DefaultSchedule.assignment_id, calendar.c.day, DefaultSchedule.start_time,
+                DefaultSchedule.end_time, DefaultSchedule.venue, literal(False), literal(True)
+            ).join(calendar, DefaultSchedule.day_of_week == calendar.c.day_order)
+        ).on_conflict_do_nothing(
+            index_elements=['assignment_id', 'date', 'start_time']
+        ).returning(Schedule.date).cte('inserted')
+
+        counts = db.session.execute(
+            select(inserted.c.date, func.count()).group_by(inserted.c.date)
+        )
+        created.update({row[0]: row[1] for row in counts})
+
+    if created:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        ledger = pg_insert(ScheduleMaterialization).values([
+            {'date': day, 'rows_created': rows, 'materialized_at': now}
+            for day, rows in created.items()
+        ])
+        db.session.execute(ledger.on_conflict_do_update(
+            index_elements=['date'],
+            set_={
+                'rows_created': ScheduleMaterialization.rows_created + ledger.excluded.rows_created,
+                'materialized_at': ledger.excluded.materialized_at
+            }
+        ))
+
+    return created
+
+
+def materialize_schedules(start, end, force=False):
+    """
+    Create the schedules of every date from start to end (inclusive) from default_schedule
+    Dates already in the ledger are skipped unless force, existing slots are never
+    touched. Months without partitions go to DEFAULT. The caller commits.
+
+    Returns:
+        dict with created (total rows), dates (iso date -> rows created) and skipped dates
+    """
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    skipped = set() if force else materialized_dates(start, end)
+    created = _materialize([day for day in days if day not in skipped])
+
+    return {
+        'created': sum(created.values()),
+        'dates': {day.isoformat(): rows for day, rows in sorted(created.items())},
+        'skipped': sorted(day.isoformat() for day in skipped)
+    }
+
+
+def refresh_dates(days):
+    """
+    Re-materialize dates whose calendar entry changed
+    Classes materialized from the default timetable that were not held and have
+    no active OTP are removed and the dates are filled again from the (new) day
+    order. Classes created by faculty stay. The caller commits.
+
+    Returns:
+        dict with removed and created row counts
+    """
+    if not days:
+        return {'removed': 0, 'created': 0}
+
+    removed = db.session.query(Schedule).filter(
+        Schedule.date.in_(days),
+        Schedule.materialized,
+        Schedule.status.isnot(True),
+        otp_expiry.inactive()
+    ).delete(synchronize_session=False)
+    db.session.query(ScheduleMaterialization).filter(
+        ScheduleMaterialization.date.in_(days)
+    ).delete(synchronize_session=False)
+
+    created = _materialize(sorted(days))
+    return {'removed': removed, 'created': sum(created.values())}
+
+
+def snapshot_defaults(assignments):
+    """
+    Copy the current default timetable of assignments (a select of ids) into a
+    temp table, so resync_defaults can diff it against the timetable after an upload
+    """
+    query = select(
+        DefaultSchedule.assignment_id, DefaultSchedule.day_of_week, DefaultSchedule.start_time,
+        DefaultSchedule.end_time, DefaultSchedule.venue
+    ).where(DefaultSchedule.assignment_id.in_(assignments))
+    compiled = query.compile(dialect=db.session.get_bind().dialect, compile_kwargs={'literal_binds': True})
+    db.session.execute(text(f'CREATE TEMP TABLE {SNAPSHOT} ON COMMIT DROP AS {compiled}'))
+
+
+def _same_slot(one, other):
+    return and_(
+        one.c.assignment_id == other.c.assignment_id,
+        one.c.day_of_week == other.c.day_of_week,
+        one.c.start_time == other.c.start_time
+    )
+
+
+def resync_defaults(assignments, start):
+    """
+    Apply a default timetable change to the schedules already materialized from start on
+    The timetable saved by snapshot_defaults is diffed against the current one:
+    classes of removed slots are deleted, new slots are inserted and changed
+    end times or venues are updated, each in one statement. Only classes
+    materialized from the timetable are changed: classes created by faculty in the
+    same slot, and classes that were held, have an active OTP or were edited by
+    hand are left alone. The caller commits.
+
+    Returns:
+        dict with inserted, updated and deleted row counts and the dates touched
+    """
+    dates = sorted(row.date for row in db.session.query(ScheduleMaterialization.date).filter(
+        ScheduleMaterialization.date >= start
+    ))
+    orders = {day: academic_calendar.day_order(day) for day in dates}
+    teaching = [day for day in dates if orders[day]]
+    before = table(SNAPSHOT, *[column(name) for name in DEFAULT_COLUMNS])
+
+    if not teaching:
+        db.session.execute(text(f'DROP TABLE {SNAPSHOT}'))
+        return {'inserted': 0, 'updated': 0, 'deleted': 0, 'dates': 0}
+
+    calendar = func.unnest(
+        bindparam('days', teaching, type_=ARRAY(Date)),
+        bindparam('orders', [orders[day] for day in teaching], type_=ARRAY(String))
+    ).table_valued('day', 'day_order').render_derived()
+    after = select(*[DefaultSchedule.__table__.c[name] for name in DEFAULT_COLUMNS]).where(
+        DefaultSchedule.assignment_id.in_(assignments)
+    ).subquery('after')
+
+    removed = select(before).where(~exists().where(_same_slot(after, before))).subquery('removed')
+    added = select(after).where(~exists().where(_same_slot(before, after))).subquery('added')
+    changed = select(
+        after, before.c.end_time.label('old_end_time'), before.c.venue.label('old_venue')
+    ).join(before, _same_slot(before, after)).where(or_(
+        after.c.end_time != before.c.end_time,
+        after.c.venue.is_distinct_from(before.c.venue)
+    )).subquery('changed')
+
+    def classes_of(slots):
+        return and_(
+            Schedule.assignment_id == slots.c.assignment_id,
+            Schedule.start_time == slots.c.start_time,
+            Schedule.date == calendar.c.day,
+            calendar.c.day_order == slots.c.day_of_week
+        )
+
+    # Classes faculty created, held classes and classes taking attendance right now keep their slot
+    unheld = and_(Schedule.materialized, Schedule.status.isnot(True), otp_expiry.inactive())
+
+    # ✅ OPTIMIZED: One DELETE ... USING, UPDATE ... FROM and INSERT ... SELECT for the whole diff
+    deleted = db.session.execute(
+        delete(Schedule).where(classes_of(removed), unheld)
+    ).rowcount
+
+    updated = db.session.execute(
+        update(Schedule).where(
+            classes_of(changed), unheld,
+            # Rows still matching the old timetable; edited ones are the faculty's choice
+            Schedule.end_time == changed.c.old_end_time,
+            Schedule.venue.is_not_distinct_from(changed.c.old_venue)
+        ).values(end_time=changed.c.end_time, venue=changed.c.venue)
+    ).rowcount
+
+    inserted = db.session.execute(
+        pg_insert(Schedule).from_select(
+            ['assignment_id', 'date', 'start_time', 'end_time', 'venue', 'status', 'materialized'],
+            select(
+                added.c.assignment_id, calendar.c.day, added.c.start_time,
+                added.c.end_time, added.c.venue, literal(False), literal(True)
+            ).join(calendar, added.c.day_of_week == calendar.c.day_order)
+        ).on_conflict_do_nothing(index_elements=['assignment_id', 'date', 'start_time'])
+    ).rowcount
+
+    db.session.execute(text(f'DROP TABLE {SNAPSHOT}'))
+    return {'inserted': inserted, 'updated': updated, 'deleted': deleted, 'dates': len(teaching)}
+
+
+def materialize_horizon(today, days=None):
+    """Fill the next `days` days after today (SCHEDULE_HORIZON_DAYS by default)"""
+    days = days or current_app.config['SCHEDULE_HORIZON_DAYS']
+    start = today + timedelta(days=1)
+    return materialize_schedules(start, start + timedelta(days=days - 1))
+
+
+schedules_cli = AppGroup('schedules', help='Materialize default schedules into dated classes.')
+
+
+@schedules_cli.command('materialize')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First date (default: tomorrow, IST).')
+@click.option('--days', default=None, type=int, help='Number of days (default: SCHEDULE_HORIZON_DAYS).')
+@click.option('--force', is_flag=True, help='Also fill dates that were already materialized (backfills).')
+def materialize_command(start, days, force):
+    """Create schedules for a date range from the default timetable."""
+    from app.routes import get_ist_now
+
+    start = start.date() if start else get_ist_now().date() + timedelta(days=1)
+    days = days or current_app.config['SCHEDULE_HORIZON_DAYS']
+    end = start + timedelta(days=days - 1)
+
+    try:
+        # Backfills may reach months the nightly job has not created
+        partitions.ensure(start, end)
+        result = materialize_schedules(start, end, force)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for day, rows in result['dates'].items():
+        click.echo(f'{day}  {rows:>6} schedules created')
+    if result['skipped']:
+        click.echo(f'{len(result["skipped"])} dates already materialized (use --force to refill)')
+    click.echo(f'{result["created"]} schedules created for {start} .. {end}')
@@ -0,0 +1,251 @@
+"""
+In-process background runner for the Excel/CSV upload endpoints
+The uploaded file is stored on disk and ingested by a bounded thread pool.
+Progress is kept in the upload_job table so any gunicorn worker can report it.
+"""
+
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import update
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+from app import db, ingestion
+from app.models import UploadJob
+
+FINISHED_PHASES = ('completed', 'failed')
+
+_executor = None
+_slots = None
+_parsers = None
+_lock = threading.Lock()
+
+
+def no_progress(phase, rows=None):
+    """Progress callback used when an upload runs inline"""
+    pass
+
+
+def utcnow():
+    """Naive UTC timestamp, matching the DateTime columns"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _pool(app):
+    global _executor, _slots
+
+    with _lock:
+        if _executor is None:
+            workers = app.config['UPLOAD_JOB_WORKERS']
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload-job')
+            # Running + waiting jobs, further submissions are refused
+            _slots = threading.BoundedSemaphore(workers + app.config['UPLOAD_JOB_QUEUE'])
+
+    return _executor, _slots
+
+
+def _parse_pool(app):
+    global _parsers
+
+    with _lock:
+        if _parsers is None:
+            # forkserver, not fork: forking a threaded web worker can copy locks held by
+            # other threads. Workers start from a clean server process that only imports
+            # app.ingestion (run.py skips its side effects when imported as __mp_main__).
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['app.ingestion'])
+            _parsers = ProcessPoolExecutor(
+                max_workers=app.config['UPLOAD_PARSE_PROCESSES'],
+                mp_context=context
+            )
+
+    return _parsers
+
+
+def _update(job_id, **values):
+    """Write job progress on its own connection so it is visible before the ingestion commits"""
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(UploadJob.__table__).where(UploadJob.__table__.c.id == job_id).values(**values)
+        )
+
+
+def submit(kind, handler, file, form):
+    """
+    Store the uploaded file and queue it for ingestion
+
+    Returns:
+        job id, or None when the pool and its queue are full
+    """
+    app = current_app._get_current_object()
+    executor, slots = _pool(app)
+
+    if not slots.acquire(blocking=False):
+        return None
+
+    try:
+        job_id = uuid.uuid4().hex
+        folder = app.config['UPLOAD_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'{job_id}_{secure_filename(file.filename)}')
+        file.save(path)
+
+        db.session.add(UploadJob(
+            id=job_id,
+            kind=kind,
+            filename=file.filename,
+            phase='queued',
+            rows_processed=0,
+            created_at=utcnow()
+        ))
+        db.session.commit()
+
+        executor.submit(_run, app, job_id, handler, path, file.filename, form, slots)
+        return job_id
+    except Exception:
+        db.session.rollback()
+        slots.release()
+        raise
+
+
+def _run(app, job_id, handler, path, filename, form, slots):
+    with app.app_context():
+        def progress(phase, rows=None):
+            values = {'phase': phase}
+            if rows is not None:
+                values['rows_processed'] = rows
+            _update(job_id, **values)
+
+        try:
+            _update(job_id, phase='parsing', started_at=utcnow())
+
+            with open(path, 'rb') as stream:
+                body, status = handler(FileStorage(stream=stream, filename=filename), form, progress)
+
+            if status >= 400:
+                errors = [body.get('message') or body.get('error') or 'Upload failed']
+                phase = 'failed'
+            else:
+                errors = body.get('rejected', [])
+                phase = 'completed'
+
+            _update(job_id, phase=phase, result=body, errors=errors, finished_at=utcnow())
+        except Exception as e:
+            db.session.rollback()
+            _update(job_id, phase='failed', errors=[str(e)], finished_at=utcnow())
+        finally:
+            db.session.remove()
+            slots.release()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def describe(job):
+    """JSON representation of an upload job"""
+    if job.started_at:
+        elapsed = ((job.finished_at or utcnow()) - job.started_at).total_seconds()
+    else:
+        elapsed = 0
+
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'filename': job.filename,
+        'phase': job.phase,
+        'finished': job.phase in FINISHED_PHASES,
+        'rows_processed': job.rows_processed or 0,
+        'elapsed_seconds': round(elapsed, 2),
+        'errors': job.errors or [],
+        'result': job.result,
+        'created_at': job.created_at.isoformat() + 'Z' if job.created_at else None
+    }
+
+
+@contextmanager
+def stored(file):
+    """Save an uploaded file under UPLOAD_FOLDER for the duration of the block"""
+    folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f'{uuid.uuid4().hex}_{secure_filename(file.filename)}')
+    file.save(path)
+    try:
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _load_sheet(app, load, name, frame):
+    with app.app_context():
+        try:
+            body, status = load(name, ingestion.FrameChunks(frame, app.config['UPLOAD_CHUNK_ROWS']))
+        except Exception as e:
+            db.session.rollback()
+            body, status = {'message': str(e)}, 500
+        finally:
+            db.session.remove()
+
+    return dict(body, sheet=name, status=status, rows=len(frame))
+
+
+def ingest_sheets(path, sheets, load, progress=no_progress):
+    """
+    Parse the sheets of a stored upload in the process pool and load each one
+    on its own pooled connection (and transaction) as soon as it is parsed
+    At most UPLOAD_PARSE_PROCESSES sheets are parsing, parsed or loading at once,
+    so memory stays bounded by a few sheets however many the workbook has.
+
+    Args:
+        sheets: (name, member, sheet) tuples from ingestion.list_sheets
+        load: load(name, chunks) -> (body, status), run in an app context
+
+    Returns:
+        one result dict per sheet with its name, status and response body
+    """
+    app = current_app._get_current_object()
+    parsers = _parse_pool(app)
+    window = app.config['UPLOAD_PARSE_PROCESSES']
+    waiting = iter(sheets)
+    running = {}
+    results = []
+    rows = 0
+
+    with ThreadPoolExecutor(max_workers=app.config['UPLOAD_LOAD_THREADS'],
+                            thread_name_prefix='sheet-load') as loaders:
+        def fill():
+            for name, member, sheet in islice(waiting, window - len(running)):
+                running[parsers.submit(ingestion.read_sheet, path, member, sheet)] = ('parse', name)
+
+        fill()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, name = running.pop(future)
+                if stage == 'parse':
+                    try:
+                        frame = future.result()
+                    except Exception as e:
+                        results.append({'sheet': name, 'status': 400, 'message': f'Could not read sheet: {e}'})
+                        continue
+                    running[loaders.submit(_load_sheet, app, load, name, frame)] = ('load', name)
+                    del frame
+                else:
+                    result = future.result()
+                    rows += result['rows']
+                    progress('loading', rows)
+                    results.append(result)
+            fill()
+
+    return results
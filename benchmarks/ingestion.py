@@ -0,0 +1,171 @@
+"""
+Time every upload endpoint and the nightly jobs against a local PostgreSQL
+
+Usage:
+    python benchmarks/ingestion.py --database-url postgresql://localhost/ams_bench \
+        [--students 4000 20000 100000] [--weeks 16] [--json results.json] \
+        [--compare baseline.json --threshold 0.25]
+
+The database is dropped and recreated for every scale, never point it at real data.
+Results are printed as a table and written as JSON; with --compare the run exits
+with status 1 when any benchmark got slower than the baseline by more than threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def upload(client, url, path, **form):
+    """POST a workbook to an upload endpoint, returns (status code, response body)"""
+    with open(path, 'rb') as stream:
+        form['file'] = (stream, os.path.basename(path))
+        response = client.post(url, data=form)
+    return response.status_code, response.get_json()
+
+
+def run_scale(app, students, weeks, folder):
+    import pandas as pd
+    from app import db, fixtures, jobs
+    from app.models import DefaultSchedule, FacultyAssignment
+
+    client = app.test_client()
+    results = []
+
+    def record(name, rows, run):
+        started = time.perf_counter()
+        status = run()
+        elapsed = time.perf_counter() - started
+        results.append({
+            'benchmark': name,
+            'students': students,
+            'rows': rows,
+            'status': status,
+            'elapsed_ms': round(elapsed * 1000, 2),
+            'rows_per_sec': round(rows / elapsed) if elapsed > 0 else rows
+        })
+        print(f'{students:>8}  {name:<28} {rows:>9} rows  {elapsed * 1000:>10.1f} ms  status {status}')
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    campus = fixtures.generate_campus(students)
+    paths = fixtures.write_workbooks(campus, folder)
+
+    record('upload_subjects', len(campus['subjects']),
+           lambda: upload(client, '/subjects/upload', paths['subjects'], replace='false')[0])
+    record('upload_faculty', len(campus['faculty']),
+           lambda: upload(client, '/faculties/upload_faculty', paths['faculty'])[0])
+    record('upload_students_workbook', len(campus['students']),
+           lambda: upload(client, '/students/upload', paths['students'], replace='false')[0])
+    record('upload_students_upsert', len(campus['students']),
+           lambda: upload(client, '/students/upload', paths['students'], replace='false', mode='upsert')[0])
+    record('upload_students_replace', len(campus['students']),
+           lambda: upload(client, '/students/upload', paths['students'], replace='true')[0])
+    record('upload_timetable_workbook', len(campus['timetable']),
+           lambda: upload(client, '/defacultschedules/upload', paths['timetable'], replace='true')[0])
+
+    # Past schedules and attendance for the nightly jobs to work on
+    with app.app_context():
+        defaults = DefaultSchedule.query.count()
+        totals = {}
+
+        def semester():
+            rows = db.session.query(
+                DefaultSchedule.assignment_id, DefaultSchedule.day_of_week, DefaultSchedule.start_time,
+                DefaultSchedule.end_time, DefaultSchedule.venue,
+                FacultyAssignment.year, FacultyAssignment.department, FacultyAssignment.section
+            ).join(FacultyAssignment, DefaultSchedule.assignment_id == FacultyAssignment.id)
+            frame = pd.read_sql(rows.statement, db.session.connection())
+            totals.update(fixtures.load_semester(campus, frame, weeks))
+            db.session.commit()
+            return 'ok'
+
+        record('fixtures_semester', defaults * weeks, semester)
+        schedules = totals.get('schedules', 0)
+
+    record('job_move_tomorrow_schedules', defaults,
+           lambda: jobs.materialize_schedules(app)['status'])
+    record('job_cleanup_expired_schedules', schedules,
+           lambda: jobs.cleanup_expired_schedules(app)['status'])
+    record('job_maintain_partitions', schedules,
+           lambda: jobs.maintain_partitions(app)['status'])
+
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """Print benchmarks slower than the baseline by more than threshold, returns their count"""
+    with open(baseline_path) as handle:
+        baseline = {(r['benchmark'], r['students']): r for r in json.load(handle)['results']}
+
+    regressions = 0
+    for result in results:
+        before = baseline.get((result['benchmark'], result['students']))
+        if not before or not before['elapsed_ms']:
+            continue
+        change = result['elapsed_ms'] / before['elapsed_ms'] - 1
+        if change > threshold:
+            regressions += 1
+            print(f'REGRESSION {result["benchmark"]} ({result["students"]} students): '
+                  f'{before["elapsed_ms"]} ms -> {result["elapsed_ms"]} ms (+{change:.0%})')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', required=True, help='scratch PostgreSQL database (it is wiped)')
+    parser.add_argument('--students', type=int, nargs='+', default=[4000, 20000, 100000])
+    parser.add_argument('--weeks', type=int, default=16, help='weeks of schedules and attendance')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline results file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown vs baseline')
+    args = parser.parse_args()
+
+    # Config reads the URL at import time
+    os.environ['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    os.environ['FLASK_ENV'] = 'benchmark'
+    from app import create_app
+
+    app = create_app()
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for students in args.students:
+            results.extend(run_scale(app, students, args.weeks, folder))
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    report = {
+        'meta': {
+            'commit': commit,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'weeks': args.weeks,
+            'finished_at': datetime.now(timezone.utc).isoformat()
+        },
+        'results': results
+    }
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(report, handle, indent=2)
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
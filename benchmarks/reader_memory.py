@@ -0,0 +1,85 @@
+"""
+Peak RSS of reading a student workbook: pd.read_excel vs ingestion.ChunkedReader
+
+Usage:
+    python benchmarks/reader_memory.py [--rows 2000 20000 100000] [--json out.json]
+
+Each measurement runs in a fresh subprocess so ru_maxrss is not polluted
+by earlier runs.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The app package needs a database URL at import time, nothing connects here
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+
+
+def write_workbook(path, rows):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(['id', 'name', 'roll_number', 'section'])
+    for i in range(rows):
+        sheet.append([f'N{200000 + i}', f'Student {i}', i % 60 + 1, 'ABCDEF'[i % 6]])
+    workbook.save(path)
+
+
+def measure(reader, path):
+    """Run in a child process: read the file and print peak RSS in MB"""
+    import pandas as pd
+    from werkzeug.datastructures import FileStorage
+    from app.ingestion import ChunkedReader
+
+    rows = 0
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if reader == 'read_excel':
+        rows = len(pd.read_excel(path))
+    else:
+        with open(path, 'rb') as stream:
+            for chunk in ChunkedReader(FileStorage(stream=stream, filename=path)):
+                rows += len(chunk)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'rows': rows, 'peak_rss_mb': round(peak / 1024, 1),
+                      'delta_rss_mb': round((peak - baseline) / 1024, 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[2000, 20000, 100000])
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in args.rows:
+            path = os.path.join(folder, f'students_{rows}.xlsx')
+            write_workbook(path, rows)
+            for reader in ('read_excel', 'chunked'):
+                output = subprocess.check_output(
+                    [sys.executable, __file__, '--measure', reader, path], text=True
+                )
+                result = json.loads(output.strip().splitlines()[-1])
+                result['reader'] = reader
+                results.append(result)
+                print(f'{rows:>8} rows  {reader:<10}  peak {result["peak_rss_mb"]:>7} MB  '
+                      f'(+{result["delta_rss_mb"]} MB while reading)')
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--measure':
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main()
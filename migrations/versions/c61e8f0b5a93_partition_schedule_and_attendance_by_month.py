@@ -0,0 +1,162 @@
+"""Partition schedule and attendance_record by month
+
+Revision ID: c61e8f0b5a93
+Revises: 9f3a6d2e4c17
+Create Date: 2026-10-18 22:47:15.308412
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c61e8f0b5a93'
+down_revision = '9f3a6d2e4c17'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 2
+
+SCHEDULE_COLUMNS = """
+    id INTEGER NOT NULL DEFAULT nextval('schedule_id_seq'),
+    assignment_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    start_time VARCHAR(5) NOT NULL,
+    end_time VARCHAR(5) NOT NULL,
+    status BOOLEAN,
+    venue VARCHAR(50),
+    otp VARCHAR(6),
+    otp_created_at TIMESTAMP WITHOUT TIME ZONE,
+    topic_discussed VARCHAR(100)
+"""
+
+ATTENDANCE_COLUMNS = """
+    id INTEGER NOT NULL DEFAULT nextval('attendance_record_id_seq'),
+    student_id VARCHAR(20) NOT NULL,
+    session_id INTEGER NOT NULL,
+    session_date DATE NOT NULL,
+    status BOOLEAN NOT NULL
+"""
+
+SCHEDULE_INDEXES = """
+    CREATE INDEX ix_schedule_assignment_id ON schedule (assignment_id);
+    CREATE INDEX ix_schedule_date ON schedule (date);
+    CREATE INDEX ix_schedule_status ON schedule (status);
+    CREATE INDEX idx_schedule_date_assignment ON schedule (date, assignment_id);
+    CREATE INDEX idx_schedule_date_status ON schedule (date, status);
+    CREATE INDEX idx_schedule_active_otp ON schedule (otp_created_at) WHERE otp <> '';
+"""
+
+ATTENDANCE_INDEXES = """
+    CREATE INDEX ix_attendance_record_student_id ON attendance_record (student_id);
+    CREATE INDEX ix_attendance_record_session_id ON attendance_record (session_id);
+    CREATE INDEX idx_attendance_session_student ON attendance_record (session_id, student_id);
+"""
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # Keep the id sequences, the new tables continue numbering where the old ones stopped
+    op.execute("""
+        ALTER TABLE attendance_record RENAME TO attendance_record_unpartitioned;
+        ALTER TABLE schedule RENAME TO schedule_unpartitioned;
+        ALTER SEQUENCE schedule_id_seq OWNED BY NONE;
+        ALTER SEQUENCE attendance_record_id_seq OWNED BY NONE;
+    """)
+    op.execute(f'CREATE TABLE schedule ({SCHEDULE_COLUMNS}) PARTITION BY RANGE (date)')
+    op.execute(f'CREATE TABLE attendance_record ({ATTENDANCE_COLUMNS}) PARTITION BY RANGE (session_date)')
+    op.execute('CREATE TABLE schedule_default PARTITION OF schedule DEFAULT')
+    op.execute('CREATE TABLE attendance_record_default PARTITION OF attendance_record DEFAULT')
+
+    # One partition per month from the oldest schedule to MONTHS_AHEAD months from now (or the newest schedule)
+    oldest, newest = bind.execute(sa.text('SELECT min(date), max(date) FROM schedule_unpartitioned')).one()
+    current = date.today().replace(day=1)
+    month = min(oldest.replace(day=1), current) if oldest else current
+    last = max(newest.replace(day=1), _add_months(current, MONTHS_AHEAD)) if newest else _add_months(current, MONTHS_AHEAD)
+    while month <= last:
+        end = _add_months(month, 1)
+        for table in ('schedule', 'attendance_record'):
+            op.execute(
+                f"CREATE TABLE {table}_{month:%Y_%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        month = end
+
+    op.execute("""
+        INSERT INTO schedule (id, assignment_id, date, start_time, end_time, status, venue, otp, otp_created_at, topic_discussed)
+        SELECT id, assignment_id, date, start_time, end_time, status, venue, otp, otp_created_at, topic_discussed
+        FROM schedule_unpartitioned;
+
+        INSERT INTO attendance_record (id, student_id, session_id, session_date, status)
+        SELECT a.id, a.student_id, a.session_id, s.date, a.status
+        FROM attendance_record_unpartitioned a
+        JOIN schedule_unpartitioned s ON s.id = a.session_id;
+
+        DROP TABLE attendance_record_unpartitioned;
+        DROP TABLE schedule_unpartitioned;
+
+        ALTER SEQUENCE schedule_id_seq OWNED BY schedule.id;
+        ALTER SEQUENCE attendance_record_id_seq OWNED BY attendance_record.id;
+    """)
+
+    # Constraints and indexes are created on the parents once, after the copy
+    op.execute(f"""
+        ALTER TABLE schedule ADD CONSTRAINT schedule_pkey PRIMARY KEY (id, date);
+        ALTER TABLE schedule ADD CONSTRAINT uq_schedule_slot UNIQUE (assignment_id, date, start_time);
+        ALTER TABLE schedule ADD CONSTRAINT schedule_assignment_id_fkey
+            FOREIGN KEY (assignment_id) REFERENCES faculty_assignment (id) ON DELETE CASCADE;
+        {SCHEDULE_INDEXES}
+
+        ALTER TABLE attendance_record ADD CONSTRAINT attendance_record_pkey PRIMARY KEY (id, session_date);
+        ALTER TABLE attendance_record ADD CONSTRAINT attendance_record_student_id_fkey
+            FOREIGN KEY (student_id) REFERENCES student (id) ON DELETE CASCADE;
+        ALTER TABLE attendance_record ADD CONSTRAINT fk_attendance_record_schedule
+            FOREIGN KEY (session_id, session_date) REFERENCES schedule (id, date) ON DELETE CASCADE;
+        {ATTENDANCE_INDEXES}
+    """)
+
+
+def downgrade():
+    op.execute(f"""
+        ALTER TABLE attendance_record RENAME TO attendance_record_partitioned;
+        ALTER TABLE schedule RENAME TO schedule_partitioned;
+        ALTER SEQUENCE schedule_id_seq OWNED BY NONE;
+        ALTER SEQUENCE attendance_record_id_seq OWNED BY NONE;
+
+        CREATE TABLE schedule ({SCHEDULE_COLUMNS});
+        CREATE TABLE attendance_record ({ATTENDANCE_COLUMNS.replace('session_date DATE NOT NULL,', '')});
+
+        INSERT INTO schedule (id, assignment_id, date, start_time, end_time, status, venue, otp, otp_created_at, topic_discussed)
+        SELECT id, assignment_id, date, start_time, end_time, status, venue, otp, otp_created_at, topic_discussed
+        FROM schedule_partitioned;
+
+        INSERT INTO attendance_record (id, student_id, session_id, status)
+        SELECT id, student_id, session_id, status FROM attendance_record_partitioned;
+
+        DROP TABLE attendance_record_partitioned;
+        DROP TABLE schedule_partitioned;
+
+        ALTER SEQUENCE schedule_id_seq OWNED BY schedule.id;
+        ALTER SEQUENCE attendance_record_id_seq OWNED BY attendance_record.id;
+
+        ALTER TABLE schedule ADD CONSTRAINT schedule_pkey PRIMARY KEY (id);
+        ALTER TABLE schedule ADD CONSTRAINT uq_schedule_slot UNIQUE (assignment_id, date, start_time);
+        ALTER TABLE schedule ADD CONSTRAINT schedule_assignment_id_fkey
+            FOREIGN KEY (assignment_id) REFERENCES faculty_assignment (id) ON DELETE CASCADE;
+        {SCHEDULE_INDEXES}
+
+        ALTER TABLE attendance_record ADD CONSTRAINT attendance_record_pkey PRIMARY KEY (id);
+        ALTER TABLE attendance_record ADD CONSTRAINT attendance_record_student_id_fkey
+            FOREIGN KEY (student_id) REFERENCES student (id) ON DELETE CASCADE;
+        ALTER TABLE attendance_record ADD CONSTRAINT attendance_record_session_id_fkey
+            FOREIGN KEY (session_id) REFERENCES schedule (id) ON DELETE CASCADE;
+        {ATTENDANCE_INDEXES}
+    """)
@@ -0,0 +1,59 @@
+"""Add attendance_bitmap table
+
+Revision ID: d9e4a1f7c2b3
+Revises: b3f8e2d6c914
+Create Date: 2026-10-21 09:34:02.117845
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9e4a1f7c2b3'
+down_revision = 'b3f8e2d6c914'
+branch_labels = None
+depends_on = None
+
+BOUND = re.compile(r"FROM \('(\d{4})-(\d{2})-01'\) TO \('(\d{4})-(\d{2})-01'\)")
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    op.execute("""
+        CREATE TABLE attendance_bitmap (
+            session_id INTEGER NOT NULL,
+            session_date DATE NOT NULL,
+            present BYTEA NOT NULL
+        ) PARTITION BY RANGE (session_date)
+    """)
+    op.execute('CREATE TABLE attendance_bitmap_default PARTITION OF attendance_bitmap DEFAULT')
+
+    # Same monthly partitions as schedule, so retention detaches them together
+    bounds = bind.execute(sa.text("""
+        SELECT pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'schedule'
+    """)).scalars()
+    for bound in bounds:
+        match = BOUND.search(bound)
+        if match:
+            op.execute(
+                f"CREATE TABLE attendance_bitmap_{match[1]}_{match[2]} PARTITION OF attendance_bitmap "
+                f"FOR VALUES FROM ('{match[1]}-{match[2]}-01') TO ('{match[3]}-{match[4]}-01')"
+            )
+
+    op.execute("""
+        ALTER TABLE attendance_bitmap ADD CONSTRAINT attendance_bitmap_pkey PRIMARY KEY (session_id, session_date);
+        ALTER TABLE attendance_bitmap ADD CONSTRAINT fk_attendance_bitmap_schedule
+            FOREIGN KEY (session_id, session_date) REFERENCES schedule (id, date) ON DELETE CASCADE;
+    """)
+
+
+def downgrade():
+    op.execute('DROP TABLE attendance_bitmap')
@@ -1,9 +1,17 @@
+import os
+
 from app import create_app, db
 from app.models import Student
 from app.routes import start_daily_scheduler
 
 app = create_app()
 
-with app.app_context():
+if __name__ == '__main__':
+    # With the reloader the parent process only watches files, the jobs run in the serving child
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_daily_scheduler(app)
+    app.run(host="0.0.0.0", port=5000, debug=True)
+elif __name__ != '__mp_main__':
+    # gunicorn run:app, every worker joins the election and one of them runs the jobs
+    # (upload parser processes import this module as __mp_main__ and must not)
     start_daily_scheduler(app)
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file